@@ -0,0 +1,25 @@
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+asyncio support. This package requires Python 3.5 or later and the
+aiohttp package (install the "async" extra).
+"""
+
+from marklogic.aio.connection import AsyncConnection
+from marklogic.aio.models import AsyncDatabase, AsyncForest, AsyncHost, AsyncServer
+from marklogic.aio.models import AsyncRestartWaiter
+from marklogic.aio.models import AsyncUser, AsyncRole, AsyncPrivilege
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Asynchronous connection to MarkLogic, built on aiohttp.
+"""
+
+import asyncio
+import aiohttp
+from yarl import URL
+from requests.auth import HTTPBasicAuth, HTTPDigestAuth
+from marklogic.models.utilities.auth import NonceCachingDigestAuth
+from marklogic.models.utilities.retry import RetryPolicy
+
+try:
+    from urllib.parse import urlparse
+except ImportError:
+    from urlparse import urlparse
+
+
+class AsyncResponse:
+    """
+    The parts of an HTTP response that the models need. The body is
+    read completely before the response is returned so that the
+    pooled connection can be released.
+    """
+    def __init__(self, status_code, text, headers):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers
+
+
+class AsyncConnection:
+    """
+    The asynchronous counterpart of
+    :class:`marklogic.models.connection.Connection`.
+
+    The connection owns two pooled aiohttp sessions, one for the REST
+    port and one for the management port. Each pool allows up to
+    `pool_size` simultaneous connections, so a single event loop can
+    keep that many management calls in flight.
+
+    Sessions are created lazily inside the running event loop. Close
+    the connection with `await conn.close()`, or use it as an async
+    context manager.
+
+    Failed requests are retried as they are by the synchronous
+    connection if `retry` is given, either as a RetryPolicy or as True
+    for the default policy. The wait between attempts doesn't block
+    the event loop.
+    """
+    def __init__(self, host, auth, port=8000, management_port=8002,
+                 pool_size=100, retry=None):
+        self.host = host
+        self.port = port
+        self.management_port = management_port
+        if type(auth) is HTTPDigestAuth:
+            auth = NonceCachingDigestAuth(auth.username, auth.password)
+        self.auth = auth
+        self.pool_size = pool_size
+        self.rest_session = None
+        self.management_session = None
+        if retry is True:
+            retry = RetryPolicy()
+        self.retry = retry
+
+    @classmethod
+    def make_connection(cls, host, username, password, pool_size=100, retry=None):
+        return AsyncConnection(host, NonceCachingDigestAuth(username, password),
+                               pool_size=pool_size, retry=retry)
+
+    def challenges_saved(self):
+        """
+        The number of 401 challenge round trips that were avoided by
+        reusing a cached digest nonce.
+
+        :return: The number of saved round trips
+        """
+        return getattr(self.auth, 'challenges_saved', 0)
+
+    def _make_session(self):
+        connector = aiohttp.TCPConnector(limit=self.pool_size,
+                                         limit_per_host=self.pool_size)
+        auth = None
+        if isinstance(self.auth, HTTPBasicAuth):
+            auth = aiohttp.BasicAuth(self.auth.username, self.auth.password)
+        return aiohttp.ClientSession(connector=connector, auth=auth)
+
+    def session_for(self, uri):
+        """
+        Return the session that should be used for the given URI.
+        Requests addressed to the management port use the management
+        session, everything else uses the REST session.
+
+        :param uri: The request URI
+        :return: An aiohttp ClientSession
+        """
+        if urlparse(uri).port == self.management_port:
+            if self.management_session is None:
+                self.management_session = self._make_session()
+            return self.management_session
+        if self.rest_session is None:
+            self.rest_session = self._make_session()
+        return self.rest_session
+
+    async def _send(self, method, uri, headers, **kwargs):
+        session = self.session_for(uri)
+        async with session.request(method, uri, headers=headers, **kwargs) as response:
+            text = await response.text()
+            return AsyncResponse(response.status, text, response.headers)
+
+    async def request(self, method, uri, headers=None, idempotent=False, **kwargs):
+        """
+        Send an HTTP request over the appropriate pooled session.
+
+        Digest authentication uses the same nonce cache as the
+        synchronous connection. Request bodies are resent after a
+        challenge or a failure, so they must not be single-use streams.
+
+        :param method: The HTTP method
+        :param uri: The request URI
+        :param headers: Optional request headers
+        :param idempotent: The request can safely be sent again whatever
+            its method, for example a POST that writes documents
+        :return: An AsyncResponse
+        """
+        # The digest is computed over the URL the server sees, query included
+        params = kwargs.pop('params', None)
+        if params:
+            uri = str(URL(uri).extend_query(params))
+
+        if self.retry is None:
+            return await self._authenticated(method, uri, headers, **kwargs)
+
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = await self._authenticated(method, uri, headers, **kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if not self.retry.retryable(method, attempt, idempotent=idempotent):
+                    raise
+                response = None
+            else:
+                if not self.retry.retryable(method, attempt, response, idempotent):
+                    return response
+            self.retry.record_retry()
+            await asyncio.sleep(self.retry.delay(attempt, response))
+
+    async def _authenticated(self, method, uri, headers, **kwargs):
+        headers = dict(headers or {})
+        digest = isinstance(self.auth, NonceCachingDigestAuth)
+
+        preemptive = False
+        if digest:
+            authorization = self.auth.authorization(method, uri)
+            if authorization:
+                headers['Authorization'] = authorization
+                preemptive = True
+
+        response = await self._send(method, uri, headers, **kwargs)
+        if not digest:
+            return response
+
+        challenge = response.headers.get('www-authenticate', '')
+        if response.status_code == 401 and 'digest' in challenge.lower():
+            if self.auth.accept_challenge(uri, challenge, preemptive):
+                headers['Authorization'] = self.auth.authorization(method, uri)
+                response = await self._send(method, uri, headers, **kwargs)
+        elif preemptive:
+            self.auth.record_saved_challenge()
+
+        return response
+
+    async def get(self, uri, **kwargs):
+        return await self.request('GET', uri, **kwargs)
+
+    async def head(self, uri, **kwargs):
+        return await self.request('HEAD', uri, **kwargs)
+
+    async def post(self, uri, **kwargs):
+        return await self.request('POST', uri, **kwargs)
+
+    async def put(self, uri, **kwargs):
+        return await self.request('PUT', uri, **kwargs)
+
+    async def delete(self, uri, **kwargs):
+        return await self.request('DELETE', uri, **kwargs)
+
+    async def close(self):
+        """
+        Close the pooled sessions and release their connections.
+        """
+        for session in [self.rest_session, self.management_session]:
+            if session is not None:
+                await session.close()
+        self.rest_session = None
+        self.management_session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
@@ -0,0 +1,817 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Awaitable twins of the model CRUD methods.
+
+Each class here mirrors one of the model classes in
+:mod:`marklogic.models`. The methods take an
+:class:`marklogic.aio.connection.AsyncConnection` and work with the
+ordinary model objects, so a Database read with `AsyncDatabase.lookup`
+can be changed with its usual setters and saved with
+`AsyncDatabase.update` (or with the synchronous `Database.update`).
+"""
+
+import asyncio
+import json
+import logging
+import time
+import aiohttp
+from marklogic.models.database import Database
+from marklogic.models.forest import Forest
+from marklogic.models.host import Host
+from marklogic.models.privilege import Privilege
+from marklogic.models.role import Role
+from marklogic.models.server import Server
+from marklogic.models.user import User
+from marklogic.models.utilities.exceptions import UnexpectedManagementAPIResponse
+from marklogic.models.utilities.restart import RestartWaiter
+from marklogic.models.utilities.utilities import if_match, unmarshal_response
+
+
+async def _names(conn, model, resource):
+    """
+    Return the names from a management API default list.
+    """
+    response = await conn.get(model._collection_uri(conn),
+                              headers={'accept': 'application/json'})
+    if response.status_code != 200:
+        raise UnexpectedManagementAPIResponse(response.text)
+
+    items = json.loads(response.text)['{0}-default-list'.format(resource)]['list-items']
+    if 'list-item' not in items:
+        return []
+    return items['list-item']
+
+
+async def _exists(conn, uri):
+    response = await conn.head(uri)
+    if response.status_code == 200:
+        return True
+    elif response.status_code == 404:
+        return False
+    else:
+        raise UnexpectedManagementAPIResponse(response.text)
+
+
+async def _lookup(conn, uri, unmarshal):
+    """
+    Read a resource, like `Connection.lookup_resource` without the cache.
+
+    :return: The object, marked clean if it tracks changes, or None if
+        the resource does not exist
+    """
+    response = await conn.get(uri, headers={'accept': 'application/json'})
+    if response.status_code == 404:
+        return None
+    if response.status_code != 200:
+        raise UnexpectedManagementAPIResponse(response.text)
+
+    result = unmarshal_response(response, unmarshal)
+    if hasattr(result, 'mark_clean'):
+        result.mark_clean()
+    return result
+
+
+class AsyncDatabase:
+    """
+    Awaitable twins of the :class:`marklogic.models.database.Database`
+    CRUD methods.
+    """
+    @classmethod
+    async def create(cls, conn, database, workers=8, forest_lookup=False, rollback=True):
+        """
+        Create the database and its forests, like `Database.create`. The
+        forests are created first, at most `workers` of them at a time.
+        If a forest or the database can't be created, the forests that
+        were created are removed again (unless `rollback` is false) and
+        the error is raised.
+
+        :param conn: An AsyncConnection
+        :param database: The Database
+        :param workers: The maximum number of forests created concurrently
+        :param forest_lookup: Read each new forest back from the server
+        :param rollback: Remove the new forests if the creation fails
+        :return: The database object
+        """
+        forests = database._forests()
+        semaphore = asyncio.Semaphore(workers)
+
+        async def create_forest(forest):
+            async with semaphore:
+                await AsyncForest.create(conn, forest, lookup=forest_lookup)
+
+        errors = await asyncio.gather(*[create_forest(forest) for forest in forests],
+                                      return_exceptions=True)
+        created = [forest for forest, error in zip(forests, errors) if error is None]
+        for error in errors:
+            if error is not None:
+                if rollback:
+                    await cls._remove_forests(conn, created, workers)
+                raise error
+
+        database._config['forest'] = [forest.forest_name() for forest in forests]
+
+        response = await conn.post(Database._collection_uri(conn),
+                                   json=database._create_payload())
+        if response.status_code > 299:
+            if rollback:
+                await cls._remove_forests(conn, created, workers)
+            raise UnexpectedManagementAPIResponse(response.text)
+
+        return database
+
+    @classmethod
+    async def _remove_forests(cls, conn, forests, workers):
+        semaphore = asyncio.Semaphore(workers)
+
+        async def remove_forest(forest):
+            async with semaphore:
+                try:
+                    await AsyncForest.delete(conn, forest)
+                except Exception as e:
+                    logging.warning("Could not remove forest {0}: {1}"
+                                    .format(forest.forest_name(), e))
+
+        await asyncio.gather(*[remove_forest(forest) for forest in forests])
+
+    @classmethod
+    async def read(cls, conn, database):
+        """
+        Refresh the database properties from the server.
+
+        :return: The database object, or None if it does not exist
+        """
+        result = await cls.lookup(conn, database.database_name())
+        if result is None:
+            return None
+        database._config = result._config
+        database.etag = result.etag
+        return database.mark_clean()
+
+    @classmethod
+    async def update(cls, conn, database):
+        """
+        Save the database properties. Like `Database.update`, only the
+        properties that changed are sent if the database was read from
+        the server.
+
+        :return: The database object
+        """
+        struct = database._changes()
+        if not struct:
+            return database
+
+        response = await conn.put(Database._properties_uri(conn, database.name),
+                                  json=struct, headers=if_match(database.etag))
+        if response.status_code > 299:
+            raise UnexpectedManagementAPIResponse(response.text)
+
+        database._after_update(response)
+        return database
+
+    @classmethod
+    async def delete(cls, conn, database):
+        """
+        Remove the database and all its forests.
+
+        :return: The database object
+        """
+        response = await conn.delete(Database._delete_uri(conn, database.name))
+        if response.status_code > 299 and not response.status_code == 404:
+            raise UnexpectedManagementAPIResponse(response.text)
+
+        return database
+
+    @classmethod
+    async def lookup(cls, conn, name):
+        """
+        Lookup a database configuration by name.
+
+        :return: The Database, or None if it does not exist
+        """
+        return await _lookup(conn, Database._properties_uri(conn, name), Database.unmarshal)
+
+    @classmethod
+    async def list(cls, conn):
+        """
+        List the databases, like `Database.list_databases`.
+
+        :return: A list of (unread) Database objects
+        """
+        return [Database(item['nameref'])
+                for item in await _names(conn, Database, "database")]
+
+    @classmethod
+    async def exists(cls, conn, name):
+        """
+        Returns true if (and only if) the database exists.
+        """
+        return await _exists(conn, Database._properties_uri(conn, name))
+
+
+class AsyncForest:
+    """
+    Awaitable twins of the :class:`marklogic.models.forest.Forest`
+    CRUD methods.
+    """
+    @classmethod
+    async def create(cls, conn, forest, lookup=True):
+        """
+        Create the forest on the server.
+
+        :param lookup: Read the forest back from the server when it has been created
+        :return: The Forest read from the server, or the given forest
+        """
+        response = await conn.post(Forest._collection_uri(conn),
+                                   json=forest._create_payload())
+        if response.status_code > 299:
+            raise UnexpectedManagementAPIResponse(response.text)
+
+        if lookup:
+            return await cls.lookup(conn, forest.forest_name())
+        return forest
+
+    @classmethod
+    async def read(cls, conn, forest):
+        """
+        Refresh the forest from the server.
+
+        :return: The forest object
+        """
+        result = await cls.lookup(conn, forest.forest_name())
+        forest.config = result.config
+        forest.properties = result.properties
+        return forest
+
+    @classmethod
+    async def update(cls, conn, forest):
+        """
+        Save the forest configuration, like `Forest.save`.
+
+        :return: The forest object
+        """
+        response = await conn.put(Forest._properties_uri(conn, forest.forest_name()),
+                                  json=forest.config)
+        if response.status_code > 299:
+            raise UnexpectedManagementAPIResponse(response.text)
+
+        return forest
+
+    @classmethod
+    async def delete(cls, conn, forest):
+        """
+        Delete the forest, like `Forest.remove`.
+
+        :return: The forest object
+        """
+        response = await conn.delete(forest._delete_uri(conn))
+        if response.status_code > 299 and not response.status_code == 404:
+            raise UnexpectedManagementAPIResponse(response.text)
+
+        return forest
+
+    @classmethod
+    async def lookup(cls, conn, name):
+        """
+        Look up a forest's configuration. The properties and the config
+        view are fetched concurrently.
+
+        :return: The Forest
+        """
+        headers = {'accept': 'application/json'}
+        properties, config = await asyncio.gather(
+            conn.get(Forest._properties_uri(conn, name), headers=headers),
+            conn.get(Forest._view_uri(conn, name, 'config'), headers=headers))
+
+        for response in [properties, config]:
+            if response.status_code != 200:
+                raise UnexpectedManagementAPIResponse(response.text)
+
+        return Forest._from_views(json.loads(properties.text), json.loads(config.text))
+
+    @classmethod
+    async def list(cls, conn):
+        """
+        List the forest names.
+        """
+        return [item['nameref'] for item in await _names(conn, Forest, "forest")]
+
+    @classmethod
+    async def exists(cls, conn, name):
+        """
+        Returns true if (and only if) the forest exists.
+        """
+        return await _exists(conn, Forest._properties_uri(conn, name))
+
+
+class AsyncHost:
+    """
+    Awaitable twins of the :class:`marklogic.models.host.Host` methods.
+    Hosts join and leave a cluster through the Admin API, so there are
+    no create, update or delete methods.
+    """
+    @classmethod
+    async def read(cls, conn, host):
+        """
+        Refresh the host from the server.
+
+        :return: The host object, or None if it no longer exists
+        """
+        result = await cls.lookup(conn, host.host_name())
+        if result is None:
+            return None
+        host._config = result._config
+        return host
+
+    @classmethod
+    async def lookup(cls, conn, name):
+        """
+        Look up an individual host within the cluster.
+
+        :return: The Host, or None if it does not exist
+        """
+        response = await conn.get(Host._properties_uri(conn, name),
+                                  headers={'accept': 'application/json'})
+        result = None
+        if response.status_code == 200:
+            result = Host._from_properties(json.loads(response.text))
+        elif response.status_code != 404:
+            raise UnexpectedManagementAPIResponse(response.text)
+        return result
+
+    @classmethod
+    async def list(cls, conn):
+        """
+        List the host names in the cluster.
+        """
+        return [item['nameref'] for item in await _names(conn, Host, "host")]
+
+    @classmethod
+    async def exists(cls, conn, name):
+        """
+        Returns true if (and only if) the host exists.
+        """
+        return await _exists(conn, Host._properties_uri(conn, name))
+
+
+class AsyncRestartWaiter(RestartWaiter):
+    """
+    A :class:`marklogic.models.utilities.restart.RestartWaiter` for an
+    AsyncConnection. The hosts are polled concurrently as tasks, with
+    the same backoff and deadline.
+    """
+    async def restarting(self, conn, response, deadline=None):
+        """
+        The hosts that are restarting and the time they last started.
+
+        :return: A list of (host name, last startup) pairs
+        """
+        if deadline is None:
+            deadline = time.time() + self.timeout
+        entries = self._entries(response)
+        interval = self.interval
+        while True:
+            try:
+                names = {}
+                if self._needs_names(entries):
+                    names = dict((item['idref'], item['nameref'])
+                                 for item in await _names(conn, Host, "host"))
+                return self._resolve(conn, entries, names)
+            except (aiohttp.ClientError, OSError, asyncio.TimeoutError,
+                    UnexpectedManagementAPIResponse, KeyError, ValueError) as e:
+                error = e
+            if time.time() >= deadline:
+                raise self._names_timeout(error)
+            await asyncio.sleep(max(0, min(interval, deadline - time.time())))
+            interval = self._next_interval(interval)
+
+    async def wait(self, conn, response):
+        """
+        Wait for the hosts in a 202 response to restart.
+
+        :return: A dictionary of the seconds each host took to restart,
+            keyed by host name
+        """
+        start = time.time()
+        deadline = start + self.timeout
+        hosts = await self.restarting(conn, response, deadline)
+
+        async def poll(host, last_startup):
+            uri = self._timestamp_uri(host)
+            interval = self.interval
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise self._host_timeout(host)
+                try:
+                    reply = await conn.get(uri, timeout=aiohttp.ClientTimeout(
+                        total=min(remaining, 10.0)))
+                    startup = self._startup(reply.status_code, reply.text)
+                    if startup is not None and last_startup is None:
+                        last_startup = startup
+                    elif startup is not None and startup > last_startup:
+                        return time.time() - start
+                except (aiohttp.ClientError, OSError, asyncio.TimeoutError):
+                    pass
+                await asyncio.sleep(max(0, min(interval, deadline - time.time())))
+                interval = self._next_interval(interval)
+
+        latencies = await asyncio.gather(*[poll(host, last_startup)
+                                           for host, last_startup in hosts])
+        return dict(zip([host for host, last_startup in hosts], latencies))
+
+
+class AsyncServer:
+    """
+    Awaitable twins of the :class:`marklogic.models.server.Server`
+    CRUD methods.
+    """
+    @classmethod
+    async def create(cls, conn, server):
+        """
+        Create the server.
+
+        :return: The server object
+        """
+        response = await conn.post(Server._collection_uri(conn),
+                                   json=server._create_payload())
+        if response.status_code > 299:
+            raise UnexpectedManagementAPIResponse(response.text)
+
+        return server
+
+    @classmethod
+    async def read(cls, conn, server):
+        """
+        Refresh the server from the server.
+
+        :return: The server object, or None if it does not exist
+        """
+        result = await cls.lookup(conn, server.server_name(), server.group_name())
+        if result is None:
+            return None
+        server._config = result._config
+        server.etag = result.etag
+        return server.mark_clean()
+
+    @classmethod
+    async def update(cls, conn, server):
+        """
+        Save the server properties, waiting for a restart if the
+        change requires one. Like `Server.update`, only the properties
+        that changed are sent if the server was read from the server.
+
+        :return: The server object
+        """
+        struct = server._changes()
+        if not struct:
+            return server
+
+        response = await conn.put(Server._properties_uri(conn, server.name,
+                                                         server.group_name()),
+                                  json=struct, headers=if_match(server.etag))
+        if response.status_code > 299:
+            raise UnexpectedManagementAPIResponse(response.text)
+
+        server._after_update(response)
+
+        if response.status_code == 202:
+            await cls.wait_for_restart(conn, response)
+
+        return server
+
+    @classmethod
+    async def delete(cls, conn, server):
+        """
+        Delete the server, waiting for a restart if required.
+
+        :return: The server object
+        """
+        response = await conn.delete(Server._resource_uri(conn, server.server_name(),
+                                                          server.group_name()),
+                                     headers=if_match(server.etag,
+                                                      {'accept': 'application/json'}))
+        if response.status_code > 299 and not response.status_code == 404:
+            raise UnexpectedManagementAPIResponse(response.text)
+
+        if response.status_code == 202:
+            await cls.wait_for_restart(conn, response)
+
+        return server
+
+    @classmethod
+    async def lookup(cls, conn, name, group='Default'):
+        """
+        Returns a server configuration. The name may be a structured
+        "group|name" value, in which case the group parameter is ignored.
+
+        :return: The Server, or None if it does not exist
+        """
+        group, name = Server._split_name(name, group)
+        return await _lookup(conn, Server._properties_uri(conn, name, group),
+                             Server.unmarshal)
+
+    @classmethod
+    async def list(cls, conn):
+        """
+        List the servers as "group|name" values.
+        """
+        return ["{0}|{1}".format(item['groupnameref'], item['nameref'])
+                for item in await _names(conn, Server, "server")]
+
+    @classmethod
+    async def exists(cls, conn, name, group='Default'):
+        """
+        Returns true if (and only if) the server exists.
+        """
+        group, name = Server._split_name(name, group)
+        return await _exists(conn, Server._properties_uri(conn, name, group))
+
+    @classmethod
+    async def wait_for_restart(cls, conn, response, timeout=300.0):
+        """
+        Wait until every host that was restarted after a 202 response
+        has come back up.
+
+        :param timeout: The number of seconds to wait before raising
+            RestartTimeout
+        :return: The seconds each host took to restart, keyed by host name
+        """
+        return await AsyncRestartWaiter(timeout=timeout).wait(conn, response)
+
+
+class AsyncUser:
+    """
+    Awaitable twins of the :class:`marklogic.models.user.User`
+    CRUD methods.
+    """
+    @classmethod
+    async def create(cls, conn, user):
+        """
+        Create the user.
+
+        :return: The user object
+        """
+        response = await conn.post(User._collection_uri(conn), json=user._config)
+        if response.status_code not in [200, 201, 204]:
+            raise UnexpectedManagementAPIResponse(response.text)
+
+        return user
+
+    @classmethod
+    async def read(cls, conn, user):
+        """
+        Refresh the user from the server.
+
+        :return: The user object, or None if it does not exist
+        """
+        result = await cls.lookup(conn, user.user_name())
+        if result is None:
+            return None
+        user._config = result._config
+        user.etag = result.etag
+        return user
+
+    @classmethod
+    async def update(cls, conn, user):
+        """
+        Save the user properties.
+
+        :return: The user object
+        """
+        response = await conn.put(User._properties_uri(conn, user.name),
+                                  json=user._config, headers=if_match(user.etag))
+        if response.status_code not in [200, 204]:
+            raise UnexpectedManagementAPIResponse(response.text)
+
+        user._after_update(response)
+        return user
+
+    @classmethod
+    async def delete(cls, conn, user):
+        """
+        Delete the user.
+
+        :return: The user object
+        """
+        response = await conn.delete(User._resource_uri(conn, user.name),
+                                     headers=if_match(user.etag))
+        if response.status_code not in [200, 204, 404]:
+            raise UnexpectedManagementAPIResponse(response.text)
+
+        return user
+
+    @classmethod
+    async def lookup(cls, conn, name):
+        """
+        Look up an individual user.
+
+        :return: The User, or None if it does not exist
+        """
+        return await _lookup(conn, User._properties_uri(conn, name), User.unmarshal)
+
+    @classmethod
+    async def list(cls, conn):
+        """
+        List the user names.
+        """
+        return [item['nameref'] for item in await _names(conn, User, "user")]
+
+    @classmethod
+    async def exists(cls, conn, name):
+        """
+        Returns true if (and only if) the user exists.
+        """
+        return await _exists(conn, User._properties_uri(conn, name))
+
+
+class AsyncRole:
+    """
+    Awaitable twins of the :class:`marklogic.models.role.Role`
+    CRUD methods.
+    """
+    @classmethod
+    async def create(cls, conn, role):
+        """
+        Create the role.
+
+        :return: The role object
+        """
+        response = await conn.post(Role._collection_uri(conn), json=role._config)
+        if response.status_code not in [200, 201, 204]:
+            raise UnexpectedManagementAPIResponse(response.text)
+
+        return role
+
+    @classmethod
+    async def read(cls, conn, role):
+        """
+        Refresh the role from the server.
+
+        :return: The role object, or None if it does not exist
+        """
+        result = await cls.lookup(conn, role.role_name())
+        if result is None:
+            return None
+        role._config = result._config
+        role.etag = result.etag
+        return role
+
+    @classmethod
+    async def update(cls, conn, role):
+        """
+        Save the role properties.
+
+        :return: The role object
+        """
+        response = await conn.put(Role._properties_uri(conn, role.name),
+                                  json=role._config, headers=if_match(role.etag))
+        if response.status_code not in [200, 204]:
+            raise UnexpectedManagementAPIResponse(response.text)
+
+        role._after_update(response)
+        return role
+
+    @classmethod
+    async def delete(cls, conn, role):
+        """
+        Delete the role.
+
+        :return: The role object
+        """
+        response = await conn.delete(Role._resource_uri(conn, role.name))
+        if response.status_code not in [200, 204, 404]:
+            raise UnexpectedManagementAPIResponse(response.text)
+
+        return role
+
+    @classmethod
+    async def lookup(cls, conn, name):
+        """
+        Look up an individual role.
+
+        :return: The Role, or None if it does not exist
+        """
+        return await _lookup(conn, Role._properties_uri(conn, name), Role.unmarshal)
+
+    @classmethod
+    async def list(cls, conn):
+        """
+        List the role names.
+        """
+        return [item['nameref'] for item in await _names(conn, Role, "role")]
+
+    @classmethod
+    async def exists(cls, conn, name):
+        """
+        Returns true if (and only if) the role exists.
+        """
+        return await _exists(conn, Role._properties_uri(conn, name))
+
+
+class AsyncPrivilege:
+    """
+    Awaitable twins of the :class:`marklogic.models.privilege.Privilege`
+    CRUD methods. Names may be structured "kind|name" or
+    "kind|name|action" values, as returned by `list`.
+    """
+    @classmethod
+    async def create(cls, conn, privilege):
+        """
+        Create the privilege.
+
+        :return: The privilege object
+        """
+        response = await conn.post(Privilege._collection_uri(conn),
+                                   json=privilege._create_payload())
+        if response.status_code not in [200, 201, 204]:
+            raise UnexpectedManagementAPIResponse(response.text)
+
+        return privilege
+
+    @classmethod
+    async def read(cls, conn, privilege):
+        """
+        Refresh the privilege from the server.
+
+        :return: The privilege object, or None if it does not exist
+        """
+        result = await cls.lookup(conn, privilege.privilege_name(), privilege.kind())
+        if result is None:
+            return None
+        privilege._config = result._config
+        privilege.etag = result.etag
+        return privilege
+
+    @classmethod
+    async def update(cls, conn, privilege):
+        """
+        Save the privilege properties.
+
+        :return: The privilege object
+        """
+        response = await conn.put(Privilege._properties_uri(conn, privilege.privilege_name(),
+                                                            privilege.kind()),
+                                  json=privilege._config, headers=if_match(privilege.etag))
+        if response.status_code not in [200, 204]:
+            raise UnexpectedManagementAPIResponse(response.text)
+
+        privilege._after_update(response)
+        return privilege
+
+    @classmethod
+    async def delete(cls, conn, privilege):
+        """
+        Delete the privilege.
+
+        :return: The privilege object
+        """
+        response = await conn.delete(Privilege._resource_uri(conn, privilege.privilege_name(),
+                                                             privilege.kind()),
+                                     headers=if_match(privilege.etag))
+        if response.status_code not in [200, 204, 404]:
+            raise UnexpectedManagementAPIResponse(response.text)
+
+        return privilege
+
+    @classmethod
+    async def lookup(cls, conn, name, kind=None):
+        """
+        Look up an individual privilege.
+
+        :return: The Privilege, or None if it does not exist
+        """
+        kind, name = Privilege._split_name(name, kind)
+        return await _lookup(conn, Privilege._properties_uri(conn, name, kind),
+                             Privilege.unmarshal)
+
+    @classmethod
+    async def list(cls, conn):
+        """
+        List the privileges as "kind|name|action" values.
+        """
+        return ["{0}|{1}|{2}".format(item['kind'], item['nameref'], item['action'])
+                for item in await _names(conn, Privilege, "privilege")]
+
+    @classmethod
+    async def exists(cls, conn, name, kind=None):
+        """
+        Returns true if (and only if) the privilege exists.
+        """
+        kind, name = Privilege._split_name(name, kind)
+        return await _exists(conn, Privilege._properties_uri(conn, name, kind))
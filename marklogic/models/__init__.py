@@ -21,3 +21,7 @@ from marklogic.models.server import Server, HttpServer, XdbcServer, OdbcServer,
 from marklogic.models.host import Host
 from marklogic.models.role import Role
 from marklogic.models.privilege import Privilege
+from marklogic.models.snapshot import ClusterSnapshot
+from marklogic.models.layout import ForestLayout
+from marklogic.models.metrics import ForestMetrics
+from marklogic.models.rebalance import RebalanceAdvisor
@@ -19,25 +19,289 @@
 # Paul Hoehne       03/01/2015     Initial development
 #
 
+import copy
+import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPDigestAuth
+from marklogic.models.utilities.auth import NonceCachingDigestAuth
+from marklogic.models.utilities.cache import LookupCache
+from marklogic.models.utilities.retry import RetryPolicy
+from marklogic.models.utilities.topology import HostTopology
+from marklogic.models.utilities.utilities import unmarshal_response
+
+try:
+    from urllib.parse import urlparse, urlunparse
+except ImportError:
+    from urlparse import urlparse, urlunparse
+
+try:
+    from urllib3.exceptions import NewConnectionError
+except ImportError:
+    from requests.packages.urllib3.exceptions import NewConnectionError
 
 """
 Connection related classes and method to connect to MarkLogic.
 """
 
+# Requests that can be sent again to another host after a connection error
+_IDEMPOTENT = ['GET', 'HEAD', 'PUT', 'DELETE']
+
+# The position of a request body that can't be sent again
+_NOT_REWINDABLE = object()
+
+def _body_position(data):
+    """
+    Where to rewind a request body to before sending it again: its
+    position if it is a file, None if it needs no rewinding, or
+    _NOT_REWINDABLE if it is a stream that can only be read once.
+    """
+    if hasattr(data, 'read'):
+        try:
+            return data.tell()
+        except (AttributeError, IOError, OSError):
+            return _NOT_REWINDABLE
+    if hasattr(data, '__next__') or hasattr(data, 'next'):
+        return _NOT_REWINDABLE
+    return None
+
+def _not_sent(error):
+    """
+    True if a connection error happened before any of the request was sent.
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
 class Connection:
     """
     The connection class encapsulates the information to connect to
     a MarkLogic server.  The server (for the purpose of loading data
     or creating databases, will listen on ports 8000 and 8002.
     It depends on the database auth class from the requests package.
+
+    The connection owns two pooled, keep-alive HTTP sessions: one for
+    the REST port and one for the management port. All of the model
+    classes send their requests through these sessions so that TCP
+    connections (and the digest authentication state) are reused
+    across calls.
+
+    Plain digest credentials are upgraded to a NonceCachingDigestAuth
+    so that the server nonce is reused and requests are authenticated
+    without first being challenged.
+
+    Lookups are not cached unless `lookup_cache` is given, either as a
+    LookupCache or as True for a cache with the default bounds. With a
+    cache, repeated lookups of the same resource are revalidated with
+    its ETag and the server only sends the properties if they changed.
+
+    All requests go to `host` unless `topology` is given, either as a
+    HostTopology or as True for one with the default settings. With a
+    topology, document reads and writes addressed to `host` are spread
+    across the hosts of the cluster instead. If a host can't be reached
+    it is evicted for a while and reads, puts and deletes are retried
+    on another host. Management requests always go to `host`.
+
+    Failed requests are not retried unless `retry` is given, either as
+    a RetryPolicy or as True for the default policy. With a policy, a
+    request that fails with a busy status (such as 503) or a connection
+    error is sent again after a backoff, for every model class. POST
+    requests are only retried if they are sent with `idempotent=True`.
     """
-    def __init__(self, host, auth, port=8000, management_port=8002):
+    def __init__(self, host, auth, port=8000, management_port=8002,
+                 pool_size=10, lookup_cache=None, topology=None, retry=None):
         self.host = host
         self.port = port
         self.management_port = management_port
+        if type(auth) is HTTPDigestAuth:
+            auth = NonceCachingDigestAuth(auth.username, auth.password)
         self.auth = auth
+        self.pool_size = pool_size
+        self.rest_session = self._make_session()
+        self.management_session = self._make_session()
+        if lookup_cache is True:
+            lookup_cache = LookupCache()
+        self.lookup_cache = lookup_cache
+        if topology is True:
+            topology = HostTopology()
+        self.topology = topology
+        if retry is True:
+            retry = RetryPolicy()
+        self.retry = retry
 
     @classmethod
-    def make_connection(cls, host, username, password):
-        return Connection(host, HTTPDigestAuth(username, password))
\ No newline at end of file
+    def make_connection(cls, host, username, password, pool_size=10,
+                        lookup_cache=None, topology=None, retry=None):
+        return Connection(host, NonceCachingDigestAuth(username, password),
+                          pool_size=pool_size, lookup_cache=lookup_cache,
+                          topology=topology, retry=retry)
+
+    def challenges_saved(self):
+        """
+        The number of 401 challenge round trips that were avoided by
+        reusing a cached digest nonce.
+
+        :return: The number of saved round trips
+        """
+        return getattr(self.auth, 'challenges_saved', 0)
+
+    def _make_session(self):
+        """
+        Create a session with a connection pool of `pool_size`
+        connections per host.
+        """
+        session = requests.Session()
+        session.auth = self.auth
+        adapter = HTTPAdapter(pool_connections=self.pool_size,
+                              pool_maxsize=self.pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def session_for(self, uri):
+        """
+        Return the session that should be used for the given URI.
+        Requests addressed to the management port use the management
+        session, everything else uses the REST session.
+
+        :param uri: The request URI
+        :return: A requests Session
+        """
+        if urlparse(uri).port == self.management_port:
+            return self.management_session
+        return self.rest_session
+
+    def request(self, method, uri, idempotent=False, **kwargs):
+        """
+        Send an HTTP request over the appropriate pooled session.
+
+        :param method: The HTTP method
+        :param uri: The request URI
+        :param idempotent: The request can safely be sent again whatever
+            its method, for example a POST that writes documents
+        :return: The response
+        """
+        if self.retry is None:
+            return self._send(method, uri, idempotent, **kwargs)
+
+        # A file being uploaded has to be rewound before it is resent
+        data = kwargs.get('data')
+        position = _body_position(data)
+        if position is _NOT_REWINDABLE:
+            return self._send(method, uri, idempotent, **kwargs)
+
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = self._send(method, uri, idempotent, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if not self.retry.retryable(method, attempt, idempotent=idempotent):
+                    raise
+                response = None
+            else:
+                if not self.retry.retryable(method, attempt, response, idempotent):
+                    return response
+                response.close()
+            self.retry.wait(attempt, response)
+            if position is not None:
+                data.seek(position)
+
+    def _send(self, method, uri, idempotent, **kwargs):
+        if self.topology is not None and self._routable(uri):
+            return self._routed_request(method, uri, idempotent, **kwargs)
+        return self.session_for(uri).request(method, uri, **kwargs)
+
+    def _routable(self, uri):
+        parsed = urlparse(uri)
+        return parsed.hostname == self.host and parsed.port == self.port \
+          and parsed.path.startswith("/v1/documents")
+
+    def _routed_request(self, method, uri, idempotent, **kwargs):
+        parsed = urlparse(uri)
+        data = kwargs.get('data')
+        position = _body_position(data)
+        tried = []
+        error = None
+        while True:
+            host = self.topology.acquire(self, exclude=tried)
+            if host is None:
+                if error is not None:
+                    raise error
+                # No hosts are known, so use the one we were given
+                return self.rest_session.request(method, uri, **kwargs)
+            target = urlunparse(parsed._replace(netloc="{0}:{1}".format(host, self.port)))
+            try:
+                return self.rest_session.request(method, target, **kwargs)
+            except requests.exceptions.ConnectionError as e:
+                self.topology.fail(host)
+                if not idempotent and method.upper() not in _IDEMPOTENT:
+                    raise
+                # A stream that was partly sent can't be sent again
+                if position is _NOT_REWINDABLE and not _not_sent(e):
+                    raise
+                error = e
+                tried.append(host)
+                if position is not None and position is not _NOT_REWINDABLE:
+                    data.seek(position)
+            finally:
+                self.topology.release(host)
+
+    def lookup_resource(self, uri, unmarshal):
+        """
+        Read a JSON management resource and unmarshal it, through the
+        lookup cache if there is one. The object's etag is set from
+        the response.
+
+        :param uri: The resource URI
+        :param unmarshal: A function that builds the object from the JSON
+        :return: A (result, response) pair. The result is None unless
+            the resource was found.
+        """
+        headers = {'accept': 'application/json'}
+        cached = None
+        if self.lookup_cache is not None:
+            cached = self.lookup_cache.get(uri)
+            if cached is not None:
+                headers['if-none-match'] = cached[0]
+
+        response = self.get(uri, headers=headers)
+
+        if response.status_code == 304 and cached is not None:
+            self.lookup_cache.hits += 1
+            return copy.deepcopy(cached[1]), response
+
+        if response.status_code != 200:
+            if self.lookup_cache is not None:
+                self.lookup_cache.discard(uri)
+            return None, response
+
+        result = unmarshal_response(response, unmarshal)
+        etag = response.headers.get('etag')
+        if self.lookup_cache is not None:
+            self.lookup_cache.misses += 1
+            if etag is not None:
+                self.lookup_cache.put(uri, etag, result)
+        return result, response
+
+    def get(self, uri, **kwargs):
+        return self.request('GET', uri, **kwargs)
+
+    def head(self, uri, **kwargs):
+        return self.request('HEAD', uri, **kwargs)
+
+    def post(self, uri, **kwargs):
+        return self.request('POST', uri, **kwargs)
+
+    def put(self, uri, **kwargs):
+        return self.request('PUT', uri, **kwargs)
+
+    def delete(self, uri, **kwargs):
+        return self.request('DELETE', uri, **kwargs)
+
+    def close(self):
+        """
+        Close the pooled sessions and release their connections.
+        """
+        self.rest_session.close()
+        self.management_session.close()
@@ -26,14 +26,17 @@ Database related classes for manipulating MarkLogic databases
 
 from __future__ import unicode_literals, print_function, absolute_import
 
-import sys
+import os
+import time
 
-import requests
 import json
 import logging
 from marklogic.models.forest import Forest
+from marklogic.models.metrics import ForestMetrics
 from marklogic.models.utilities import files
-from marklogic.models.utilities.utilities import PropertyLists
+from marklogic.models.utilities.utilities import PropertyLists, ChangeTracking
+from marklogic.models.utilities.utilities import manage_uri, if_match
+from marklogic.models.utilities.concurrency import parallel_map
 from marklogic.models.utilities.validators import *
 from marklogic.models.utilities.exceptions import *
 from marklogic.models.database.fragment import FragmentRoot, FragmentParent
@@ -53,6 +56,11 @@ from marklogic.models.database.mergeblackout import MergeBlackoutOneTimeStartEnd
 from marklogic.models.database.scheduledbackup import ScheduledDatabaseBackup, ScheduledDatabaseBackupOnce
 from marklogic.models.database.scheduledbackup import ScheduledDatabaseBackupWeekly
 from marklogic.models.database.backup import DatabaseBackup, DatabaseRestore
+from marklogic.models.database.loader import BulkLoader
+from marklogic.models.database.journal import IngestJournal
+from marklogic.models.database.documents import DocumentBatch, content_type_for
+from marklogic.models.database.documents import iter_multipart, multipart_boundary
+from marklogic.models.database.exporter import BulkExporter
 from marklogic.models.database.path import PathNamespace
 from marklogic.models.database.lexicon import ElementWordLexicon
 from marklogic.models.database.lexicon import AttributeWordLexicon
@@ -62,7 +70,24 @@ from marklogic.models.database.through import ElementWordQueryThrough
 from marklogic.models.database.ruleset import RuleSet
 from marklogic.models.database.field import Field, RootField, PathField, FieldPath, WordQuery, IncludedElement, ExcludedElement
 
-class Database(PropertyLists):
+# Reads a page of URIs from the lexicon, starting at $after
+_URIS_XQUERY = """xquery version "1.0-ml";
+declare variable $after as xs:string external;
+declare variable $limit as xs:string external;
+declare variable $collection as xs:string external;
+declare variable $directory as xs:string external;
+declare variable $query as xs:string external;
+let $queries := (
+  if ($collection ne "") then cts:collection-query($collection) else (),
+  if ($directory ne "") then cts:directory-query($directory, "infinity") else (),
+  if ($query eq "") then ()
+  else if (fn:starts-with(fn:normalize-space($query), "<"))
+  then cts:query(xdmp:unquote($query)/node())
+  else cts:query(xdmp:unquote($query, (), "format-json")/node()))
+return cts:uris($after, fn:concat("limit=", $limit), cts:and-query($queries))
+"""
+
+class Database(PropertyLists, ChangeTracking):
     """
     The Database class encapsulates a MarkLogic database.  It provides
     methods to set/get database attributes.  The use of methods will
@@ -270,6 +295,22 @@ class Database(PropertyLists):
             return self._config['forest']
         return None
 
+    def forest_metrics(self, connection, workers=8):
+        """
+        Read the status and counts of all of the forests of the database
+        concurrently.
+
+        The result is a table with a column for each metric, from which
+        totals and the skew and imbalance between forests can be computed.
+
+        :param connection: The connection to a MarkLogic server
+        :param workers: The maximum number of concurrent requests
+        :return: A ForestMetrics object
+        """
+        names = [forest.forest_name() if isinstance(forest, Forest) else forest
+                 for forest in self.forest_names() or []]
+        return ForestMetrics.capture(connection, names, workers)
+
     def set_language(self, language):
         """
         Sets the default language assumed for content (if xml:lang
@@ -3146,6 +3187,23 @@ class Database(PropertyLists):
                                        journal_archiving, journal_archive_path,
                                        incremental, incremental_dir)
 
+    def restore_from_catalog(self, conn, catalog, before=None):
+        """
+        Start restoring the database from the latest consistent restore
+        point in a backup catalog: the latest full backup, or incremental
+        backup with its full backup, taken no later than `before`.
+
+        :param conn: The connection to a MarkLogic server
+        :param catalog: The BackupCatalog
+        :param before: The latest acceptable backup time, in seconds
+            since the epoch; the latest backup by default
+        :return: The DatabaseRestore job
+        """
+        point = catalog.restore_point(self.name, before)
+        if point is None:
+            raise ValueError("No backup of {0} to restore".format(self.name))
+        return self.restore(conn, **point.restore_settings())
+
     def clear(self, conn):
         """
         Clear the database.
@@ -3157,9 +3215,9 @@ class Database(PropertyLists):
         uri = "http://{0}:{1}/manage/v2/databases/{2}" \
           .format(conn.host, conn.management_port, self.name)
 
-        response = requests.post(uri, json=payload, auth=conn.auth,
-                                 headers={'content-type': 'application/json',
-                                          'accept': 'application/json'})
+        response = conn.post(uri, json=payload,
+                             headers={'content-type': 'application/json',
+                                      'accept': 'application/json'})
 
         if response.status_code > 299:
             raise UnexpectedManagementAPIResponse(response.text)
@@ -3177,9 +3235,9 @@ class Database(PropertyLists):
         uri = "http://{0}:{1}/manage/v2/databases/{2}" \
           .format(conn.host, conn.management_port, self.name)
 
-        response = requests.post(uri, json=payload, auth=conn.auth,
-                                 headers={'content-type': 'application/json',
-                                          'accept': 'application/json'})
+        response = conn.post(uri, json=payload,
+                             headers={'content-type': 'application/json',
+                                      'accept': 'application/json'})
 
         if response.status_code > 299:
             raise UnexpectedManagementAPIResponse(response.text)
@@ -3197,9 +3255,9 @@ class Database(PropertyLists):
         uri = "http://{0}:{1}/manage/v2/databases/{2}" \
           .format(conn.host, conn.management_port, self.name)
 
-        response = requests.post(uri, json=payload, auth=conn.auth,
-                                 headers={'content-type': 'application/json',
-                                          'accept': 'application/json'})
+        response = conn.post(uri, json=payload,
+                             headers={'content-type': 'application/json',
+                                      'accept': 'application/json'})
 
         if response.status_code > 299:
             raise UnexpectedManagementAPIResponse(response.text)
@@ -3208,48 +3266,92 @@ class Database(PropertyLists):
 
     # ============================================================
 
-    def create(self, connection):
+    def create(self, connection, workers=8, forest_lookup=False, rollback=True):
         """
         Create a new database defined by these parameters on the given connection.
 
+        The forests are created first, at most `workers` of them at a time.
+        If a forest or the database can't be created, the forests that were
+        created are removed again (unless `rollback` is false) and the error
+        is raised.
+
         :param connection: The server connection
+        :param workers: The maximum number of forests created concurrently
+        :param forest_lookup: Read each new forest back from the server
+        :param rollback: Remove the new forests if the creation fails
 
         :return: The database object
         """
-        uri = "http://{0}:{1}/manage/v2/databases" \
-          .format(connection.host, connection.management_port)
-
-        forest_names = []
-        # unicode doesn't exist in Python 3
-        if sys.version_info[0] < 3:
-            for forest_info in self._config['forest']:
-                if isinstance(forest_info, str) or isinstance(forest_info, unicode):
-                    new_forest = Forest(forest_info, host=self.hostname)
-                    new_forest.create(connection)
-                    forest_names.append(forest_info)
+        forests = self._forests()
 
-                elif isinstance(forest_info, Forest):
-                    forest_info.create(connection)
-                    forest_names.append(forest_info.name())
-        else:
-            for forest_info in self._config['forest']:
-                if isinstance(forest_info, str):
-                    new_forest = Forest(forest_info, host=self.hostname)
-                    new_forest.create(connection)
-                    forest_names.append(forest_info)
+        def create_forest(forest):
+            try:
+                forest.create(connection, lookup=forest_lookup)
+            except Exception as e:
+                return e
+            return None
 
-                elif isinstance(forest_info, Forest):
-                    forest_info.create(connection)
-                    forest_names.append(forest_info.name())
+        errors = parallel_map(create_forest, forests, workers)
+        created = [forest for forest, error in zip(forests, errors) if error is None]
+        for error in errors:
+            if error is not None:
+                if rollback:
+                    self._remove_forests(connection, created, workers)
+                raise error
 
-        self._config['forest'] = forest_names
+        self._config['forest'] = [forest.forest_name() for forest in forests]
 
-        response = requests.post(uri, json=self._config, auth=connection.auth)
+        response = connection.post(Database._collection_uri(connection),
+                                   json=self._create_payload())
         if response.status_code > 299:
+            if rollback:
+                self._remove_forests(connection, created, workers)
             raise UnexpectedManagementAPIResponse(response.text)
 
         return self
 
+    @classmethod
+    def _collection_uri(cls, connection):
+        return manage_uri(connection, "databases")
+
+    @classmethod
+    def _properties_uri(cls, connection, name):
+        return manage_uri(connection, "databases/{0}/properties", name)
+
+    @classmethod
+    def _delete_uri(cls, connection, name):
+        return manage_uri(connection, "databases/{0}?forest-delete=data", name)
+
+    def _forests(self):
+        """
+        The database's forests as Forest objects, to be created with it.
+        """
+        forests = []
+        for forest_info in self._config['forest']:
+            if isinstance(forest_info, Forest):
+                forests.append(forest_info)
+            else:
+                forests.append(Forest(forest_info, host=self.hostname))
+        return forests
+
+    def _create_payload(self):
+        return self.marshal()
+
+    def _after_update(self, response):
+        # In case we renamed it
+        self.name = self._config['database-name']
+        if self.is_tracked():
+            self.mark_clean()
+
+    def _remove_forests(self, connection, forests, workers):
+        def remove_forest(forest):
+            try:
+                forest.remove(connection)
+            except Exception as e:
+                logging.warning("Could not remove forest {0}: {1}"
+                                .format(forest.forest_name(), e))
+        parallel_map(remove_forest, forests, workers)
+
     def read(self, connection):
         """
         Loads the database from the MarkLogic server. This will refresh
@@ -3258,13 +3360,13 @@ class Database(PropertyLists):
         :param connection: The connection to a MarkLogic server
         :return: The server object
         """
-        database = Server.lookup(connection, self.database_name())
+        database = Database.lookup(connection, self.database_name())
         if database is None:
             return None
         else:
             self._config = database._config
             self.etag = database.etag
-            return self
+            return self.mark_clean()
 
     def update(self, connection):
         """
@@ -3272,27 +3374,25 @@ class Database(PropertyLists):
         If the database already exists on the
         given connection, then you can update the settings with this method.
 
+        If the configuration was read from the server (with `lookup` or
+        `read`), only the properties that changed are sent (see `diff`),
+        and nothing is sent if none did.
+
         :param connection:The server connection
 
         :return: The database object
         """
-        uri = "http://{0}:{1}/manage/v2/databases/{2}/properties" \
-          .format(connection.host, connection.management_port, self.name)
-
-        headers = {}
-        if self.etag is not None:
-            headers['if-match'] = self.etag
+        struct = self._changes()
+        if not struct:
+            return self
 
-        struct = self.marshal()
-        response = requests.put(uri, json=struct, auth=connection.auth,
-                                headers=headers)
+        response = connection.put(Database._properties_uri(connection, self.name),
+                                  json=struct, headers=if_match(self.etag))
 
         if response.status_code > 299:
             raise UnexpectedManagementAPIResponse(response.text)
 
-        # In case we renamed it
-        self.name = self._config['database-name']
-
+        self._after_update(response)
         return self
 
     def delete(self, connection):
@@ -3303,44 +3403,97 @@ class Database(PropertyLists):
 
         :return: The database object
         """
-        uri = "http://{0}:{1}/manage/v2/databases/{2}?forest-delete=data" \
-          .format(connection.host, connection.management_port, self.name)
-        response = requests.delete(uri, auth=connection.auth)
+        response = connection.delete(Database._delete_uri(connection, self.name))
 
         if response.status_code > 299 and not response.status_code == 404:
             raise UnexpectedManagementAPIResponse(response.text)
 
         return self
 
-    def load_file(self, connection, path, uri, collections=None, content_type="application/json"):
+    def load_file(self, connection, path, uri, collections=None, content_type=None,
+                  host=None):
         """
         Load a given file into a given database.
 
+        The file is opened in binary mode and streamed to the server, so
+        binary files are sent unchanged and memory use does not depend
+        on the size of the file.
+
         :param connection: The server connection
         :param path: The path to the file
         :param uri: The uri for the file contents in the database
         :param collections: A list of collections
-        :param content_type: The content type of the data
+        :param content_type: The content type of the data, guessed from the file extension if not given
+        :param host: The cluster host to send the document to, defaults to the connection host
 
         :return: The database object
         """
+        if host is None:
+            host = connection.host
+
         doc_url = "http://{0}:{1}/v1/documents?uri={2}&database={3}" \
-          .format(connection.host, connection.port, uri, self.name)
+          .format(host, connection.port, uri, self.name)
 
         if collections is not None:
             for collection in collections:
                 doc_url += ("&collection=" + collection)
 
-        with open(path) as data_file:
-            file_data = data_file.read()
-            response = requests.put(doc_url, data=file_data, auth=connection.auth,
-                                    headers={'content-type': content_type})
+        if content_type is None:
+            content_type = content_type_for(path)
+
+        with open(path, 'rb') as data_file:
+            response = connection.put(doc_url, data=data_file,
+                                      headers={'content-type': content_type})
             if response.status_code > 299:
                 raise UnexpectedAPIResponse(response.text)
 
         return self
 
-    def load_directory_files(self, connection, path, prefix="/", collections=None, content_type="application/json"):
+    def write_documents(self, connection, documents, collections=None, permissions=None,
+                        batch_size=100, batch_bytes=1048576):
+        """
+        Write documents in batches. Each batch is sent as a single
+        multipart/mixed POST to /v1/documents.
+
+        A batch is sent when it holds `batch_size` documents or when
+        its content reaches `batch_bytes` bytes, whichever comes first.
+        Writing a batch again has the same result, so batches are retried
+        like PUT requests if the connection has a retry policy.
+
+        :param connection: The server connection
+        :param documents: An iterable of (uri, content, metadata) tuples. The
+            content may be text, bytes, or a structure to serialize as JSON. The
+            metadata may be None or a dictionary of REST API document metadata.
+        :param collections: Collections for every document
+        :param permissions: Permissions for every document
+        :param batch_size: The maximum number of documents in a batch
+        :param batch_bytes: The maximum content size of a batch
+
+        :return: The database object
+        """
+        batch = DocumentBatch(collections, permissions)
+        for uri, content, metadata in documents:
+            batch.add(uri, content, metadata)
+            if batch.count >= batch_size or batch.size >= batch_bytes:
+                self._write_batch(connection, batch)
+                batch = DocumentBatch(collections, permissions)
+
+        if batch.count > 0:
+            self._write_batch(connection, batch)
+
+        return self
+
+    def _write_batch(self, connection, batch):
+        doc_url = "http://{0}:{1}/v1/documents?database={2}" \
+          .format(connection.host, connection.port, self.name)
+
+        response = connection.post(doc_url, data=batch.body(), idempotent=True,
+                                   headers={'content-type': batch.content_type(),
+                                            'accept': 'application/json'})
+        if response.status_code > 299:
+            raise UnexpectedAPIResponse(response.text)
+
+    def load_directory_files(self, connection, path, prefix="/", collections=None, content_type=None):
         """
         Load all the given files in a directory.  It will combine the prefix with the filename to generate
         a uri for the file on the server.
@@ -3349,36 +3502,331 @@ class Database(PropertyLists):
         :param path: The path to the directory
         :param prefix: The prefix to the individuals files
         :param collections: A list of collections to use for the files
-        :param content_type: The content type of the files
+        :param content_type: The content type of the files, guessed from each extension if not given
 
         :return: The database object
         """
-        file_list = files.walk_directories(path)
-        for result in file_list:
+        for result in files.iter_directory(path, symlinks='follow'):
             self.load_file(connection, result['partial-directory'], prefix + result['filename'],
                            collections=collections, content_type=content_type)
         return self
 
-    def load_directory(self, connection, path, prefix="/", collections=None, content_type="application/json"):
+    def load_directory(self, connection, path, prefix="/", collections=None, content_type=None,
+                       journal=None):
         """
         Load all the file in a directory, preserving the partial path between the directory root and the
         file.  So a file located at /data/files/myfile.xml, with a prefix parameter of '/data' will be
         loaded as /files/myfile.xml.  (Using the default prefix).
 
+        If a journal is given, each file is recorded in it once it has been loaded and files that
+        the journal records as already loaded (with the same size and modification time) are
+        skipped.  Running an interrupted load again with the same journal resumes it.
+
         :param connection: The server connection
         :param path: The path to the directory root
         :param prefix: The prefix to use when constructing the server URI for the file
         :param collections: The collections to use for the files
-        :param content_type: The content type of the files
+        :param content_type: The content type of the files, guessed from each extension if not given
+        :param journal: An IngestJournal, or the path of the journal file
 
         :return: The database object
         """
-        file_list = files.walk_directories(path)
-        for result in file_list:
-            self.load_file(connection, result['partial-directory'], prefix + result['partial-directory'],
-                           collections=collections, content_type=content_type)
+        ingest_journal = self._open_journal(journal)
+        try:
+            for result in files.iter_directory(path, symlinks='follow'):
+                fpath = result['partial-directory']
+                uri = prefix + result['partial-directory']
+                stat = None
+                if ingest_journal is not None:
+                    stat = os.stat(fpath)
+                    if ingest_journal.is_complete(fpath, uri, stat):
+                        continue
+                self.load_file(connection, fpath, uri,
+                               collections=collections, content_type=content_type)
+                if ingest_journal is not None:
+                    ingest_journal.record(fpath, uri, stat)
+        finally:
+            self._close_journal(journal, ingest_journal)
         return self
 
+    def _open_journal(self, journal):
+        if journal is None or isinstance(journal, IngestJournal):
+            return journal
+        return IngestJournal(journal)
+
+    def _close_journal(self, journal, ingest_journal):
+        if ingest_journal is None:
+            return
+        if ingest_journal is journal:
+            ingest_journal.commit()
+        else:
+            ingest_journal.close()
+
+    def bulk_load_directory(self, connection, path, prefix="/", collections=None,
+                            content_type=None, workers=8,
+                            host_limit=None, hosts=None, progress=None,
+                            include=None, exclude=None, symlinks='files',
+                            journal=None):
+        """
+        Load all the files in a directory in parallel. URIs are constructed
+        as in `load_directory`. Unlike `load_directory`, a failure does not
+        stop the load; failed files are reported in the summary.
+
+        With a journal, the load is resumable as described for `load_directory`;
+        files that are skipped are counted in the summary.
+
+        :param connection: The server connection
+        :param path: The path to the directory root
+        :param prefix: The prefix to use when constructing the server URI for the file
+        :param collections: The collections to use for the files
+        :param content_type: The content type of the files, guessed from each extension if not given
+        :param workers: The number of concurrent uploads
+        :param host_limit: The maximum number of concurrent uploads per host
+        :param hosts: The cluster hosts to spread the uploads across
+        :param progress: A callable `progress(summary, path, uri, error)`
+        :param include: Glob patterns of files to load
+        :param exclude: Glob patterns of files and directories to skip
+        :param symlinks: The symbolic link policy, see `files.iter_directory`
+        :param journal: An IngestJournal, or the path of the journal file
+
+        :return: A LoadSummary
+        """
+        ingest_journal = self._open_journal(journal)
+        try:
+            loader = BulkLoader(connection, self, workers=workers, host_limit=host_limit,
+                                hosts=hosts, collections=collections,
+                                content_type=content_type, progress=progress,
+                                journal=ingest_journal)
+            walker = files.iter_directory(path, include=include, exclude=exclude,
+                                          symlinks=symlinks)
+            return loader.load((result['partial-directory'], prefix + result['partial-directory'])
+                               for result in walker)
+        finally:
+            self._close_journal(journal, ingest_journal)
+
+    def sync_directory(self, connection, path, manifest, prefix="/", collections=None,
+                       content_type=None, delete=False, verify=False, workers=8,
+                       host_limit=None, hosts=None, progress=None,
+                       include=None, exclude=None, symlinks='files'):
+        """
+        Bring the database up to date with a directory, uploading only the
+        files that are new or whose content has changed since the last sync.
+
+        The manifest records the content hash of every file that has been
+        loaded. Files whose content matches the manifest are skipped. With
+        `verify`, a skipped file is uploaded anyway if its document no longer
+        exists on the server. With `delete`, documents in the manifest whose
+        source file was under `path`, would pass the filters and has
+        disappeared are deleted from the database. Nothing is deleted if
+        any directory could not be read.
+
+        URIs are constructed as in `load_directory`.
+
+        :param connection: The server connection
+        :param path: The path to the directory root
+        :param manifest: An IngestJournal, or the path of the manifest file
+        :param prefix: The prefix to use when constructing the server URI for the file
+        :param collections: The collections to use for the files
+        :param content_type: The content type of the files, guessed from each extension if not given
+        :param delete: Delete documents whose source file has been removed
+        :param verify: Check that unchanged documents exist on the server
+        :param workers: The number of concurrent uploads
+        :param host_limit: The maximum number of concurrent uploads per host
+        :param hosts: The cluster hosts to spread the uploads across
+        :param progress: A callable `progress(summary, path, uri, error)`
+        :param include: Glob patterns of files to load
+        :param exclude: Glob patterns of files and directories to skip
+        :param symlinks: The symbolic link policy, see `files.iter_directory`
+
+        :return: A LoadSummary with the loaded, skipped and deleted counts
+        """
+        ingest_journal = self._open_journal(manifest)
+        try:
+            loader = BulkLoader(connection, self, workers=workers, host_limit=host_limit,
+                                hosts=hosts, collections=collections,
+                                content_type=content_type, progress=progress,
+                                journal=ingest_journal, verify=verify)
+            seen = set()
+            errors = []
+
+            def documents():
+                walker = files.iter_directory(path, include=include, exclude=exclude,
+                                              symlinks=symlinks, onerror=errors.append)
+                for result in walker:
+                    uri = prefix + result['partial-directory']
+                    seen.add(uri)
+                    yield result['partial-directory'], uri
+
+            start = time.time()
+            summary = loader.load(documents())
+
+            if delete and errors:
+                logging.warning("Not deleting documents: {0} directories could not be read"
+                                .format(len(errors)))
+            elif delete:
+                removed = [uri for uri, source in ingest_journal.records()
+                           if uri not in seen
+                           and self._removed_source(path, prefix, uri, source,
+                                                    include, exclude)]
+                self.delete_documents(connection, removed)
+                for uri in removed:
+                    ingest_journal.forget(uri)
+                ingest_journal.commit()
+                summary.deleted = len(removed)
+                summary.elapsed = time.time() - start
+
+            return summary
+        finally:
+            self._close_journal(manifest, ingest_journal)
+
+    def _removed_source(self, root, prefix, uri, source, include, exclude):
+        """
+        Whether a manifest record is for a file that this sync would
+        have loaded, but which no longer exists.
+        """
+        if source is None or uri != prefix + source or os.path.lexists(source):
+            return False
+        root = os.path.normpath(os.path.abspath(root))
+        source = os.path.normpath(os.path.abspath(source))
+        if not source.startswith(root.rstrip(os.sep) + os.sep):
+            return False
+        relative = os.path.relpath(source, root).replace(os.sep, '/')
+        return files.selected(relative, include, exclude)
+
+    def document_exists(self, connection, uri, host=None):
+        """
+        Check whether a document exists in the database.
+
+        :param connection: The server connection
+        :param uri: The document URI
+        :param host: The cluster host to ask, defaults to the connection host
+
+        :return: True if the document exists
+        """
+        if host is None:
+            host = connection.host
+
+        doc_url = "http://{0}:{1}/v1/documents".format(host, connection.port)
+        response = connection.head(doc_url, params={'uri': uri, 'database': self.name})
+        if response.status_code == 200:
+            return True
+        if response.status_code == 404:
+            return False
+        raise UnexpectedAPIResponse(response.text)
+
+    def delete_documents(self, connection, uris, batch_size=100):
+        """
+        Delete documents from the database, several per request.
+
+        :param connection: The server connection
+        :param uris: The URIs of the documents
+        :param batch_size: The maximum number of documents per request
+
+        :return: The database object
+        """
+        doc_url = "http://{0}:{1}/v1/documents".format(connection.host, connection.port)
+        uris = list(uris)
+        for offset in range(0, len(uris), batch_size):
+            params = [('database', self.name)]
+            params.extend(('uri', uri) for uri in uris[offset:offset + batch_size])
+            response = connection.delete(doc_url, params=params)
+            if response.status_code > 299:
+                raise UnexpectedAPIResponse(response.text)
+        return self
+
+    def iter_uris(self, connection, collection=None, directory=None, query=None,
+                  page_size=1000):
+        """
+        Iterate over the URIs of the documents in the database, in
+        lexicon order, reading them from the server a page at a time.
+
+        This evaluates cts:uris through /v1/eval, so it needs the URI
+        lexicon enabled and a user with the privilege to evaluate code.
+
+        :param connection: The server connection
+        :param collection: Only documents in this collection
+        :param directory: Only documents in this directory, at any depth
+        :param query: Only documents matching this serialized cts query,
+            as XML or JSON text or a structure to serialize as JSON
+        :param page_size: The number of URIs read per request
+
+        :return: A generator of URIs
+        """
+        if page_size < 1:
+            raise ValueError("The page size must be at least one")
+        if isinstance(query, (dict, list)):
+            query = json.dumps(query)
+
+        eval_url = "http://{0}:{1}/v1/eval".format(connection.host, connection.port)
+        after = ""
+        while True:
+            # After the first page, cts:uris starts with the last URI read
+            limit = page_size if after == "" else page_size + 1
+            data = {
+                'xquery': _URIS_XQUERY,
+                'vars': json.dumps({'after': after, 'limit': str(limit),
+                                    'collection': collection or "",
+                                    'directory': directory or "",
+                                    'query': query or ""}),
+                'database': self.name
+                }
+            response = connection.post(eval_url, data=data,
+                                       headers={'accept': 'multipart/mixed'})
+            if response.status_code != 200:
+                raise UnexpectedAPIResponse(response.text)
+
+            count = 0
+            new = 0
+            boundary = multipart_boundary(response.headers.get('content-type'))
+            if boundary is not None:
+                value = None
+                for event, chunk in iter_multipart([response.content], boundary):
+                    if event == 'headers':
+                        value = b""
+                    elif event == 'data':
+                        value += chunk
+                    else:
+                        count += 1
+                        uri = value.decode('utf-8')
+                        if uri != after:
+                            after = uri
+                            new += 1
+                            yield uri
+
+            if new == 0 or count < limit:
+                return
+
+    def export_documents(self, connection, destination, collection=None, directory=None,
+                         query=None, uris=None, batch_size=100, workers=4, progress=None):
+        """
+        Export documents to a directory or an archive, in parallel.
+
+        The URIs are paged through with `iter_uris` unless they are
+        given, and the documents are streamed to disk, so exports of any
+        size run in bounded memory. A failure does not stop the export;
+        failed and missing documents are reported in the summary.
+
+        :param connection: The server connection
+        :param destination: A directory, the path of a .zip, .tar, .tar.gz
+            or .tgz archive, or a sink (see `exporter.sink_for`)
+        :param collection: Only documents in this collection
+        :param directory: Only documents in this directory, at any depth
+        :param query: Only documents matching this serialized cts query
+        :param uris: The URIs of the documents to export, instead of
+            selecting them by collection, directory and query
+        :param batch_size: The number of documents per request
+        :param workers: The number of concurrent requests
+        :param progress: A callable `progress(summary, uri, error)`
+
+        :return: An ExportSummary
+        """
+        if uris is None:
+            uris = self.iter_uris(connection, collection=collection,
+                                  directory=directory, query=query)
+        exporter = BulkExporter(connection, self, destination, batch_size=batch_size,
+                                workers=workers, progress=progress)
+        return exporter.export(uris)
+
     @classmethod
     def lookup(cls, connection, name):
         """
@@ -3389,29 +3837,23 @@ class Database(PropertyLists):
 
         :return: The database configuration
         """
-        uri = "http://{0}:{1}/manage/v2/databases/{2}/properties" \
-          .format(connection.host, connection.management_port, name)
+        uri = Database._properties_uri(connection, name)
 
         logging.info("Reading database configuration: {0}".format(name))
 
-        response = requests.get(uri, auth=connection.auth,
-                                headers={'accept': 'application/json'})
-
-        result = None
-        if response.status_code == 200:
-            result = Database.unmarshal(json.loads(response.text))
-            if 'etag' in response.headers:
-                result.etag = response.headers['etag']
+        result, response = connection.lookup_resource(uri, Database.unmarshal)
 
-        elif response.status_code != 404:
+        if result is None and response.status_code != 404:
             raise UnexpectedManagementAPIResponse(response.text)
 
+        if result is not None:
+            result.mark_clean()
         return result
 
     @classmethod
     def list_databases(cls, connection):
-        uri = "http://{0}:{1}/manage/v2/databases".format(connection.host, connection.management_port)
-        response = requests.get(uri, auth=connection.auth, headers={'accept': 'application/json'})
+        response = connection.get(Database._collection_uri(connection),
+                                  headers={'accept': 'application/json'})
 
         if response.status_code == 200:
             response_json = json.loads(response.text)
@@ -4008,7 +4450,7 @@ class Database(PropertyLists):
         doc_url = "http://{0}:{1}/v1/documents?uri={2}&database={3}" \
           .format(conn.host, conn.port, document_uri, self.name)
 
-        response = requests.get(doc_url, auth=conn.auth, headers={'accept': content_type})
+        response = conn.get(doc_url, headers={'accept': content_type})
         if response.status_code == 404:
             return None
         elif response.status_code == 200:
@@ -23,15 +23,15 @@
 Classes for dealing with scheduled backups
 """
 
-import requests
 import json
 from marklogic.models.utilities.validators import *
 from marklogic.models.utilities.exceptions import *
+from marklogic.models.database.monitor import MonitoredJob
 
-class DatabaseBackup:
+class DatabaseBackup(MonitoredJob):
     """
     The DatabaseBackup class represents a backup job that is running
-    on the server.
+    on the server. Use `wait` or `watch` to follow its progress.
     """
     def __init__(self, job_id, database_name, host_name=None):
         """
@@ -53,30 +53,20 @@ class DatabaseBackup:
         Start a backup on the server and return an object that represents
         that job.
         """
+        settings = cls.backup_settings(backup_dir, forests,
+                                       journal_archiving, journal_archive_path,
+                                       lag_limit, incremental, incremental_dir)
         payload = {
-            'operation': 'backup-database',
-            'backup-dir': backup_dir,
-            'journal-archiving': assert_type(journal_archiving, bool),
-            'lag-limit': assert_type(lag_limit, int),
-            'incremental': assert_type(incremental, bool),
+            'operation': 'backup-database'
             }
-
-        if forests is not None:
-            payload['forest'] = assert_list_of_type(forests, str)
-
-        if journal_archiving:
-            payload['journal-archive-path'] \
-              = assert_type(journal_archive_path, str)
-
-        if incremental:
-            payload['incremental-dir'] = assert_type(incremental_dir, str)
+        payload.update(settings)
 
         uri = "http://{0}:{1}/manage/v2/databases/{2}" \
           .format(conn.host, conn.management_port, database_name)
 
-        response = requests.post(uri, json=payload, auth=conn.auth,
-                                 headers={'content-type': 'application/json',
-                                          'accept': 'application/json'})
+        response = conn.post(uri, json=payload,
+                             headers={'content-type': 'application/json',
+                                      'accept': 'application/json'})
 
         if response.status_code > 299:
             raise UnexpectedManagementAPIResponse(response.text)
@@ -86,8 +76,20 @@ class DatabaseBackup:
         if 'host-name' in result:
             host_name = result['host-name']
         backup = DatabaseBackup(result['job-id'], database_name, host_name)
+        backup.settings = settings
+
+        return backup
 
-        backup.settings = {
+    @classmethod
+    def backup_settings(cls, backup_dir, forests=None,
+                        journal_archiving=False, journal_archive_path=None,
+                        lag_limit=30,
+                        incremental=False, incremental_dir=None):
+        """
+        The settings of a backup, as sent to the server. The arguments
+        are the same as for `backup`.
+        """
+        settings = {
             'backup-dir': backup_dir,
             'journal-archiving': assert_type(journal_archiving, bool),
             'lag-limit': assert_type(lag_limit, int),
@@ -95,16 +97,16 @@ class DatabaseBackup:
             }
 
         if forests is not None:
-            backup.settings['forest'] = assert_list_of_type(forests, str)
+            settings['forest'] = assert_list_of_type(forests, str)
 
         if journal_archiving:
-            backup.settings['journal-archive-path'] \
+            settings['journal-archive-path'] \
               = assert_type(journal_archive_path, str)
 
         if incremental:
-            backup.settings['incremental-dir'] = assert_type(incremental_dir, str)
+            settings['incremental-dir'] = assert_type(incremental_dir, str)
 
-        return backup
+        return settings
 
     def status(self, conn):
         """
@@ -121,9 +123,9 @@ class DatabaseBackup:
         uri = "http://{0}:{1}/manage/v2/databases/{2}" \
           .format(conn.host, conn.management_port, self.database_name)
 
-        response = requests.post(uri, json=payload, auth=conn.auth,
-                                 headers={'content-type': 'application/json',
-                                          'accept': 'application/json'})
+        response = conn.post(uri, json=payload,
+                             headers={'content-type': 'application/json',
+                                      'accept': 'application/json'})
 
         if response.status_code > 299:
             raise UnexpectedManagementAPIResponse(response.text)
@@ -142,9 +144,9 @@ class DatabaseBackup:
         uri = "http://{0}:{1}/manage/v2/databases/{2}" \
           .format(conn.host, conn.management_port, self.database_name)
 
-        response = requests.post(uri, json=payload, auth=conn.auth,
-                                 headers={'content-type': 'application/json',
-                                          'accept': 'application/json'})
+        response = conn.post(uri, json=payload,
+                             headers={'content-type': 'application/json',
+                                      'accept': 'application/json'})
 
         if response.status_code > 299:
             raise UnexpectedManagementAPIResponse(response.text)
@@ -164,9 +166,9 @@ class DatabaseBackup:
         uri = "http://{0}:{1}/manage/v2/databases/{2}" \
           .format(conn.host, conn.management_port, self.database_name)
 
-        response = requests.post(uri, json=payload, auth=conn.auth,
-                                 headers={'content-type': 'application/json',
-                                          'accept': 'application/json'})
+        response = conn.post(uri, json=payload,
+                             headers={'content-type': 'application/json',
+                                      'accept': 'application/json'})
 
         if response.status_code > 299:
             raise UnexpectedManagementAPIResponse(response.text)
@@ -188,19 +190,19 @@ class DatabaseBackup:
         uri = "http://{0}:{1}/manage/v2/databases/{2}" \
           .format(conn.host, conn.management_port, self.database_name)
 
-        response = requests.post(uri, json=payload, auth=conn.auth,
-                                 headers={'content-type': 'application/json',
-                                          'accept': 'application/json'})
+        response = conn.post(uri, json=payload,
+                             headers={'content-type': 'application/json',
+                                      'accept': 'application/json'})
 
         if response.status_code > 299:
             raise UnexpectedManagementAPIResponse(response.text)
 
         return json.loads(response.text)
 
-class DatabaseRestore:
+class DatabaseRestore(MonitoredJob):
     """
     The DatabaseRestore class represents a restore job that is running
-    on the server.
+    on the server. Use `wait` or `watch` to follow its progress.
     """
     def __init__(self, job_id, database_name, host_name=None):
         """
@@ -241,9 +243,9 @@ class DatabaseRestore:
         uri = "http://{0}:{1}/manage/v2/databases/{2}" \
           .format(conn.host, conn.management_port, database_name)
 
-        response = requests.post(uri, json=payload, auth=conn.auth,
-                                 headers={'content-type': 'application/json',
-                                          'accept': 'application/json'})
+        response = conn.post(uri, json=payload,
+                             headers={'content-type': 'application/json',
+                                      'accept': 'application/json'})
 
         if response.status_code > 299:
             raise UnexpectedManagementAPIResponse(response.text)
@@ -287,9 +289,9 @@ class DatabaseRestore:
         uri = "http://{0}:{1}/manage/v2/databases/{2}" \
           .format(conn.host, conn.management_port, self.database_name)
 
-        response = requests.post(uri, json=payload, auth=conn.auth,
-                                 headers={'content-type': 'application/json',
-                                          'accept': 'application/json'})
+        response = conn.post(uri, json=payload,
+                             headers={'content-type': 'application/json',
+                                      'accept': 'application/json'})
 
         if response.status_code > 299:
             raise UnexpectedManagementAPIResponse(response.text)
@@ -308,9 +310,9 @@ class DatabaseRestore:
         uri = "http://{0}:{1}/manage/v2/databases/{2}" \
           .format(conn.host, conn.management_port, self.database_name)
 
-        response = requests.post(uri, json=payload, auth=conn.auth,
-                                 headers={'content-type': 'application/json',
-                                          'accept': 'application/json'})
+        response = conn.post(uri, json=payload,
+                             headers={'content-type': 'application/json',
+                                      'accept': 'application/json'})
 
         if response.status_code > 299:
             raise UnexpectedManagementAPIResponse(response.text)
@@ -330,9 +332,9 @@ class DatabaseRestore:
         uri = "http://{0}:{1}/manage/v2/databases/{2}" \
           .format(conn.host, conn.management_port, self.database_name)
 
-        response = requests.post(uri, json=payload, auth=conn.auth,
-                                 headers={'content-type': 'application/json',
-                                          'accept': 'application/json'})
+        response = conn.post(uri, json=payload,
+                             headers={'content-type': 'application/json',
+                                      'accept': 'application/json'})
 
         if response.status_code > 299:
             raise UnexpectedManagementAPIResponse(response.text)
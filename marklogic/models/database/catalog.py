@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Classes for finding the backup to restore from
+"""
+
+from __future__ import unicode_literals, print_function, absolute_import
+
+import json
+import sqlite3
+import threading
+import time
+from marklogic.models.database.backup import DatabaseRestore
+
+_COLUMNS = "job_id, database, backup_dir, timestamp, incremental, incremental_dir, " \
+  "journal_archiving, journal_archive_path, forests"
+
+def _record(row):
+    return {
+        'job-id': row[0],
+        'database': row[1],
+        'backup-dir': row[2],
+        'timestamp': row[3],
+        'incremental': bool(row[4]),
+        'incremental-dir': row[5],
+        'journal-archiving': bool(row[6]),
+        'journal-archive-path': row[7],
+        'forest': json.loads(row[8]) if row[8] is not None else None
+        }
+
+
+class RestorePoint:
+    """
+    A backup to restore a database from: a full backup and the
+    incremental backups taken after it, in order. The last backup in
+    the chain is the one that is restored.
+    """
+    def __init__(self, database_name, chain):
+        self.database_name = database_name
+        self.chain = chain
+        self.full = chain[0]
+        self.latest = chain[-1]
+        self.timestamp = self.latest['timestamp']
+
+    def restore_settings(self):
+        """
+        The settings to restore this point with, as keyword arguments
+        for `Database.restore`.
+
+        :return: A dictionary of settings
+        """
+        latest = self.latest
+        return {
+            'backup_dir': latest['backup-dir'],
+            'journal_archiving': latest['journal-archiving'],
+            'journal_archive_path': latest['journal-archive-path'],
+            'incremental': latest['incremental'],
+            'incremental_dir': latest['incremental-dir']
+            }
+
+    def restore(self, connection):
+        """
+        Start restoring the database from this point.
+
+        :param connection: The connection to a MarkLogic server
+        :return: The DatabaseRestore job
+        """
+        return DatabaseRestore.restore(connection, self.database_name,
+                                       **self.restore_settings())
+
+    def __repr__(self):
+        return "<RestorePoint {0} {1} backups={2} timestamp={3}>" \
+          .format(self.database_name, self.full['backup-dir'], len(self.chain),
+                  self.timestamp)
+
+
+class BackupCatalog:
+    """
+    A local SQLite index of completed database backups.
+
+    Each backup is recorded with its database, directories, completion
+    time and settings. Only backups of the whole database (not of some
+    of its forests) are used as restore points. An incremental backup
+    can only be restored with the full backup it builds on, so it is
+    only a restore point if that full backup is in the catalog.
+    """
+    def __init__(self, path):
+        """
+        Open (or create) a catalog.
+
+        :param path: The catalog file
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS backups ("
+                         "job_id TEXT PRIMARY KEY, database TEXT, backup_dir TEXT, "
+                         "timestamp REAL, incremental INTEGER, incremental_dir TEXT, "
+                         "journal_archiving INTEGER, journal_archive_path TEXT, "
+                         "forests TEXT)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS backups_by_time "
+                         "ON backups (database, timestamp)")
+        self._db.commit()
+
+    def add(self, backup, timestamp=None):
+        """
+        Record a completed backup.
+
+        :param backup: The DatabaseBackup job
+        :param timestamp: When the backup completed, in seconds since
+            the epoch; now by default
+        :return: The catalog
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        settings = backup.settings
+        forests = settings.get('forest')
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO backups ({0}) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)".format(_COLUMNS),
+                             (backup.job_id, backup.database_name, settings['backup-dir'],
+                              timestamp, 1 if settings.get('incremental') else 0,
+                              settings.get('incremental-dir'),
+                              1 if settings.get('journal-archiving') else 0,
+                              settings.get('journal-archive-path'),
+                              json.dumps(forests) if forests is not None else None))
+            self._db.commit()
+        return self
+
+    def forget(self, job_id):
+        """
+        Remove a backup from the catalog, for example after it was purged.
+
+        :param job_id: The job id of the backup
+        """
+        with self._lock:
+            self._db.execute("DELETE FROM backups WHERE job_id = ?", (job_id,))
+            self._db.commit()
+
+    def prune(self, database_name, backup_dir, keep):
+        """
+        Forget all but the `keep` latest non-incremental backups of a
+        database in a directory, and the incremental backups based on
+        the others, as `DatabaseBackup.purge` does on the server.
+
+        :param database_name: The database name
+        :param backup_dir: The backup directory
+        :param keep: The number of full backups to keep
+        """
+        with self._lock:
+            kept = self._db.execute("SELECT timestamp FROM backups WHERE database = ? "
+                                    "AND backup_dir = ? AND incremental = 0 "
+                                    "ORDER BY timestamp DESC LIMIT 1 OFFSET ?",
+                                    (database_name, backup_dir, max(keep - 1, 0))).fetchone()
+            if kept is not None:
+                self._db.execute("DELETE FROM backups WHERE database = ? "
+                                 "AND backup_dir = ? AND timestamp < ?",
+                                 (database_name, backup_dir, kept[0]))
+                self._db.commit()
+
+    def backups(self, database_name):
+        """
+        The backups of a database, oldest first.
+
+        :param database_name: The database name
+        :return: A list of dictionaries
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT {0} FROM backups WHERE database = ? "
+                                    "ORDER BY timestamp".format(_COLUMNS),
+                                    (database_name,)).fetchall()
+        return [_record(row) for row in rows]
+
+    def restore_point(self, database_name, before=None):
+        """
+        Find the latest consistent restore point of a database.
+
+        :param database_name: The database name
+        :param before: The latest acceptable backup time, in seconds
+            since the epoch; the latest backup by default
+        :return: A RestorePoint, or None if there isn't one
+        """
+        if before is None:
+            before = float('inf')
+        with self._lock:
+            rows = self._db.execute("SELECT {0} FROM backups WHERE database = ? "
+                                    "AND timestamp <= ? AND forests IS NULL "
+                                    "ORDER BY timestamp DESC".format(_COLUMNS),
+                                    (database_name, before)).fetchall()
+            for row in rows:
+                latest = _record(row)
+                if not latest['incremental']:
+                    return RestorePoint(database_name, [latest])
+
+                full = self._db.execute("SELECT {0} FROM backups WHERE database = ? "
+                                        "AND backup_dir = ? AND incremental = 0 "
+                                        "AND forests IS NULL AND timestamp <= ? "
+                                        "ORDER BY timestamp DESC LIMIT 1".format(_COLUMNS),
+                                        (database_name, latest['backup-dir'],
+                                         latest['timestamp'])).fetchone()
+                if full is None:
+                    continue
+                full = _record(full)
+                increments = self._db.execute("SELECT {0} FROM backups WHERE database = ? "
+                                              "AND backup_dir = ? AND incremental = 1 "
+                                              "AND incremental_dir IS ? AND forests IS NULL "
+                                              "AND timestamp > ? AND timestamp <= ? "
+                                              "ORDER BY timestamp".format(_COLUMNS),
+                                              (database_name, latest['backup-dir'],
+                                               latest['incremental-dir'], full['timestamp'],
+                                               latest['timestamp'])).fetchall()
+                return RestorePoint(database_name,
+                                    [full] + [_record(item) for item in increments])
+        return None
+
+    def restore(self, connection, database_name, before=None):
+        """
+        Start restoring a database from its latest consistent restore point.
+
+        :param connection: The connection to a MarkLogic server
+        :param database_name: The database name
+        :param before: The latest acceptable backup time, in seconds
+            since the epoch
+        :return: The DatabaseRestore job
+        """
+        point = self.restore_point(database_name, before)
+        if point is None:
+            raise ValueError("No backup of {0} to restore".format(database_name))
+        return point.restore(connection)
+
+    def close(self):
+        """
+        Close the catalog.
+        """
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Classes for reading and writing documents in multipart batches
+"""
+
+from __future__ import unicode_literals, print_function, absolute_import
+
+import json
+import mimetypes
+import re
+import uuid
+from marklogic.models.permission import Permission
+
+def content_type_for(uri, default="application/octet-stream"):
+    """
+    Guess the content type of a document from the extension of its
+    URI or path. Documents with an unknown extension are sent as
+    binary by default, so their content is stored unchanged.
+
+    :param uri: The document URI or file path
+    :param default: The content type to use if it can't be guessed
+    :return: The content type
+    """
+    if uri.lower().endswith(".json"):
+        return "application/json"
+    guess = mimetypes.guess_type(uri)[0]
+    if guess is None:
+        return default
+    return guess
+
+def metadata_struct(collections=None, permissions=None, metadata=None):
+    """
+    Build a REST API metadata structure.
+
+    Permissions may be given as Permission objects or in the REST API
+    form (`{'role-name': ..., 'capabilities': [...]}`). Collections are
+    added to any collections in `metadata`; permissions in `metadata`
+    replace `permissions`.
+
+    :param collections: A list of collections
+    :param permissions: A list of permissions
+    :param metadata: Other metadata (properties, quality, ...) to include
+    :return: A dictionary, or None if there is no metadata
+    """
+    struct = {}
+    if metadata is not None:
+        struct.update(metadata)
+
+    if collections:
+        merged = list(struct.get('collections', []))
+        for collection in collections:
+            if collection not in merged:
+                merged.append(collection)
+        struct['collections'] = merged
+
+    if 'permissions' in struct:
+        permissions = struct.pop('permissions')
+
+    if permissions:
+        by_role = {}
+        plist = []
+        for perm in permissions:
+            if isinstance(perm, Permission):
+                role = perm.role_name()
+                if role not in by_role:
+                    by_role[role] = {'role-name': role, 'capabilities': []}
+                    plist.append(by_role[role])
+                by_role[role]['capabilities'].append(perm.capability())
+            else:
+                plist.append(perm)
+        struct['permissions'] = plist
+
+    if not struct:
+        return None
+    return struct
+
+
+class DocumentBatch:
+    """
+    A multipart/mixed request body holding several documents.
+
+    The batch collections and permissions are sent as a default
+    metadata part that applies to every document in the batch.
+    Documents with their own metadata get a document metadata part;
+    since the server does not combine the two, the batch collections
+    and permissions are merged into it.
+    """
+    def __init__(self, collections=None, permissions=None):
+        self.collections = collections
+        self.permissions = permissions
+        self.boundary = "ml-batch-" + uuid.uuid4().hex
+        self._parts = []
+        self.count = 0
+        self.size = 0
+
+        default_metadata = metadata_struct(collections, permissions)
+        if default_metadata is not None:
+            self._add_part("application/json", "inline; category=metadata",
+                           json.dumps(default_metadata))
+
+    def content_type(self):
+        """
+        The content type header for the batch.
+        """
+        return "multipart/mixed; boundary=" + self.boundary
+
+    def _add_part(self, content_type, disposition, content):
+        if not isinstance(content, bytes):
+            content = content.encode('utf-8')
+        header = "--{0}\r\nContent-Type: {1}\r\nContent-Disposition: {2}\r\n\r\n" \
+          .format(self.boundary, content_type, disposition).encode('utf-8')
+        self._parts.append(header)
+        self._parts.append(content)
+        self._parts.append(b"\r\n")
+        self.size += len(content)
+
+    def add(self, uri, content, metadata=None, content_type=None):
+        """
+        Add a document to the batch.
+
+        :param uri: The document URI
+        :param content: The document, as text, bytes, or a structure to serialize as JSON
+        :param metadata: Document metadata (collections, permissions, properties, ...)
+        :param content_type: The content type, guessed from the URI if not given
+        """
+        if isinstance(content, (dict, list)):
+            content = json.dumps(content)
+            if content_type is None:
+                content_type = "application/json"
+        if content_type is None:
+            content_type = content_type_for(uri)
+
+        disposition = 'attachment; filename="{0}"'.format(uri)
+        if metadata is not None:
+            merged = metadata_struct(self.collections, self.permissions, metadata)
+            self._add_part("application/json", disposition + "; category=metadata",
+                           json.dumps(merged))
+
+        self._add_part(content_type, disposition, content)
+        self.count += 1
+
+    def body(self):
+        """
+        The request body.
+        """
+        return b"".join(self._parts) + "--{0}--\r\n".format(self.boundary).encode('utf-8')
+
+
+def multipart_boundary(content_type):
+    """
+    The boundary of a multipart content type.
+
+    :param content_type: The Content-Type header
+    :return: The boundary, or None if the content isn't multipart
+    """
+    if content_type is None or not content_type.lower().startswith("multipart/"):
+        return None
+    match = re.search(r'boundary=(?:"([^"]+)"|([^;\s]+))', content_type)
+    if match is None:
+        return None
+    return match.group(1) or match.group(2)
+
+def part_filename(headers):
+    """
+    The filename (the document URI) in the Content-Disposition of a part.
+
+    :param headers: The part headers, as returned by `iter_multipart`
+    :return: The filename, or None
+    """
+    disposition = headers.get('content-disposition', '')
+    match = re.search(r'filename=(?:"([^"]*)"|([^;]+))', disposition)
+    if match is None:
+        return None
+    if match.group(1) is not None:
+        return match.group(1)
+    return match.group(2).strip()
+
+def _parse_headers(block):
+    headers = {}
+    for line in block.decode('utf-8', 'replace').split("\r\n"):
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    return headers
+
+def iter_multipart(chunks, boundary):
+    """
+    Parse a multipart body incrementally.
+
+    The body is read from an iterable of byte strings, such as
+    `response.iter_content()`, and never held in memory as a whole:
+    part content is passed on as soon as it can't be the start of a
+    boundary. For each part this yields `('headers', dict)` with the
+    header names in lower case, then zero or more `('data', bytes)`,
+    then `('end', None)`.
+
+    :param chunks: An iterable of byte strings
+    :param boundary: The multipart boundary
+    :return: A generator of (event, value) pairs
+    """
+    # The first boundary may not be preceded by a line break
+    delimiter = b"\r\n--" + boundary.encode('utf-8')
+    keep = len(delimiter) - 1
+    buffer = b"\r\n"
+    state = 'preamble'
+    chunks = iter(chunks)
+    finished = False
+
+    while True:
+        progressed = True
+        while progressed:
+            progressed = False
+            if state == 'preamble':
+                index = buffer.find(delimiter)
+                if index >= 0:
+                    buffer = buffer[index + len(delimiter):]
+                    state = 'boundary'
+                    progressed = True
+                else:
+                    buffer = buffer[-keep:]
+            elif state == 'boundary':
+                if buffer.startswith(b"--"):
+                    return
+                index = buffer.find(b"\r\n")
+                if index >= 0:
+                    buffer = buffer[index + 2:]
+                    state = 'headers'
+                    progressed = True
+            elif state == 'headers':
+                if buffer.startswith(b"\r\n"):
+                    headers, buffer = {}, buffer[2:]
+                else:
+                    index = buffer.find(b"\r\n\r\n")
+                    if index < 0:
+                        continue
+                    headers, buffer = _parse_headers(buffer[:index]), buffer[index + 4:]
+                yield 'headers', headers
+                state = 'body'
+                progressed = True
+            elif state == 'body':
+                index = buffer.find(delimiter)
+                if index >= 0:
+                    if index > 0:
+                        yield 'data', buffer[:index]
+                    yield 'end', None
+                    buffer = buffer[index + len(delimiter):]
+                    state = 'boundary'
+                    progressed = True
+                elif len(buffer) > keep:
+                    yield 'data', buffer[:len(buffer) - keep]
+                    buffer = buffer[len(buffer) - keep:]
+
+        if finished:
+            if state != 'preamble':
+                raise ValueError("Truncated multipart body")
+            return
+        try:
+            buffer += next(chunks)
+        except StopIteration:
+            finished = True
@@ -0,0 +1,440 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Classes for exporting many documents to disk in parallel
+"""
+
+from __future__ import unicode_literals, print_function, absolute_import
+
+import itertools
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+from marklogic.models.database.documents import iter_multipart, multipart_boundary
+from marklogic.models.database.documents import part_filename
+from marklogic.models.utilities.concurrency import WorkerPool
+from marklogic.models.utilities.exceptions import UnexpectedAPIResponse
+from marklogic.models.utilities.exceptions import DocumentNotFound, PathCollision
+
+# Archived documents larger than this are spooled to disk
+_SPOOL_SIZE = 1024 * 1024
+
+# ZipFile.open can write entries from Python 3.6
+_ZIP_STREAMING = sys.version_info >= (3, 6)
+
+def relative_path(uri):
+    """
+    The relative path a document is exported to. Empty, '.' and '..'
+    segments are dropped so that no URI can escape the export root.
+
+    :param uri: The document URI
+    :return: The relative path, with '/' separators
+    """
+    segments = [segment for segment in uri.replace("\\", "/").split("/")
+                if segment not in ['', '.', '..']]
+    if not segments:
+        raise ValueError("Cannot export {0} to a file".format(uri))
+    return "/".join(segments)
+
+
+class _ClaimedPaths:
+    """
+    The relative paths written so far by a sink. Different URIs can
+    map to the same path (for instance "/a//b" and "a/b"), and the
+    second one must not overwrite or duplicate the first.
+    """
+    def __init__(self):
+        self._uris = {}
+        self._lock = threading.Lock()
+
+    def claim(self, uri):
+        """
+        Reserve the relative path of a URI.
+
+        :param uri: The document URI
+        :return: The relative path
+        """
+        path = relative_path(uri)
+        with self._lock:
+            if path in self._uris:
+                raise PathCollision("{0} and {1} are both exported to {2}"
+                                    .format(self._uris[path], uri, path))
+            self._uris[path] = uri
+        return path
+
+
+class DirectorySink:
+    """
+    Writes each document to a file under a directory, at the path
+    given by its URI. A document is written to a temporary file next
+    to its final path and only renamed into place once it is complete.
+    """
+    def __init__(self, root):
+        self.root = root
+        self._paths = _ClaimedPaths()
+
+    def path(self, uri):
+        """
+        The file a document is exported to.
+
+        :param uri: The document URI
+        :return: The path
+        """
+        return os.path.join(self.root, *relative_path(uri).split("/"))
+
+    def open(self, uri):
+        self._paths.claim(uri)
+        path = self.path(uri)
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory)
+        except OSError:
+            if not os.path.isdir(directory):
+                raise
+        return open(path + ".part", "wb")
+
+    def commit(self, uri, handle):
+        handle.close()
+        path = self.path(uri)
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(handle.name, path)
+
+    def discard(self, uri, handle):
+        handle.close()
+        os.remove(handle.name)
+
+    def close(self):
+        pass
+
+
+class TarSink:
+    """
+    Writes documents to a tar archive, compressed if the file name
+    ends in .gz or .tgz. A tar entry needs its size before its content,
+    so each document is spooled (to disk, if it is large) before it is
+    added to the archive.
+    """
+    def __init__(self, path):
+        self.path = path
+        mode = "w"
+        if path.lower().endswith(".gz") or path.lower().endswith(".tgz"):
+            mode = "w:gz"
+        self._tar = tarfile.open(path, mode)
+        self._lock = threading.Lock()
+        self._paths = _ClaimedPaths()
+
+    def open(self, uri):
+        self._paths.claim(uri)
+        return tempfile.SpooledTemporaryFile(_SPOOL_SIZE)
+
+    def commit(self, uri, handle):
+        info = tarfile.TarInfo(relative_path(uri))
+        info.size = handle.tell()
+        info.mtime = time.time()
+        handle.seek(0)
+        try:
+            with self._lock:
+                self._tar.addfile(info, handle)
+        finally:
+            handle.close()
+
+    def discard(self, uri, handle):
+        handle.close()
+
+    def close(self):
+        self._tar.close()
+
+
+class ZipSink:
+    """
+    Writes documents to a zip archive. Only one entry can be written
+    at a time, so each document is spooled (to disk, if it is large)
+    before it is added to the archive.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._zip = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, allowZip64=True)
+        self._lock = threading.Lock()
+        self._paths = _ClaimedPaths()
+
+    def open(self, uri):
+        self._paths.claim(uri)
+        return tempfile.SpooledTemporaryFile(_SPOOL_SIZE)
+
+    def commit(self, uri, handle):
+        info = zipfile.ZipInfo(relative_path(uri), time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        handle.seek(0)
+        try:
+            with self._lock:
+                if _ZIP_STREAMING:
+                    with self._zip.open(info, "w", force_zip64=True) as entry:
+                        shutil.copyfileobj(handle, entry)
+                else:
+                    self._zip.writestr(info, handle.read())
+        finally:
+            handle.close()
+
+    def discard(self, uri, handle):
+        handle.close()
+
+    def close(self):
+        self._zip.close()
+
+
+def sink_for(destination):
+    """
+    The sink for an export destination.
+
+    :param destination: A sink (anything with open, commit, discard
+        and close methods), the path of a .zip, .tar, .tar.gz or .tgz
+        archive, or a directory. The built-in sinks raise PathCollision
+        from `open` for a URI that maps to a path already written.
+    :return: The sink
+    """
+    if hasattr(destination, 'open') and hasattr(destination, 'commit'):
+        return destination
+    lower = destination.lower()
+    if lower.endswith(".zip"):
+        return ZipSink(destination)
+    if lower.endswith(".tar") or lower.endswith(".tar.gz") or lower.endswith(".tgz"):
+        return TarSink(destination)
+    return DirectorySink(destination)
+
+
+class ExportSummary:
+    """
+    The result of a bulk export.
+    """
+    def __init__(self):
+        self.exported = 0
+        self.bytes = 0
+        self.missing = []
+        self.failures = []
+        self.elapsed = 0.0
+
+    def failed(self):
+        """
+        The number of documents that could not be exported.
+        """
+        return len(self.failures)
+
+    def total(self):
+        """
+        The number of documents that were attempted.
+        """
+        return self.exported + len(self.missing) + len(self.failures)
+
+    def __repr__(self):
+        return "<ExportSummary exported={0} missing={1} failed={2} bytes={3} elapsed={4:.1f}s>" \
+          .format(self.exported, len(self.missing), self.failed(), self.bytes, self.elapsed)
+
+
+class BulkExporter:
+    """
+    Exports documents from a database with a pool of worker threads.
+
+    URIs are read from an iterable, grouped into batches and handed
+    out through a WorkerPool, so the URIs can come from a lexicon that
+    is paged through as the export runs. Each worker fetches a batch
+    with one multipart request and streams the response: every
+    document is written to the sink block by block as it arrives, so
+    no batch is ever held in memory and no document is held in memory
+    beyond the archive spool size.
+
+    Documents that no longer exist are reported as missing. A document
+    whose URI maps to a path that was already written is reported as a
+    failure with a PathCollision. If a request fails, the documents of
+    its batch that weren't written are reported as failures and the
+    export carries on.
+
+    Give the connection at least `workers` pooled connections, or the
+    extra ones are opened and closed for every batch.
+    """
+    def __init__(self, connection, database, sink, batch_size=100, workers=4,
+                 queue_size=None, progress=None, block_size=65536):
+        """
+        Create a bulk exporter.
+
+        :param connection: The server connection
+        :param database: The Database to export from
+        :param sink: Where to write the documents, see `sink_for`
+        :param batch_size: The number of documents per request
+        :param workers: The number of worker threads
+        :param queue_size: The number of batches read ahead, defaults to
+            twice the number of workers
+        :param progress: A callable `progress(summary, uri, error)`
+            invoked after every document; `error` is None on success
+            and a DocumentNotFound for a missing document. If it
+            raises, the export stops and `export` raises the error.
+        :param block_size: The number of bytes read from a response at a time
+        """
+        if workers < 1:
+            raise ValueError("At least one worker is required")
+        if batch_size < 1:
+            raise ValueError("The batch size must be at least one")
+
+        self.connection = connection
+        self.database = database
+        self.sink = sink_for(sink)
+        self.batch_size = batch_size
+        self.workers = workers
+        self.queue_size = queue_size if queue_size is not None else workers * 2
+        self.progress = progress
+        self.block_size = block_size
+
+        self._lock = threading.Lock()
+        self._summary = None
+
+    def export(self, uris):
+        """
+        Export the documents. The sink is closed when the export is done.
+
+        :param uris: An iterable of document URIs
+        :return: An ExportSummary
+        """
+        self._summary = ExportSummary()
+        start = time.time()
+
+        pool = WorkerPool(self._export_item, self.workers, self.queue_size)
+        try:
+            pool.run(self._batches(uris))
+        finally:
+            self.sink.close()
+            self._summary.elapsed = time.time() - start
+
+        return self._summary
+
+    def _batches(self, uris):
+        uris = iter(uris)
+        while True:
+            batch = list(itertools.islice(uris, self.batch_size))
+            if not batch:
+                return
+            yield batch
+
+    def _record(self, uri, size=None, error=None):
+        with self._lock:
+            if isinstance(error, DocumentNotFound):
+                self._summary.missing.append(uri)
+            elif error is None:
+                self._summary.exported += 1
+                self._summary.bytes += size
+            else:
+                self._summary.failures.append((uri, error))
+            if self.progress is not None:
+                # An error raised here stops the pool, and export raises it
+                self.progress(self._summary, uri, error)
+
+    def _export_batch(self, batch, written):
+        """
+        Fetch one batch of documents and write them to the sink. Each
+        document is added to `written`, keyed by URI, with its size or
+        the error that kept it from being written.
+        """
+        doc_url = "http://{0}:{1}/v1/documents".format(self.connection.host,
+                                                       self.connection.port)
+        params = [('database', self.database.name)]
+        params.extend(('uri', uri) for uri in batch)
+        response = self.connection.get(doc_url, params=params,
+                                       headers={'accept': 'multipart/mixed'},
+                                       stream=True)
+        uri = None
+        handle = None
+        try:
+            if response.status_code == 404:
+                return
+            if response.status_code != 200:
+                raise UnexpectedAPIResponse(response.text)
+
+            boundary = multipart_boundary(response.headers.get('content-type'))
+            if boundary is None:
+                # A single document may come back without a multipart wrapper
+                if len(batch) != 1:
+                    raise UnexpectedAPIResponse("Expected a multipart response")
+                uri = batch[0]
+                handle = self.sink.open(uri)
+                size = 0
+                for block in response.iter_content(self.block_size):
+                    handle.write(block)
+                    size += len(block)
+                self.sink.commit(uri, handle)
+                handle = None
+                written[uri] = size
+                return
+
+            size = 0
+            skip = False
+            for event, value in iter_multipart(response.iter_content(self.block_size),
+                                               boundary):
+                if event == 'headers':
+                    uri = part_filename(value)
+                    if uri is None:
+                        raise UnexpectedAPIResponse("A part has no document URI")
+                    try:
+                        handle = self.sink.open(uri)
+                        skip = False
+                    except PathCollision as e:
+                        written[uri] = e
+                        skip = True
+                    size = 0
+                elif skip:
+                    continue
+                elif event == 'data':
+                    handle.write(value)
+                    size += len(value)
+                else:
+                    self.sink.commit(uri, handle)
+                    handle = None
+                    written[uri] = size
+        finally:
+            if handle is not None:
+                self.sink.discard(uri, handle)
+            response.close()
+
+    def _export_item(self, batch):
+        written = {}
+        error = None
+        try:
+            self._export_batch(batch, written)
+        except Exception as e:
+            error = e
+
+        # Progress is reported once the response is closed, so that an
+        # error raised by it doesn't leave a request half read
+        reported = set()
+        for uri in batch:
+            if uri in reported:
+                continue
+            reported.add(uri)
+            if uri in written:
+                result = written[uri]
+                if isinstance(result, Exception):
+                    self._record(uri, error=result)
+                else:
+                    self._record(uri, result)
+            elif error is None:
+                self._record(uri, error=DocumentNotFound(uri))
+            else:
+                self._record(uri, error=error)
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Classes for making document loads resumable
+"""
+
+from __future__ import unicode_literals, print_function, absolute_import
+
+import os
+import sqlite3
+import threading
+from marklogic.models.utilities import files
+
+class IngestJournal:
+    """
+    A local SQLite journal of documents that have been loaded.
+
+    Every document that the server has accepted is recorded with the
+    size, modification time and content hash of its source file. When
+    an interrupted load is run again with the same journal, files whose
+    URI is recorded with the same content are skipped, so only the
+    remaining work is done. The same journal serves as the manifest for
+    incremental synchronization (see `Database.sync_directory`).
+
+    Records are committed every `commit_every` documents (and when the
+    journal is closed). If the process dies, at most that many documents
+    are loaded a second time, which is harmless because document writes
+    replace the previous version.
+    """
+    def __init__(self, path, commit_every=1000, hash_algorithm='sha1', verify_hash=False):
+        """
+        Open (or create) a journal.
+
+        :param path: The journal file
+        :param commit_every: The number of records between commits
+        :param hash_algorithm: The hashlib algorithm for content hashes, or None
+        :param verify_hash: Also compare content hashes before skipping a file
+        """
+        self.path = path
+        self.commit_every = commit_every
+        self.hash_algorithm = hash_algorithm
+        self.verify_hash = verify_hash and hash_algorithm is not None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS completed ("
+                         "uri TEXT PRIMARY KEY, path TEXT, size INTEGER, "
+                         "mtime REAL, hash TEXT)")
+        self._db.commit()
+
+    def lookup(self, uri):
+        """
+        Return the record for a URI.
+
+        :param uri: The document URI
+        :return: A dictionary with path, size, mtime and hash, or None
+        """
+        with self._lock:
+            row = self._db.execute("SELECT path, size, mtime, hash FROM completed "
+                                   "WHERE uri = ?", (uri,)).fetchone()
+        if row is None:
+            return None
+        return {'path': row[0], 'size': row[1], 'mtime': row[2], 'hash': row[3]}
+
+    def is_complete(self, path, uri, stat=None):
+        """
+        Returns true if (and only if) `uri` was loaded from a file with the
+        same content as `path` has now.
+
+        If the size and modification time of `path` match the record, the
+        content is assumed to be the same (unless `verify_hash` is set).
+        Otherwise, if the size matches and a content hash was recorded,
+        the file is hashed; a file that was only touched or copied is then
+        still complete and its record is updated.
+
+        :param path: The source file
+        :param uri: The document URI
+        :param stat: The os.stat result for `path`, if already known
+        :return: True or False
+        """
+        record = self.lookup(uri)
+        if record is None:
+            return False
+        if stat is None:
+            stat = os.stat(path)
+        if record['size'] != stat.st_size:
+            return False
+        if record['mtime'] == stat.st_mtime and not self.verify_hash:
+            return True
+        if record['hash'] is None or self.hash_algorithm is None:
+            return False
+        digest = files.file_hash(path, self.hash_algorithm)
+        if record['hash'] != digest:
+            return False
+        if record['mtime'] != stat.st_mtime:
+            self._store(uri, path, stat, digest)
+        return True
+
+    def record(self, path, uri, stat=None):
+        """
+        Record that `uri` was loaded from `path`.
+
+        :param path: The source file
+        :param uri: The document URI
+        :param stat: The os.stat result for `path` when it was loaded
+        """
+        if stat is None:
+            stat = os.stat(path)
+        digest = None
+        if self.hash_algorithm is not None:
+            digest = files.file_hash(path, self.hash_algorithm)
+
+        self._store(uri, path, stat, digest)
+
+    def _store(self, uri, path, stat, digest):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO completed (uri, path, size, mtime, hash) "
+                             "VALUES (?, ?, ?, ?, ?)",
+                             (uri, path, stat.st_size, stat.st_mtime, digest))
+            self._pending += 1
+            if self._pending >= self.commit_every:
+                self._db.commit()
+                self._pending = 0
+
+    def forget(self, uri):
+        """
+        Remove the record for a URI.
+
+        :param uri: The document URI
+        """
+        with self._lock:
+            self._db.execute("DELETE FROM completed WHERE uri = ?", (uri,))
+            self._pending += 1
+
+    def uris(self):
+        """
+        Return all the recorded URIs.
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT uri FROM completed").fetchall()
+        return [row[0] for row in rows]
+
+    def records(self):
+        """
+        Return the recorded URIs with the files they were loaded from.
+
+        :return: A list of (uri, path) pairs
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT uri, path FROM completed").fetchall()
+        return [(row[0], row[1]) for row in rows]
+
+    def count(self):
+        """
+        The number of recorded documents.
+        """
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM completed").fetchone()[0]
+
+    def commit(self):
+        """
+        Commit the pending records.
+        """
+        with self._lock:
+            self._db.commit()
+            self._pending = 0
+
+    def close(self):
+        """
+        Commit the pending records and close the journal.
+        """
+        self.commit()
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
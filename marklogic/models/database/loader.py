@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Classes for loading many documents in parallel
+"""
+
+from __future__ import unicode_literals, print_function, absolute_import
+
+import itertools
+import os
+import threading
+import time
+from marklogic.models.utilities.concurrency import WorkerPool
+
+class LoadSummary:
+    """
+    The result of a bulk load.
+    """
+    def __init__(self):
+        self.loaded = 0
+        self.skipped = 0
+        self.deleted = 0
+        self.failures = []
+        self.elapsed = 0.0
+
+    def failed(self):
+        """
+        The number of documents that could not be loaded.
+        """
+        return len(self.failures)
+
+    def total(self):
+        """
+        The number of documents that were attempted.
+        """
+        return self.loaded + len(self.failures)
+
+    def __repr__(self):
+        return "<LoadSummary loaded={0} skipped={1} deleted={2} failed={3} elapsed={4:.1f}s>" \
+          .format(self.loaded, self.skipped, self.deleted, self.failed(), self.elapsed)
+
+
+class BulkLoader:
+    """
+    Loads documents into a database with a pool of worker threads.
+
+    Documents are read from an iterable of `(path, uri)` pairs and
+    handed out through a WorkerPool, so memory stays bounded no matter
+    how many files the iterable yields and walking the file system
+    overlaps with uploading.
+
+    Each document is sent to one of `hosts` (round robin, by default
+    just the connection host). At most `host_limit` requests are
+    outstanding against any one host at a time.
+
+    If a `journal` (an IngestJournal) is given, every document that is
+    loaded is recorded in it and files that it records as already loaded
+    are skipped, so an interrupted load can be resumed by running it
+    again with the same journal. With `verify`, a file is only skipped
+    if its document also still exists on the server.
+
+    Give the connection at least `workers` pooled connections, or the
+    extra ones are opened and closed for every document.
+    """
+    def __init__(self, connection, database, workers=8, host_limit=None,
+                 hosts=None, collections=None, content_type=None,
+                 progress=None, queue_size=None, journal=None, verify=False):
+        """
+        Create a bulk loader.
+
+        :param connection: The server connection
+        :param database: The Database to load into
+        :param workers: The number of worker threads
+        :param host_limit: The maximum number of concurrent requests per host
+        :param hosts: The hosts to distribute documents across
+        :param collections: A list of collections for the documents
+        :param content_type: The content type of the documents, guessed from
+            each file's extension if not given
+        :param progress: A callable `progress(summary, path, uri, error)`
+            invoked after every document; `error` is None on success.
+            If it raises, the load stops and `load` raises the error.
+        :param queue_size: The number of documents read ahead, defaults to
+            twice the number of workers
+        :param journal: An IngestJournal of completed documents
+        :param verify: Check that skipped documents exist on the server
+        """
+        if workers < 1:
+            raise ValueError("At least one worker is required")
+
+        self.connection = connection
+        self.database = database
+        self.workers = workers
+        self.collections = collections
+        self.content_type = content_type
+        self.progress = progress
+        self.journal = journal
+        self.verify = verify
+        self.queue_size = queue_size if queue_size is not None else workers * 2
+
+        if hosts is None:
+            hosts = [connection.host]
+        self.hosts = list(hosts)
+        if host_limit is None:
+            host_limit = workers
+        self._host_slots = dict((host, threading.BoundedSemaphore(host_limit))
+                                for host in self.hosts)
+
+        self._lock = threading.Lock()
+        self._summary = None
+
+    def load(self, documents):
+        """
+        Load the documents.
+
+        :param documents: An iterable of (path, uri) pairs
+        :return: A LoadSummary
+        """
+        self._summary = LoadSummary()
+        start = time.time()
+
+        pool = WorkerPool(self._load_item, self.workers, self.queue_size)
+        hosts = itertools.cycle(self.hosts)
+        try:
+            pool.run((path, uri, next(hosts)) for path, uri in documents)
+        finally:
+            if self.journal is not None:
+                self.journal.commit()
+            self._summary.elapsed = time.time() - start
+
+        return self._summary
+
+    def _load_one(self, path, uri, host):
+        """
+        Send one document. Subclasses can override this to change how
+        a document is written.
+        """
+        self.database.load_file(self.connection, path, uri,
+                                collections=self.collections,
+                                content_type=self.content_type,
+                                host=host)
+
+    def _exists(self, uri, host):
+        """
+        Check that a document the journal records as loaded is on the
+        server. Only called when `verify` is true.
+        """
+        return self.database.document_exists(self.connection, uri, host=host)
+
+    def _unchanged(self, path, uri, stat, host):
+        if not self.journal.is_complete(path, uri, stat):
+            return False
+        if self.verify:
+            with self._host_slots[host]:
+                return self._exists(uri, host)
+        return True
+
+    def _load_item(self, item):
+        path, uri, host = item
+
+        error = None
+        try:
+            stat = None
+            if self.journal is not None:
+                stat = os.stat(path)
+                if self._unchanged(path, uri, stat, host):
+                    with self._lock:
+                        self._summary.skipped += 1
+                    return
+
+            with self._host_slots[host]:
+                self._load_one(path, uri, host)
+
+            if self.journal is not None:
+                self.journal.record(path, uri, stat)
+        except Exception as e:
+            error = e
+
+        with self._lock:
+            if error is None:
+                self._summary.loaded += 1
+            else:
+                self._summary.failures.append((path, uri, error))
+            if self.progress is not None:
+                # An error raised here stops the pool, and load raises it
+                self.progress(self._summary, path, uri, error)
@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Follow the progress of backup and restore jobs.
+"""
+
+from __future__ import unicode_literals, print_function, absolute_import
+
+import heapq
+import time
+from marklogic.models.utilities.exceptions import JobTimeout
+
+TERMINAL_STATES = ['completed', 'failed', 'cancelled', 'canceled']
+
+def _number(value):
+    if isinstance(value, dict):
+        value = value.get('value')
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _first(structure, names):
+    for name in names:
+        if name in structure:
+            return _number(structure[name])
+    return None
+
+def _forests(status):
+    forests = status.get('forest', status.get('forests', []))
+    if isinstance(forests, dict):
+        forests = forests.get('forest', [forests])
+    if not isinstance(forests, list):
+        forests = [forests]
+    return [forest for forest in forests if isinstance(forest, dict)]
+
+
+class JobProgress:
+    """
+    The progress of a backup or restore job at one point in time.
+
+    `forests` is a list of dictionaries with the 'forest-name',
+    'state', 'bytes', 'total' and 'percent' of each forest; numbers
+    the server didn't report are None. `eta` is the estimated number
+    of seconds until the job completes, once it can be estimated.
+    If the status couldn't be read, `error` is the exception and the
+    state is 'error'.
+    """
+    def __init__(self, job, status, elapsed, error=None):
+        self.job = job
+        self.status = status
+        self.elapsed = elapsed
+        self.error = error
+        self.eta = None
+        self.forests = []
+        for forest in _forests(status):
+            self.forests.append({
+                'forest-name': forest.get('forest-name'),
+                'state': forest.get('status', forest.get('state')),
+                'bytes': _first(forest, ['bytes', 'bytes-copied', 'current-size']),
+                'total': _first(forest, ['total-bytes', 'total-size', 'size']),
+                'percent': _first(forest, ['percent-complete', 'percent'])
+                })
+
+        self.state = status.get('status', status.get('state'))
+        if error is not None:
+            self.state = 'error'
+        elif self.state is None and self.forests:
+            states = set(forest['state'] for forest in self.forests)
+            self.state = states.pop() if len(states) == 1 else 'in-progress'
+
+        self.bytes = self._sum('bytes')
+        self.total = self._sum('total')
+        if self.total:
+            self.percent = 100.0 * (self.bytes or 0) / self.total
+        else:
+            percents = [forest['percent'] for forest in self.forests
+                        if forest['percent'] is not None]
+            self.percent = sum(percents) / len(percents) if percents else None
+
+    def _sum(self, key):
+        values = [forest[key] for forest in self.forests if forest[key] is not None]
+        return sum(values) if values else None
+
+    @property
+    def done(self):
+        """
+        True if the job has finished, successfully or not, or its
+        status couldn't be read.
+        """
+        return self.error is not None or self.state in TERMINAL_STATES
+
+    @property
+    def succeeded(self):
+        """
+        True if the job completed successfully.
+        """
+        return self.state == 'completed'
+
+    def _key(self):
+        return (self.state, self.bytes, self.percent,
+                tuple(forest['state'] for forest in self.forests))
+
+    def __repr__(self):
+        return "<JobProgress {0} {1} {2} percent={3} eta={4}>" \
+          .format(self.job.database_name, self.job.job_id, self.state,
+                  self.percent, self.eta)
+
+
+class _Watched:
+    def __init__(self, job, started):
+        self.job = job
+        self.started = started
+        self.first = None
+        self.last = None
+        self.interval = None
+
+
+class JobMonitor:
+    """
+    Poll any number of backup and restore jobs from a single thread.
+
+    Each job is polled on its own schedule. The wait between polls of
+    a job starts at `interval`; it grows by half each time the job
+    hasn't moved, up to `max_interval`, and is never more than half of
+    the job's estimated time left. If `timeout` seconds pass before all
+    of the jobs are done, JobTimeout is raised.
+
+    Jobs may be added while the monitor is watching, for instance when
+    another job finishes.
+    """
+    def __init__(self, jobs=None, interval=1.0, max_interval=30.0, timeout=None,
+                 raise_errors=True):
+        """
+        Create a monitor.
+
+        :param jobs: The DatabaseBackup and DatabaseRestore jobs to follow
+        :param interval: The shortest wait between polls of a job, in seconds
+        :param max_interval: The longest wait between polls of a job
+        :param timeout: The number of seconds to wait for all of the jobs
+        :param raise_errors: Raise the error if a status can't be read;
+            otherwise the job's final JobProgress has the error
+        """
+        self.interval = interval
+        self.max_interval = max_interval
+        self.timeout = timeout
+        self.raise_errors = raise_errors
+        self._jobs = []
+        for job in jobs or []:
+            self.add(job)
+
+    def add(self, job):
+        """
+        Follow another job.
+
+        :param job: A DatabaseBackup or DatabaseRestore
+        :return: The monitor
+        """
+        self._jobs.append(job)
+        return self
+
+    def watch(self, connection):
+        """
+        Poll the jobs until they are all done.
+
+        This is a generator. It yields a JobProgress whenever the state
+        or progress of a job changes, and always for the first and the
+        final status of each job.
+
+        :param connection: The connection to a MarkLogic server
+        """
+        start = time.time()
+        schedule = []
+        scheduled = 0
+
+        while True:
+            while scheduled < len(self._jobs):
+                now = time.time()
+                heapq.heappush(schedule, (now, scheduled, _Watched(self._jobs[scheduled], now)))
+                scheduled += 1
+            if not schedule:
+                break
+
+            when, sequence, watched = heapq.heappop(schedule)
+            now = time.time()
+            if self.timeout is not None and when > start + self.timeout:
+                raise JobTimeout("Job {0} on {1} did not finish within {2} seconds"
+                                 .format(watched.job.job_id, watched.job.database_name,
+                                         self.timeout))
+            if when > now:
+                time.sleep(when - now)
+                now = time.time()
+
+            try:
+                progress = JobProgress(watched.job, watched.job.status(connection),
+                                       now - watched.started)
+            except Exception as e:
+                if self.raise_errors:
+                    raise
+                progress = JobProgress(watched.job, {}, now - watched.started, e)
+            self._estimate(watched, progress, now)
+
+            changed = watched.last is None or watched.last._key() != progress._key()
+            if changed:
+                watched.interval = self.interval
+            else:
+                watched.interval = min(self.max_interval, watched.interval * 1.5)
+            watched.last = progress
+            if changed or progress.done:
+                yield progress
+
+            if not progress.done:
+                wait = watched.interval
+                if progress.eta is not None:
+                    wait = max(self.interval, min(wait, progress.eta / 2))
+                heapq.heappush(schedule, (now + wait, sequence, watched))
+
+    def wait(self, connection):
+        """
+        Wait until all of the jobs are done.
+
+        :param connection: The connection to a MarkLogic server
+        :return: The final JobProgress of each job, in the order they
+            were added
+        """
+        final = {}
+        for progress in self.watch(connection):
+            if progress.done:
+                final[id(progress.job)] = progress
+        return [final[id(job)] for job in self._jobs]
+
+    def _estimate(self, watched, progress, now):
+        if progress.total:
+            done, total = progress.bytes or 0, progress.total
+        elif progress.percent is not None:
+            done, total = progress.percent, 100.0
+        else:
+            return
+        if watched.first is None:
+            watched.first = (now, done)
+            return
+        rate = (done - watched.first[1]) / (now - watched.first[0]) \
+          if now > watched.first[0] else 0
+        if rate > 0:
+            progress.eta = max(0.0, (total - done) / rate)
+
+
+class MonitoredJob:
+    """
+    Waiting for and watching a job; mixed into DatabaseBackup and
+    DatabaseRestore.
+    """
+    def watch(self, connection, interval=1.0, max_interval=30.0, timeout=None):
+        """
+        Poll the job until it is done, yielding a JobProgress whenever
+        it changes. See `JobMonitor`.
+
+        :param connection: The connection to a MarkLogic server
+        :param interval: The shortest wait between polls, in seconds
+        :param max_interval: The longest wait between polls
+        :param timeout: The number of seconds to wait for the job
+        """
+        monitor = JobMonitor([self], interval, max_interval, timeout)
+        return monitor.watch(connection)
+
+    def wait(self, connection, interval=1.0, max_interval=30.0, timeout=None):
+        """
+        Wait until the job is done.
+
+        :param connection: The connection to a MarkLogic server
+        :param interval: The shortest wait between polls, in seconds
+        :param max_interval: The longest wait between polls
+        :param timeout: The number of seconds to wait for the job
+        :return: The final JobProgress
+        """
+        monitor = JobMonitor([self], interval, max_interval, timeout)
+        return monitor.wait(connection)[0]
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Back up many databases at once without overloading hosts or disks.
+"""
+
+from __future__ import unicode_literals, print_function, absolute_import
+
+import logging
+import time
+from marklogic.models.database import Database
+from marklogic.models.database.backup import DatabaseBackup
+from marklogic.models.database.monitor import JobMonitor
+from marklogic.models.forest import Forest
+from marklogic.models.utilities.concurrency import parallel_map
+
+def _invalid(result):
+    """
+    True if a backup-validate result reports a problem.
+    """
+    if isinstance(result, dict):
+        for key, value in result.items():
+            if key == 'valid' and value in [False, 'false']:
+                return True
+            if _invalid(value):
+                return True
+    elif isinstance(result, list):
+        for item in result:
+            if _invalid(item):
+                return True
+    return False
+
+
+class BackupRun:
+    """
+    The backup of one database by a BackupOrchestrator.
+
+    `state` is 'pending', 'running', 'completed', 'failed' (the job
+    failed or was cancelled), 'invalid' (validation failed, so the
+    backup wasn't started) or 'error' (a request failed; see `error`).
+    """
+    def __init__(self, database_name, backup_dir, hosts):
+        self.database_name = database_name
+        self.backup_dir = backup_dir
+        self.hosts = hosts
+        self.state = 'pending'
+        self.job = None
+        self.progress = None
+        self.validation = None
+        self.error = None
+        self.started = None
+        self.finished = None
+
+    def duration(self):
+        """
+        The number of seconds the backup ran, or None.
+        """
+        if self.started is None or self.finished is None:
+            return None
+        return self.finished - self.started
+
+    def __repr__(self):
+        return "<BackupRun {0} {1}>".format(self.database_name, self.state)
+
+
+class BackupOrchestrator:
+    """
+    Back up a list of databases, running as many backups at once as
+    the limits allow.
+
+    A backup reads from every host that has a forest of the database
+    and writes to its backup directory. At most `per_host` backups run
+    on a host and at most `per_directory` write to a directory at the
+    same time, and no more than `max_jobs` run in all. The databases
+    are started in order, skipping over any that would exceed a limit
+    until a running backup finishes.
+
+    The running backups are followed by a JobMonitor, so their status
+    is polled with the same backoff as `DatabaseBackup.wait`.
+    """
+    def __init__(self, databases, backup_dir, per_host=1, per_directory=1,
+                 max_jobs=None, validate=False, keep=None, interval=5.0,
+                 hosts=None, catalog=None, max_interval=30.0, **options):
+        """
+        Plan the backups.
+
+        :param databases: The names of the databases to back up
+        :param backup_dir: The backup directory, or a dictionary of them
+            keyed by database name
+        :param per_host: The most backups running on one host
+        :param per_directory: The most backups writing to one directory
+        :param max_jobs: The most backups running at all
+        :param validate: Validate each backup before starting it
+        :param keep: If not None, purge all but this many backups of a
+            database after it has been backed up
+        :param interval: The shortest wait between status polls of a
+            backup, in seconds
+        :param hosts: The hosts of each database, keyed by database name;
+            read from the forests of the databases by default
+        :param catalog: A BackupCatalog to record completed backups in
+        :param max_interval: The longest wait between status polls
+        :param options: Other arguments for `DatabaseBackup.backup`,
+            such as journal_archiving or incremental
+        """
+        self.databases = list(databases)
+        self.backup_dir = backup_dir
+        self.per_host = per_host
+        self.per_directory = per_directory
+        self.max_jobs = max_jobs
+        self.validate = validate
+        self.keep = keep
+        self.interval = interval
+        self.max_interval = max_interval
+        self.hosts = hosts
+        self.catalog = catalog
+        self.options = options
+        self.runs = []
+
+    def _directory(self, name):
+        if isinstance(self.backup_dir, dict):
+            return self.backup_dir[name]
+        return self.backup_dir
+
+    def database_hosts(self, connection, workers=8):
+        """
+        Find the hosts with forests of each database.
+
+        :param connection: The connection to a MarkLogic server
+        :param workers: The maximum number of concurrent requests
+        :return: A dictionary of lists of host names keyed by database name
+        """
+        databases = parallel_map(lambda name: Database.lookup(connection, name),
+                                 self.databases, workers)
+        forest_names = set()
+        for database in databases:
+            if database is not None:
+                forest_names.update(database.forest_names() or [])
+        forest_names = sorted(forest_names)
+        forests = parallel_map(lambda name: Forest.lookup(connection, name),
+                               forest_names, workers)
+        forest_hosts = dict((forest.forest_name(), forest.host()) for forest in forests)
+
+        result = {}
+        for name, database in zip(self.databases, databases):
+            names = []
+            if database is not None:
+                names = database.forest_names() or []
+            result[name] = sorted(set(forest_hosts[forest] for forest in names))
+        return result
+
+    def _fits(self, run, running):
+        if self.max_jobs is not None and len(running) >= self.max_jobs:
+            return False
+        writing = [other for other in running if other.backup_dir == run.backup_dir]
+        if len(writing) >= self.per_directory:
+            return False
+        for host in run.hosts:
+            if len([other for other in running if host in other.hosts]) >= self.per_host:
+                return False
+        return True
+
+    def _start(self, connection, run):
+        try:
+            if self.validate:
+                job = DatabaseBackup(None, run.database_name)
+                job.settings = DatabaseBackup.backup_settings(run.backup_dir, **self.options)
+                run.validation = job.validate(connection)
+                if _invalid(run.validation):
+                    logging.warning("Backup of {0} is not valid: {1}"
+                                    .format(run.database_name, run.validation))
+                    run.state = 'invalid'
+                    return
+            run.job = DatabaseBackup.backup(connection, run.database_name,
+                                            run.backup_dir, **self.options)
+            run.started = time.time()
+            run.state = 'running'
+            logging.info("Started backup of {0}".format(run.database_name))
+        except Exception as e:
+            run.error = e
+            run.state = 'error'
+
+    def _start_fitting(self, connection, pending, running, monitor):
+        """
+        Start the pending backups that fit within the limits, in order.
+        """
+        for run in list(pending):
+            if self._fits(run, list(running.values())):
+                pending.remove(run)
+                self._start(connection, run)
+                if run.state == 'running':
+                    running[id(run.job)] = run
+                    monitor.add(run.job)
+
+    def _finish(self, connection, run):
+        run.finished = time.time()
+        if run.progress.error is not None:
+            run.error = run.progress.error
+            run.state = 'error'
+            return
+
+        run.state = 'completed' if run.progress.succeeded else 'failed'
+        logging.info("Backup of {0} {1} in {2:.0f} seconds"
+                     .format(run.database_name, run.state, run.duration()))
+        if run.state == 'completed' and self.catalog is not None:
+            self.catalog.add(run.job, run.finished)
+        if run.state == 'completed' and self.keep is not None:
+            try:
+                run.job.purge(connection, self.keep)
+                if self.catalog is not None:
+                    self.catalog.prune(run.database_name, run.backup_dir, self.keep)
+            except Exception as e:
+                logging.warning("Could not purge backups of {0}: {1}"
+                                .format(run.database_name, e))
+
+    def run(self, connection):
+        """
+        Back up the databases and wait for all of the backups to finish.
+
+        :param connection: The connection to a MarkLogic server
+        :return: A list of BackupRun, in the order of the databases
+        """
+        hosts = self.hosts
+        if hosts is None:
+            hosts = self.database_hosts(connection)
+        self.runs = [BackupRun(name, self._directory(name), hosts.get(name, []))
+                     for name in self.databases]
+
+        monitor = JobMonitor(interval=self.interval, max_interval=self.max_interval,
+                             raise_errors=False)
+        pending = list(self.runs)
+        running = {}
+        self._start_fitting(connection, pending, running, monitor)
+
+        for progress in monitor.watch(connection):
+            run = running[id(progress.job)]
+            run.progress = progress
+            if progress.done:
+                del running[id(progress.job)]
+                self._finish(connection, run)
+                self._start_fitting(connection, pending, running, monitor)
+
+        if pending:
+            # A backup that can never fit, e.g. per_host=0
+            raise ValueError("Backups can't be started within the limits")
+
+        return self.runs
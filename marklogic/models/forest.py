@@ -23,10 +23,10 @@ from __future__ import unicode_literals, print_function, absolute_import
 #
 
 import socket
-import requests
 import json
 from .utilities.validators import validate_forest_availability
 from .utilities.exceptions import UnexpectedManagementAPIResponse
+from .utilities.utilities import manage_uri
 
 """
 MarkLogic Forest support classes.
@@ -149,22 +149,106 @@ class Forest:
         """
         return self.config['forest-name']
 
-    def create(self, connection):
+    def add_replica(self, name, host, data_directory=None,
+                    large_data_directory=None, fast_data_directory=None):
         """
-        Creates the forest on the MarkLogic server.
+        Add a replica forest. Replicas are created along with the forest.
 
-        :param connection: The connection to a MarkLogic server
+        :param name: The name of the replica forest
+        :param host: The host of the replica forest
+        :param data_directory: The data directory of the replica
+        :param large_data_directory: The large data directory of the replica
+        :param fast_data_directory: The fast data directory of the replica
         :return: The Forest object
         """
-        uri = "http://{0}:{1}/manage/v2/forests".format(connection.host, connection.management_port)
+        replica = {
+            'replica-name': name,
+            'host': host
+        }
+
+        if data_directory is not None:
+            replica['data-directory'] = data_directory
+
+        if large_data_directory is not None:
+            replica['large-data-directory'] = large_data_directory
+
+        if fast_data_directory is not None:
+            replica['fast-data-directory'] = fast_data_directory
+
+        if 'forest-replica' not in self.properties:
+            self.properties['forest-replica'] = []
+        self.properties['forest-replica'].append(replica)
+        return self
+
+    def replicas(self):
+        """
+        Returns the replica forests of the forest.
+
+        :return: A list of replica structures ('replica-name', 'host', ...)
+        """
+        if 'forest-replica' in self.properties:
+            return self.properties['forest-replica']
+        return None
+
+    @classmethod
+    def _collection_uri(cls, connection):
+        return manage_uri(connection, "forests")
+
+    @classmethod
+    def _properties_uri(cls, connection, name):
+        return manage_uri(connection, "forests/{0}/properties", name)
+
+    @classmethod
+    def _view_uri(cls, connection, name, view):
+        return manage_uri(connection, "forests/{0}?view={1}", name, view)
+
+    def _delete_uri(self, connection):
+        uri = manage_uri(connection, "forests/{0}?level=full", self.config['forest-name'])
+        if self.replicas():
+            uri = uri + "&replicas=delete"
+        return uri
+
+    def _create_payload(self):
         payload = {}
         payload.update(self.properties)
         payload.update(self.config)
+        return payload
+
+    @classmethod
+    def _from_views(cls, properties, config):
+        """
+        Build a Forest from its properties and its config view.
+
+        :param properties: The parsed properties
+        :param config: The parsed config view
+        :return: The Forest object
+        """
+        result = Forest('temp')
+        result.properties = properties
+        result.config = config['forest-config']['config-properties']
+        result.config['forest-name'] = config['forest-config']['name']
+
+        for relation_group in config['forest-config']['relations']['relation-group']:
+            if relation_group['typeref'] == 'hosts':
+                result.config['host'] = relation_group['relation'][0]['nameref']
+
+        return result
 
-        response = requests.post(uri, json=payload, auth=connection.auth)
+    def create(self, connection, lookup=True):
+        """
+        Creates the forest on the MarkLogic server.
+
+        :param connection: The connection to a MarkLogic server
+        :param lookup: Read the new forest's configuration back from the server
+        :return: The Forest object, as read back if `lookup` is true
+        """
+        response = connection.post(Forest._collection_uri(connection),
+                                   json=self._create_payload())
         if response.status_code > 299:
             raise Exception(response.text)
 
+        if not lookup:
+            return self
         return Forest.lookup(connection, self.config['forest-name'])
 
     def save(self, connection):
@@ -174,9 +258,8 @@ class Forest:
         :param connection: The connection to a MarkLogic server
         :return: The Forest object
         """
-        uri = "http://{0}:{1}/manage/v2/forests/{2}/properties".format(connection.host, connection.management_port,
-                                                                       self.config['forest-name'])
-        response = requests.put(uri, json=self.config, auth=connection.auth)
+        uri = Forest._properties_uri(connection, self.config['forest-name'])
+        response = connection.put(uri, json=self.config)
 
         if response.status_code > 299:
             raise Exception(response.text)
@@ -190,15 +273,40 @@ class Forest:
         :param connection: The connection to a MerkLogic server
         :return: The Forest object
         """
-        uri = "http://{0}:{1}/manage/v2/forests/{2}?level=full".format(connection.host, connection.management_port,
-                                                                       self.config[u'forest-name'])
-        response = requests.delete(uri, auth=connection.auth)
+        response = connection.delete(self._delete_uri(connection))
 
         if response.status_code > 299 and not response.status_code == 404:
             raise Exception(response.text)
 
         return self
 
+    def status(self, connection):
+        """
+        Read the status of the forest: its state, sizes and the rates
+        of merges, saves, backups and so on.
+
+        :param connection: The connection to a MarkLogic server
+        :return: The 'forest-status' structure
+        """
+        return self._view(connection, 'status')['forest-status']
+
+    def counts(self, connection):
+        """
+        Read the counts of the forest: the number of documents and the
+        stands, with their sizes.
+
+        :param connection: The connection to a MarkLogic server
+        :return: The 'forest-counts' structure
+        """
+        return self._view(connection, 'counts')['forest-counts']
+
+    def _view(self, connection, view):
+        uri = Forest._view_uri(connection, self.config['forest-name'], view)
+        response = connection.get(uri, headers={'accept': 'application/json'})
+        if response.status_code != 200:
+            raise UnexpectedManagementAPIResponse(response.text)
+        return json.loads(response.text)
+
     @classmethod
     def lookup(cls, conn, name):
         """
@@ -208,26 +316,40 @@ class Forest:
         :param connection: The connection to a MarkLogic server
         :return: The Forest object
         """
-        result = Forest('temp')
-
-        uri = "http://{0}:{1}/manage/v2/forests/{2}/properties".format(conn.host, conn.management_port, name)
-        response = requests.get(uri, auth=conn.auth, headers={'accept': 'application/json'})
+        response = conn.get(Forest._properties_uri(conn, name),
+                            headers={'accept': 'application/json'})
         if response.status_code != 200:
             raise UnexpectedManagementAPIResponse(response.text)
 
-        result.properties = json.loads(response.text)
+        properties = json.loads(response.text)
 
-        uri='http://{0}:{1}/manage/v2/forests/{2}?view=config'.format(conn.host, conn.management_port, name)
-        response = requests.get(uri, auth=conn.auth, headers={'accept': 'application/json'})
+        response = conn.get(Forest._view_uri(conn, name, 'config'),
+                            headers={'accept': 'application/json'})
         if response.status_code != 200:
             raise UnexpectedManagementAPIResponse(response.text)
 
-        response_json = json.loads(response.text)
-        result.config = response_json['forest-config']['config-properties']
-        result.config['forest-name'] = response_json['forest-config']['name']
+        return Forest._from_views(properties, json.loads(response.text))
 
-        for relation_group in response_json['forest-config']['relations']['relation-group']:
-            if relation_group['typeref'] == 'hosts':
-                result.config['host'] = relation_group['relation'][0]['nameref']
+    @classmethod
+    def list(cls, connection):
+        """
+        Lists the names of the forests on this cluster.
+
+        :param connection: A connection to a MarkLogic server
+        :return: A list of forest names
+        """
+        response = connection.get(Forest._collection_uri(connection),
+                                  headers={'accept': 'application/json'})
+
+        if response.status_code == 200:
+            response_json = json.loads(response.text)
+            forest_count = response_json['forest-default-list']['list-items']['list-count']['value']
+
+            result = []
+            if forest_count > 0:
+                for item in response_json['forest-default-list']['list-items']['list-item']:
+                    result.append(item['nameref'])
+        else:
+            raise UnexpectedManagementAPIResponse(response.text)
 
         return result
@@ -25,8 +25,9 @@ Host related classes for manipulating MarkLogic hosts
 """
 
 from __future__ import unicode_literals, print_function, absolute_import
-import requests
 import json
+from marklogic.models.utilities.exceptions import UnexpectedManagementAPIResponse
+from marklogic.models.utilities.utilities import manage_uri
 
 class Host:
     """
@@ -94,13 +95,11 @@ class Host:
         :param connection: A connection to a MarkLogic server
         :return: The host information
         """
-        uri = "http://{0}:{1}/manage/v2/hosts/{2}/properties".format(connection.host, connection.management_port,
-                                                                     name)
         result = None
-        response = requests.get(uri, auth=connection.auth, headers={'accept': 'application/json'})
+        response = connection.get(Host._properties_uri(connection, name),
+                                  headers={'accept': 'application/json'})
         if response.status_code == 200:
-            result = Host()
-            result._config = json.loads(response.text)
+            result = Host._from_properties(json.loads(response.text))
         elif response.status_code != 404:
             raise UnexpectedManagementAPIResponse(response.text)
         return result
@@ -113,11 +112,37 @@ class Host:
         :param connection: A connection to a MarkLogic server
         :return: A list of host names
         """
-        uri = "http://{0}:{1}/manage/v2/hosts" \
-          .format(connection.host, connection.management_port)
+        return [item['nameref'] for item in cls._list_items(connection)]
 
-        response = requests.get(uri, auth=connection.auth,
-                                headers={u'accept': u'application/json'})
+    @classmethod
+    def names_by_id(cls, connection):
+        """
+        The names of the hosts in this cluster, keyed by host id.
+
+        :param connection: A connection to a MarkLogic server
+        :return: A dictionary of host names
+        """
+        return dict((item['idref'], item['nameref'])
+                    for item in cls._list_items(connection))
+
+    @classmethod
+    def _collection_uri(cls, connection):
+        return manage_uri(connection, "hosts")
+
+    @classmethod
+    def _properties_uri(cls, connection, name):
+        return manage_uri(connection, "hosts/{0}/properties", name)
+
+    @classmethod
+    def _from_properties(cls, properties):
+        result = Host()
+        result._config = properties
+        return result
+
+    @classmethod
+    def _list_items(cls, connection):
+        response = connection.get(Host._collection_uri(connection),
+                                  headers={u'accept': u'application/json'})
 
         if response.status_code == 200:
             response_json = json.loads(response.text)
@@ -125,8 +150,7 @@ class Host:
 
             result = []
             if host_count > 0:
-                for item in response_json['host-default-list']['list-items']['list-item']:
-                    result.append(item['nameref'])
+                result = response_json['host-default-list']['list-items']['list-item']
         else:
             raise UnexpectedManagementAPIResponse(response.text)
 
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Spread the forests of a database evenly over the hosts of a cluster.
+"""
+
+from __future__ import unicode_literals, print_function, absolute_import
+
+from marklogic.models.database import Database
+from marklogic.models.forest import Forest
+from marklogic.models.host import Host
+from marklogic.models.utilities.concurrency import parallel_map
+
+class ForestLayout:
+    """
+    A balanced placement of the forests of a database.
+
+    Every host gets the same number of master forests. Forests on a
+    host take turns over its data directories. Each replica of a
+    forest is placed on a different host, in a zone that doesn't
+    already hold a copy of the forest if there is one, and on the
+    host with the fewest forests so far.
+    """
+    def __init__(self, database_name, hosts, forests_per_host=1,
+                 data_directories=None, replicas=0, zones=None):
+        """
+        Plan a layout.
+
+        :param database_name: The name of the database
+        :param hosts: A list of host names
+        :param forests_per_host: The number of master forests on each host
+        :param data_directories: The data directory to use: a path or a
+            list of paths for every host, or a dictionary of them keyed
+            by host name. The default data directory is used if None.
+        :param replicas: The number of replicas of each forest
+        :param zones: A dictionary of zone names keyed by host name
+        """
+        if not hosts:
+            raise ValueError("A forest layout needs at least one host")
+        if replicas > len(hosts) - 1:
+            raise ValueError("{0} replicas need at least {1} hosts"
+                             .format(replicas, replicas + 1))
+
+        self.database_name = database_name
+        self.hosts = list(hosts)
+        self.forests_per_host = forests_per_host
+        self.replicas = replicas
+        self.zones = zones or {}
+        self._directories = {}
+        for host in self.hosts:
+            if isinstance(data_directories, dict):
+                directories = data_directories.get(host)
+            else:
+                directories = data_directories
+            if directories is None or not isinstance(directories, list):
+                directories = [directories]
+            self._directories[host] = directories
+
+        self._placed = dict((host, 0) for host in self.hosts)
+        self._forests = []
+        self._plan()
+
+    @classmethod
+    def discover(cls, connection, database_name, forests_per_host=1,
+                 data_directories=None, replicas=0, workers=8):
+        """
+        Plan a layout over all of the hosts in the cluster, using the
+        zone of each host.
+
+        :param connection: The connection to a MarkLogic server
+        :param database_name: The name of the database
+        :param forests_per_host: The number of master forests on each host
+        :param data_directories: The data directories (see the constructor)
+        :param replicas: The number of replicas of each forest
+        :param workers: The maximum number of concurrent requests
+        :return: The ForestLayout
+        """
+        names = Host.list(connection)
+        hosts = parallel_map(lambda name: Host.lookup(connection, name), names, workers)
+
+        zones = {}
+        for name, host in zip(names, hosts):
+            if host is not None and host._config.get('zone'):
+                zones[name] = host.zone()
+
+        return cls(database_name, names, forests_per_host, data_directories,
+                   replicas, zones)
+
+    def _directory(self, host):
+        directories = self._directories[host]
+        directory = directories[self._placed[host] % len(directories)]
+        self._placed[host] += 1
+        return directory
+
+    def _plan(self):
+        count = len(self.hosts)
+        number = 0
+        # Interleave the hosts so that consecutive forests are on
+        # different hosts.
+        for index in range(0, self.forests_per_host):
+            for position, host in enumerate(self.hosts):
+                number += 1
+                name = "{0}_forest_{1}".format(self.database_name, number)
+                forest = Forest(name, host=host, data_directory=self._directory(host))
+                self._forests.append((forest, position))
+
+        for forest, position in self._forests:
+            used_hosts = [forest.host()]
+            used_zones = [self.zones.get(forest.host())]
+            for replica in range(0, self.replicas):
+                candidates = [(candidate, host) for candidate, host in enumerate(self.hosts)
+                              if host not in used_hosts]
+
+                def rank(candidate):
+                    zone = self.zones.get(candidate[1])
+                    shared = 1 if zone is not None and zone in used_zones else 0
+                    # Ties go to the next host around the ring
+                    return (shared, self._placed[candidate[1]],
+                            (candidate[0] - position) % count)
+
+                host = min(candidates, key=rank)[1]
+                forest.add_replica("{0}_replica_{1}".format(forest.forest_name(), replica + 1),
+                                   host, data_directory=self._directory(host))
+                used_hosts.append(host)
+                used_zones.append(self.zones.get(host))
+
+    def forests(self):
+        """
+        The master forests. Their replicas are attached to them.
+
+        :return: A list of Forest objects
+        """
+        return [forest for forest, position in self._forests]
+
+    def placement(self):
+        """
+        The forests on each host.
+
+        :return: A dictionary of lists of forest names (masters and
+            replicas) keyed by host name
+        """
+        result = dict((host, []) for host in self.hosts)
+        for forest in self.forests():
+            result[forest.host()].append(forest.forest_name())
+            for replica in forest.replicas() or []:
+                result[replica['host']].append(replica['replica-name'])
+        return result
+
+    def apply(self, database):
+        """
+        Use this layout for the forests of a database that hasn't been
+        created yet.
+
+        :param database: The Database object
+        :return: The Database object
+        """
+        database._config['forest'] = self.forests()
+        return database
+
+    def provision(self, connection, database=None, workers=8):
+        """
+        Create the forests, with their replicas, and the database.
+
+        The forests are created concurrently; if any of them or the
+        database can't be created, the new forests are removed again.
+
+        :param connection: The connection to a MarkLogic server
+        :param database: The Database to create, a new one named after
+            the layout by default
+        :param workers: The maximum number of concurrent requests
+        :return: The Database object
+        """
+        if database is None:
+            database = Database(self.database_name)
+        return self.apply(database).create(connection, workers=workers)
+
+    def __repr__(self):
+        return "<ForestLayout database={0} hosts={1} forests={2} replicas={3}>" \
+          .format(self.database_name, len(self.hosts), len(self._forests), self.replicas)
@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Status and counts of many forests, as a table with one column per metric.
+"""
+
+from __future__ import unicode_literals, print_function, absolute_import
+
+import math
+from array import array
+from marklogic.models.forest import Forest
+from marklogic.models.utilities.concurrency import parallel_map
+
+COLUMNS = ['documents', 'stands', 'disk_size', 'memory_size',
+           'merge_read_rate', 'merge_write_rate', 'reindex_rate']
+
+def _value(item):
+    if isinstance(item, dict):
+        item = item.get('value')
+    try:
+        return float(item)
+    except (TypeError, ValueError):
+        return None
+
+def _item(structure, path):
+    """
+    The item at a path of property names in a management API
+    structure, or None.
+    """
+    for name in path:
+        if not isinstance(structure, dict) or name not in structure:
+            return None
+        structure = structure[name]
+    return structure
+
+def _first(structure, paths):
+    """
+    The value at the first of the paths that has one, as a number.
+    """
+    for path in paths:
+        value = _value(_item(structure, path))
+        if value is not None:
+            return value
+    return None
+
+# Where each metric is in the forest counts and status views
+_DOCUMENTS = [['count-properties', 'document-count'],
+              ['count-properties', 'documents-count']]
+_STANDS = [['count-properties', 'stands-count']]
+_RATES = {
+    'merge_read_rate': [['status-properties', 'rate-properties', 'merge-read-rate']],
+    'merge_write_rate': [['status-properties', 'rate-properties', 'merge-write-rate']],
+    'reindex_rate': [['status-properties', 'rate-properties', 'reindex-rate']]
+    }
+_COUNTS_STANDS = [['count-properties', 'stands-counts', 'stand'],
+                  ['count-properties', 'stands-counts', 'stand-count']]
+_STATUS_STANDS = [['status-properties', 'stands', 'stand']]
+
+def _stands(structure, paths):
+    for path in paths:
+        stands = _item(structure, path)
+        if isinstance(stands, dict):
+            stands = [stands]
+        if isinstance(stands, list):
+            return stands
+    return None
+
+def _size(status, counts, name):
+    """
+    The sum of a size over the stands of a forest, or the size of the
+    forest if no stand has it.
+    """
+    for stands in [_stands(counts, _COUNTS_STANDS), _stands(status, _STATUS_STANDS)]:
+        sizes = [_value(stand.get(name)) for stand in stands or []
+                 if isinstance(stand, dict)]
+        sizes = [size for size in sizes if size is not None]
+        if sizes:
+            return sum(sizes)
+    size = _first(counts, [['count-properties', name]])
+    if size is None:
+        size = _first(status, [['status-properties', name]])
+    return size
+
+def metrics_row(status, counts):
+    """
+    Extract the metrics of one forest from its status and counts.
+
+    Sizes are in megabytes and rates in megabytes per second, as
+    reported by the server. Metrics the server didn't report are None.
+
+    :param status: The forest status (see `Forest.status`)
+    :param counts: The forest counts (see `Forest.counts`)
+    :return: A dictionary keyed by column name
+    """
+    stands = _first(counts, _STANDS)
+    if stands is None:
+        stand_list = _stands(counts, _COUNTS_STANDS)
+        if stand_list is not None:
+            stands = float(len(stand_list))
+
+    row = {
+        'documents': _first(counts, _DOCUMENTS),
+        'stands': stands,
+        'disk_size': _size(status, counts, 'disk-size'),
+        'memory_size': _size(status, counts, 'memory-size')
+        }
+    for column in _RATES:
+        row[column] = _first(status, _RATES[column])
+    return row
+
+
+class ForestMetrics:
+    """
+    A table of forest metrics: one row per forest, one column per metric
+    (see `COLUMNS`). Each column is an array of floats in the order of
+    `names`, and summary statistics are computed a column at a time.
+
+    A metric a forest didn't report is NaN in its column and None in
+    its row. The statistics of a column only cover the forests that
+    reported it.
+    """
+    def __init__(self):
+        self.names = []
+        self.columns = dict((column, array('d')) for column in COLUMNS)
+
+    @classmethod
+    def capture(cls, connection, forest_names, workers=8):
+        """
+        Read the status and counts of forests concurrently.
+
+        :param connection: The connection to a MarkLogic server
+        :param forest_names: The names of the forests
+        :param workers: The maximum number of concurrent requests
+        :return: The ForestMetrics
+        """
+        forest_names = list(forest_names)
+        tasks = []
+        for name in forest_names:
+            forest = Forest(name)
+            tasks.append((forest, 'status'))
+            tasks.append((forest, 'counts'))
+
+        results = parallel_map(lambda task: getattr(task[0], task[1])(connection),
+                               tasks, workers)
+
+        metrics = cls()
+        for index, name in enumerate(forest_names):
+            metrics.add(name, results[2 * index], results[2 * index + 1])
+        return metrics
+
+    def add(self, name, status, counts):
+        """
+        Add a row for a forest.
+
+        :param name: The forest name
+        :param status: The forest status
+        :param counts: The forest counts
+        :return: The ForestMetrics object
+        """
+        row = metrics_row(status, counts)
+        self.names.append(name)
+        for column in COLUMNS:
+            value = row[column]
+            self.columns[column].append(float('nan') if value is None else value)
+        return self
+
+    def column(self, column):
+        """
+        The values of one metric, in the order of `names`. Missing
+        values are NaN.
+
+        :param column: The column name
+        :return: An array of floats
+        """
+        return self.columns[column]
+
+    def values(self, column):
+        """
+        The values of one metric, without the forests that didn't
+        report it.
+
+        :param column: The column name
+        :return: A list of floats
+        """
+        return [value for value in self.columns[column] if not math.isnan(value)]
+
+    def reported(self, column):
+        """
+        The number of forests that reported a metric.
+        """
+        return len(self.values(column))
+
+    def row(self, name):
+        """
+        The metrics of one forest.
+
+        :param name: The forest name
+        :return: A dictionary keyed by column name; missing metrics are None
+        """
+        index = self.names.index(name)
+        row = {}
+        for column in COLUMNS:
+            value = self.columns[column][index]
+            row[column] = None if math.isnan(value) else value
+        return row
+
+    def total(self, column):
+        """
+        The sum of a column.
+        """
+        return math.fsum(self.values(column))
+
+    def mean(self, column):
+        """
+        The mean of a column, 0 if no forest reported it.
+        """
+        values = self.values(column)
+        if not values:
+            return 0.0
+        return math.fsum(values) / len(values)
+
+    def stddev(self, column):
+        """
+        The (population) standard deviation of a column.
+        """
+        values = self.values(column)
+        if not values:
+            return 0.0
+        mean = self.mean(column)
+        return math.sqrt(math.fsum((value - mean) ** 2 for value in values)
+                         / len(values))
+
+    def skew(self, column):
+        """
+        How much the largest forest exceeds the average: the maximum of
+        a column divided by its mean. 1.0 is perfectly even.
+        """
+        mean = self.mean(column)
+        if mean == 0:
+            return 1.0
+        return max(self.values(column)) / mean
+
+    def imbalance(self, column):
+        """
+        The spread between the largest and the smallest forest relative
+        to the average: (max - min) / mean. 0.0 is perfectly even.
+        """
+        mean = self.mean(column)
+        if mean == 0:
+            return 0.0
+        values = self.values(column)
+        return (max(values) - min(values)) / mean
+
+    def summary(self):
+        """
+        Statistics for every column.
+
+        :return: A dictionary, keyed by column name, of dictionaries
+            with 'total', 'mean', 'stddev', 'min', 'max', 'skew',
+            'imbalance' and 'reported', the number of forests that
+            reported the metric
+        """
+        result = {}
+        for column in COLUMNS:
+            values = self.values(column)
+            result[column] = {
+                'total': self.total(column),
+                'mean': self.mean(column),
+                'stddev': self.stddev(column),
+                'min': min(values) if values else 0.0,
+                'max': max(values) if values else 0.0,
+                'skew': self.skew(column),
+                'imbalance': self.imbalance(column),
+                'reported': len(values)
+                }
+        return result
+
+    def to_numpy(self):
+        """
+        The columns as NumPy arrays. This requires NumPy.
+
+        :return: A dictionary of arrays keyed by column name, with the
+            forest names under 'name'; missing values are NaN
+        """
+        import numpy
+        result = dict((column, numpy.frombuffer(self.columns[column], dtype='d').copy())
+                      for column in COLUMNS)
+        result['name'] = numpy.array(self.names)
+        return result
+
+    def __len__(self):
+        return len(self.names)
+
+    def __repr__(self):
+        return "<ForestMetrics forests={0}>".format(len(self.names))
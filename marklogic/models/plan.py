@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Bring a cluster to a desired configuration with the fewest changes.
+
+A desired configuration has the same form as `ClusterSnapshot.marshal`:
+a dictionary with lists of marshalled 'roles', 'privileges', 'users',
+'databases' and 'servers'. `plan` compares it with the current state
+and `apply` makes the changes.
+"""
+
+from __future__ import unicode_literals, print_function, absolute_import
+
+import base64
+import copy
+import logging
+import os
+from marklogic.models.database import Database
+from marklogic.models.privilege import Privilege
+from marklogic.models.role import Role
+from marklogic.models.server import Server
+from marklogic.models.user import User
+from marklogic.models.utilities.concurrency import parallel_map
+
+_KINDS = ['roles', 'privileges', 'users', 'databases', 'servers']
+
+# Operations in a stage only depend on operations in earlier stages:
+# roles and databases are created empty first, so that privileges can
+# name roles, and roles, users and databases can then be configured
+# with references to each other; servers come last because they refer
+# to databases, users and privileges.
+_CREATE_STAGE = {'roles': 0, 'databases': 0, 'privileges': 1, 'users': 2, 'servers': 3}
+_UPDATE_STAGE = {'privileges': 1, 'roles': 2, 'users': 2, 'databases': 2, 'servers': 3}
+
+# Properties the server never returns, so they can't be compared
+_WRITE_ONLY = {'users': ['password']}
+
+
+def _name(kind, config):
+    if kind == 'roles':
+        return config['role-name']
+    if kind == 'privileges':
+        return "{0}|{1}".format(config['kind'], config['privilege-name'])
+    if kind == 'users':
+        return config['user-name']
+    if kind == 'databases':
+        return config['database-name']
+    if kind == 'servers':
+        return "{0}|{1}".format(config['group-name'], config['server-name'])
+    raise ValueError("Unknown resource kind: {0}".format(kind))
+
+def _lookup(connection, kind, config):
+    if kind == 'roles':
+        return Role.lookup(connection, config['role-name'])
+    if kind == 'privileges':
+        return Privilege.lookup(connection, config['privilege-name'], config['kind'])
+    if kind == 'users':
+        return User.lookup(connection, config['user-name'])
+    if kind == 'databases':
+        return Database.lookup(connection, config['database-name'])
+    return Server.lookup(connection, config['server-name'], config['group-name'])
+
+
+class Operation:
+    """
+    One change to the cluster: creating or updating a resource.
+    """
+    def __init__(self, kind, name, action, config, stage, current=None, delta=None):
+        """
+        Create an operation.
+
+        :param kind: The kind of resource ('roles', 'databases', ...)
+        :param name: The resource name
+        :param action: 'create' or 'update'
+        :param config: The desired (marshalled) configuration
+        :param stage: Operations run after all operations of lower stages
+        :param current: The current resource, for an update
+        :param delta: The properties to change, for an update
+        """
+        self.kind = kind
+        self.name = name
+        self.action = action
+        self.config = config
+        self.stage = stage
+        self.current = current
+        self.delta = delta
+
+    def run(self, connection):
+        """
+        Make the change.
+
+        :param connection: The connection to a MarkLogic server
+        :return: The operation
+        """
+        logging.info("{0}".format(self))
+        config = copy.deepcopy(self.config)
+
+        if self.action == 'create':
+            if self.kind == 'roles':
+                Role(config['role-name']).create(connection)
+            elif self.kind == 'databases':
+                Database(config['database-name']).create(connection)
+            elif self.kind == 'privileges':
+                Privilege.unmarshal(config).create(connection)
+            elif self.kind == 'users':
+                user = User.unmarshal(config)
+                if 'password' not in config:
+                    # Must assign some sort of password
+                    user.set_password(base64.urlsafe_b64encode(os.urandom(32)).decode('utf-8'))
+                user.create(connection)
+            else:
+                Server.unmarshal(config).create(connection)
+            return self
+
+        if self.kind in ('databases', 'servers'):
+            # Merge the changes into the current configuration and let
+            # update() send only what differs from it.
+            current = self.current.marshal() if self.current is not None else None
+            if current is None:
+                resource = Database.unmarshal(config) if self.kind == 'databases' \
+                  else Server.unmarshal(config)
+            else:
+                merged = copy.deepcopy(current)
+                merged.update(config)
+                if self.kind == 'databases':
+                    resource = Database.unmarshal(merged)
+                else:
+                    resource = Server.unmarshal(merged)
+                resource.mark_clean(current)
+                resource.etag = self.current.etag
+            resource.update(connection)
+        elif self.kind == 'roles':
+            Role.unmarshal(self._partial(config, ['role-name'])).update(connection)
+        elif self.kind == 'privileges':
+            Privilege.unmarshal(self._partial(config, ['privilege-name', 'kind'])) \
+              .update(connection)
+        else:
+            User.unmarshal(self._partial(config, ['user-name'])).update(connection)
+        return self
+
+    def _partial(self, config, keys):
+        if self.delta is None:
+            return config
+        partial = copy.deepcopy(self.delta)
+        for key in keys:
+            partial[key] = config[key]
+        return partial
+
+    def __repr__(self):
+        detail = ""
+        if self.delta is not None:
+            detail = " ({0})".format(", ".join(sorted(self.delta)))
+        return "<Operation {0} {1} {2}{3}>".format(self.action, self.kind[:-1],
+                                                  self.name, detail)
+
+
+class Plan:
+    """
+    The operations needed to bring a cluster to a desired configuration.
+    """
+    def __init__(self, connection):
+        self.connection = connection
+        self.operations = []
+        self.unchanged = []
+
+    def changes(self):
+        """
+        The number of operations.
+        """
+        return len(self.operations)
+
+    def stages(self):
+        """
+        The operations grouped into stages, in the order they must run.
+        Operations in the same stage are independent.
+
+        :return: A list of lists of operations
+        """
+        stages = {}
+        for operation in self.operations:
+            stages.setdefault(operation.stage, []).append(operation)
+        return [stages[stage] for stage in sorted(stages)]
+
+    def describe(self):
+        """
+        A readable description of the operations, one per line.
+        """
+        lines = []
+        for number, stage in enumerate(self.stages()):
+            for operation in stage:
+                lines.append("{0}: {1} {2} {3}".format(number, operation.action,
+                                                       operation.kind[:-1], operation.name))
+        return lines
+
+    def __repr__(self):
+        return "<Plan changes={0} unchanged={1}>".format(len(self.operations),
+                                                        len(self.unchanged))
+
+
+def plan(connection, desired_config, workers=8):
+    """
+    Compare a desired configuration with the cluster.
+
+    The current state of every resource in the desired configuration is
+    read concurrently. Resources that don't exist are created; resources
+    whose properties differ are updated with just the differing
+    properties; resources that are already in the desired state are
+    left alone. Properties that aren't in the desired configuration are
+    not changed.
+
+    :param connection: The connection to a MarkLogic server
+    :param desired_config: The desired configuration
+    :param workers: The maximum number of concurrent requests
+    :return: A Plan
+    """
+    wanted = []
+    for kind in _KINDS:
+        for config in desired_config.get(kind, []):
+            wanted.append((kind, config))
+
+    currents = parallel_map(lambda item: _lookup(connection, item[0], item[1]),
+                            wanted, workers)
+
+    result = Plan(connection)
+    for (kind, config), current in zip(wanted, currents):
+        name = _name(kind, config)
+        if current is None:
+            result.operations.append(Operation(kind, name, 'create', config,
+                                               _CREATE_STAGE[kind]))
+            if kind in ('roles', 'databases'):
+                # Created empty, then configured
+                result.operations.append(Operation(kind, name, 'update', config,
+                                                   _UPDATE_STAGE[kind]))
+            continue
+
+        existing = current.marshal()
+        ignored = _WRITE_ONLY.get(kind, [])
+        delta = dict((key, value) for key, value in config.items()
+                     if key not in ignored and existing.get(key) != value)
+        if delta:
+            result.operations.append(Operation(kind, name, 'update', config,
+                                               _UPDATE_STAGE[kind], current, delta))
+        else:
+            result.unchanged.append((kind, name))
+
+    return result
+
+
+def apply(plan, workers=8):
+    """
+    Make the changes in a plan. The stages run in order and the
+    operations in each stage run concurrently. If an operation fails,
+    the rest of its stage still runs, then the first error is raised.
+
+    :param plan: A Plan
+    :param workers: The maximum number of concurrent requests
+    :return: The plan
+    """
+    for stage in plan.stages():
+        parallel_map(lambda operation: operation.run(plan.connection), stage, workers)
+    return plan
@@ -27,11 +27,10 @@ Classes for manipulating MarkLogic privileges.
 
 from __future__ import unicode_literals, print_function, absolute_import
 
-import requests
 from marklogic.models.utilities import exceptions
 from marklogic.models.utilities.validators import validate_custom
 from marklogic.models.utilities.validators import validate_privilege_kind
-from marklogic.models.utilities.utilities import PropertyLists
+from marklogic.models.utilities.utilities import PropertyLists, manage_uri, if_match
 import json
 
 class Privilege(PropertyLists):
@@ -163,6 +162,42 @@ class Privilege(PropertyLists):
         result.the_kind = kind
         return result
 
+    @classmethod
+    def _collection_uri(cls, connection):
+        return manage_uri(connection, "privileges")
+
+    @classmethod
+    def _properties_uri(cls, connection, name, kind):
+        return manage_uri(connection, "privileges/{0}/properties?kind={1}", name, kind)
+
+    @classmethod
+    def _resource_uri(cls, connection, name, kind):
+        return manage_uri(connection, "privileges/{0}?kind={1}", name, kind)
+
+    @classmethod
+    def _split_name(cls, name, kind):
+        """
+        Split a structured "kind|name" or "kind|name|action" name.
+        """
+        parts = name.split("|")
+        if len(parts) == 1:
+            return kind, name
+        elif len(parts) == 2 or len(parts) == 3:
+            if kind is not None and kind != parts[0]:
+                raise validate_custom("Kinds must match")
+            return parts[0], parts[1]
+        else:
+            raise validate_custom("Unparseable privilege name")
+
+    def _create_payload(self):
+        post_config = self._config
+        post_config['kind'] = self.kind()
+        return post_config
+
+    def _after_update(self, response):
+        if 'etag' in response.headers:
+            self.etag = response.headers['etag']
+
     def create(self, connection):
         """
         Creates the Privilege on the MarkLogic server.
@@ -170,12 +205,8 @@ class Privilege(PropertyLists):
         :param connection: The connection to a MarkLogic server
         :return: The Privilege object
         """
-        uri = "http://{0}:{1}/manage/v2/privileges".format(connection.host, connection.management_port)
-
-        post_config = self._config
-        post_config['kind'] = self.kind()
-
-        response = requests.post(uri, json=post_config, auth=connection.auth)
+        response = connection.post(Privilege._collection_uri(connection),
+                                   json=self._create_payload())
         if response.status_code not in [200, 201, 204]:
             raise exceptions.UnexpectedManagementAPIResponse(response.text)
 
@@ -204,23 +235,13 @@ class Privilege(PropertyLists):
         :param connection: The connection to a MarkLogic server
         :return: The Privilege object
         """
-        uri = "http://{0}:{1}/manage/v2/privileges/{2}/properties?kind={3}" \
-          .format(connection.host, connection.management_port,
-                  self.privilege_name(), self.kind())
-
-        headers = {}
-        if self.etag is not None:
-            headers['if-match'] = self.etag
-
-        response = requests.put(uri, json=self._config, auth=connection.auth,
-                                headers=headers)
+        uri = Privilege._properties_uri(connection, self.privilege_name(), self.kind())
+        response = connection.put(uri, json=self._config, headers=if_match(self.etag))
 
         if response.status_code not in [200, 204]:
             raise exceptions.UnexpectedManagementAPIResponse(response.text)
 
-        if 'etag' in response.headers:
-                self.etag = response.headers['etag']
-
+        self._after_update(response)
         return self
 
     def delete(self, connection):
@@ -230,15 +251,8 @@ class Privilege(PropertyLists):
         :param connection: The connection to a MarkLogic server
         :return: The Privilege object
         """
-        uri = "http://{0}:{1}/manage/v2/privileges/{2}?kind={3}" \
-          .format(connection.host, connection.management_port,
-                  self.privilege_name(), self.kind())
-
-        headers = {}
-        if self.etag is not None:
-            headers['if-match'] = self.etag
-
-        response = requests.delete(uri, auth=connection.auth, headers=headers)
+        uri = Privilege._resource_uri(connection, self.privilege_name(), self.kind())
+        response = connection.delete(uri, headers=if_match(self.etag))
 
         if (response.status_code not in [200, 204]
             and not response.status_code == 404):
@@ -256,11 +270,8 @@ class Privilege(PropertyLists):
         :return: A list of Privilege names.
         """
 
-        uri = "http://{0}:{1}/manage/v2/privileges" \
-          .format(connection.host, connection.management_port)
-
-        response = requests.get(uri, auth=connection.auth,
-                                headers={'accept': 'application/json'})
+        response = connection.get(Privilege._collection_uri(connection),
+                                  headers={'accept': 'application/json'})
 
         if response.status_code != 200:
             raise exceptions.UnexpectedManagementAPIResponse(response.text)
@@ -288,21 +299,10 @@ class Privilege(PropertyLists):
         :param kind: The kind of privilege
         :return: The privilege
         """
-        parts = name.split("|")
-        if len(parts) == 1:
-            pass
-        elif len(parts) == 2 or len(parts) == 3:
-            if kind is not None and kind != parts[0]:
-                raise validate_custom("Kinds must match")
-            kind = parts[0]
-            name = parts[1]
-        else:
-            raise validate_custom("Unparseable privilege name")
-
-        uri = "http://{0}:{1}/manage/v2/privileges/{2}/properties?kind={3}" \
-          .format(connection.host, connection.management_port, name, kind)
+        kind, name = Privilege._split_name(name, kind)
+        uri = Privilege._properties_uri(connection, name, kind)
 
-        response = requests.head(uri, auth=connection.auth)
+        response = connection.head(uri)
 
         if response.status_code == 200:
         	return True
@@ -325,27 +325,12 @@ class Privilege(PropertyLists):
         :param kind: The kind of privilege
         :return: The privilege
         """
-        parts = name.split("|")
-        if len(parts) == 1:
-            pass
-        elif len(parts) == 2 or len(parts) == 3:
-            if kind is not None and kind != parts[0]:
-                raise validate_custom("Kinds must match")
-            kind = parts[0]
-            name = parts[1]
-        else:
-            raise validate_custom("Unparseable privilege name")
-
-        uri = "http://{0}:{1}/manage/v2/privileges/{2}/properties?kind={3}" \
-          .format(connection.host, connection.management_port, name, kind)
+        kind, name = Privilege._split_name(name, kind)
+        uri = Privilege._properties_uri(connection, name, kind)
 
-        response = requests.get(uri, auth=connection.auth,
-                                headers={'accept': 'application/json'})
+        result, response = connection.lookup_resource(uri, Privilege.unmarshal)
 
-        if response.status_code == 200:
-            result = Privilege.unmarshal(json.loads(response.text))
-            if 'etag' in response.headers:
-                result.etag = response.headers['etag']
+        if result is not None:
             return result
         elif response.status_code == 404:
             return None
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Detect uneven forests in a database and recommend rebalancer settings.
+"""
+
+from __future__ import unicode_literals, print_function, absolute_import
+
+import logging
+import math
+import time
+
+class RebalanceAdvice:
+    """
+    The result of `RebalanceAdvisor.advise`.
+
+    `changes` holds the recommended database properties
+    ('rebalancer-enable', 'rebalancer-throttle', 'assignment-policy');
+    it is empty if nothing needs to change. `reasons` explains them.
+    """
+    def __init__(self, column, skew, imbalance, balanced, to_move,
+                 movement_rate=None, estimated_seconds=None):
+        self.column = column
+        self.skew = skew
+        self.imbalance = imbalance
+        self.balanced = balanced
+        self.to_move = to_move
+        self.movement_rate = movement_rate
+        self.estimated_seconds = estimated_seconds
+        self.changes = {}
+        self.reasons = []
+
+    def describe(self):
+        """
+        A readable description of the advice, one line per item.
+        """
+        lines = ["{0}: skew {1:.2f}, imbalance {2:.2f}, {3}"
+                 .format(self.column, self.skew, self.imbalance,
+                         "balanced" if self.balanced else "unbalanced")]
+        if not self.balanced:
+            lines.append("{0:.0f} to move".format(self.to_move))
+        if self.movement_rate is not None:
+            lines.append("moving {0:.1f} per second".format(self.movement_rate))
+        if self.estimated_seconds is not None:
+            lines.append("balanced in about {0:.0f} seconds".format(self.estimated_seconds))
+        lines.extend(self.reasons)
+        for name in sorted(self.changes):
+            lines.append("set {0} to {1}".format(name, self.changes[name]))
+        return lines
+
+    def __repr__(self):
+        return "<RebalanceAdvice {0} imbalance={1:.2f} changes={2}>" \
+          .format(self.column, self.imbalance, len(self.changes))
+
+
+class RebalanceAdvisor:
+    """
+    Sample the forests of a database and recommend rebalancer changes.
+
+    A database is unbalanced when the spread of a metric between its
+    forests, (max - min) / mean, exceeds the threshold. The movement
+    rate is estimated from two samples: documents that moved show up
+    as a decrease in one forest and an increase in another, while new
+    documents only increase the total.
+
+    Forests that didn't report the metric are left out.
+    """
+    def __init__(self, database, threshold=0.2, column='documents', target=86400):
+        """
+        Create an advisor.
+
+        :param database: The Database, as read from the server
+        :param threshold: The largest acceptable imbalance
+        :param column: The metric to balance (see `marklogic.models.metrics.COLUMNS`)
+        :param target: The number of seconds rebalancing should take at most
+        """
+        self.database = database
+        self.threshold = threshold
+        self.column = column
+        self.target = target
+        self.samples = []
+
+    def sample(self, connection, workers=8):
+        """
+        Read the metrics of the forests of the database.
+
+        :param connection: The connection to a MarkLogic server
+        :param workers: The maximum number of concurrent requests
+        :return: The ForestMetrics
+        """
+        metrics = self.database.forest_metrics(connection, workers)
+        self.samples.append((time.time(), metrics))
+        return metrics
+
+    def movement_rate(self):
+        """
+        The rate at which the rebalancer moved documents between the
+        last two samples, or None if there aren't two samples.
+
+        :return: The number moved per second
+        """
+        if len(self.samples) < 2:
+            return None
+        (start, before), (end, after) = self.samples[-2], self.samples[-1]
+        if end <= start:
+            return None
+
+        previous = dict(zip(before.names, before.column(self.column)))
+        deltas = [value - previous.get(name, 0.0)
+                  for name, value in zip(after.names, after.column(self.column))
+                  if not math.isnan(value) and not math.isnan(previous.get(name, 0.0))]
+        moved = (sum(abs(delta) for delta in deltas) - abs(sum(deltas))) / 2
+        return moved / (end - start)
+
+    def advise(self, connection, interval=60.0, workers=8):
+        """
+        Sample the forests and recommend changes. If there aren't two
+        samples yet, two are taken `interval` seconds apart so that the
+        movement rate can be estimated.
+
+        :param connection: The connection to a MarkLogic server
+        :param interval: The number of seconds between samples
+        :param workers: The maximum number of concurrent requests
+        :return: A RebalanceAdvice
+        """
+        if not self.samples:
+            self.sample(connection, workers)
+        if len(self.samples) < 2 and interval > 0:
+            time.sleep(interval)
+            self.sample(connection, workers)
+        return self.recommend()
+
+    def recommend(self):
+        """
+        Recommend changes from the samples taken so far.
+
+        :return: A RebalanceAdvice
+        """
+        if not self.samples:
+            raise ValueError("No samples")
+
+        metrics = self.samples[-1][1]
+        if not metrics.reported(self.column):
+            raise ValueError("No forest reported {0}".format(self.column))
+        mean = metrics.mean(self.column)
+        imbalance = metrics.imbalance(self.column)
+        to_move = sum(value - mean for value in metrics.values(self.column)
+                      if value > mean)
+        rate = self.movement_rate()
+        estimate = None
+        if rate:
+            estimate = to_move / rate
+
+        advice = RebalanceAdvice(self.column, metrics.skew(self.column), imbalance,
+                                 imbalance <= self.threshold, to_move, rate, estimate)
+        if advice.balanced:
+            return advice
+
+        database = self.database
+        policy = database.assignment_policy()
+        if isinstance(policy, dict):
+            policy = policy.get('assignment-policy-name')
+
+        if policy == 'range':
+            advice.reasons.append("the range policy places documents by their "
+                                  "partition key, so skew may be expected")
+            return advice
+
+        if database.rebalancer_enable() is False:
+            advice.reasons.append("the rebalancer is disabled")
+            advice.changes['rebalancer-enable'] = True
+
+        if policy == 'legacy':
+            advice.reasons.append("the legacy policy is slow to rebalance")
+            advice.changes['assignment-policy'] = 'bucket'
+
+        throttle = database.rebalancer_throttle()
+        if throttle is not None and throttle < 5:
+            if database.rebalancer_enable() is not False and rate is not None and not rate:
+                advice.reasons.append("nothing moved between samples")
+                advice.changes['rebalancer-throttle'] = 5
+            elif estimate is not None and estimate > self.target:
+                advice.reasons.append("rebalancing would take longer than {0} seconds"
+                                      .format(self.target))
+                advice.changes['rebalancer-throttle'] = 5
+
+        return advice
+
+    def apply(self, connection, advice):
+        """
+        Make the recommended changes to the database.
+
+        :param connection: The connection to a MarkLogic server
+        :param advice: A RebalanceAdvice
+        :return: The Database
+        """
+        database = self.database
+        if not advice.changes:
+            return database
+
+        logging.info("Rebalancing {0}: {1}".format(database.database_name(),
+                                                   advice.changes))
+        if 'rebalancer-enable' in advice.changes:
+            database.set_rebalancer_enable(advice.changes['rebalancer-enable'])
+        if 'rebalancer-throttle' in advice.changes:
+            database.set_rebalancer_throttle(advice.changes['rebalancer-throttle'])
+        if 'assignment-policy' in advice.changes:
+            database.set_assignment_policy(advice.changes['assignment-policy'])
+        return database.update(connection)
@@ -26,9 +26,8 @@ Role related classes for manipulating MarkLogic roles
 
 from __future__ import unicode_literals, print_function, absolute_import
 
-import requests
 from marklogic.models.utilities import exceptions
-from marklogic.models.utilities.utilities import PropertyLists
+from marklogic.models.utilities.utilities import PropertyLists, manage_uri, if_match
 import json
 
 class Role(PropertyLists):
@@ -263,6 +262,23 @@ class Role(PropertyLists):
             struct[key] = self._config[key];
         return struct
 
+    @classmethod
+    def _collection_uri(cls, connection):
+        return manage_uri(connection, "roles")
+
+    @classmethod
+    def _properties_uri(cls, connection, name):
+        return manage_uri(connection, "roles/{0}/properties", name)
+
+    @classmethod
+    def _resource_uri(cls, connection, name):
+        return manage_uri(connection, "roles/{0}", name)
+
+    def _after_update(self, response):
+        self.name = self._config['role-name']
+        if 'etag' in response.headers:
+            self.etag = response.headers['etag']
+
     def create(self, connection):
         """
         Creates the Role on the MarkLogic server.
@@ -270,10 +286,7 @@ class Role(PropertyLists):
         :param connection: The connection to a MarkLogic server
         :return: The Role object
         """
-        uri = "http://{0}:{1}/manage/v2/roles" \
-          .format(connection.host, connection.management_port)
-
-        response = requests.post(uri, json=self._config, auth=connection.auth)
+        response = connection.post(Role._collection_uri(connection), json=self._config)
         if response.status_code not in [200, 201, 204]:
             raise exceptions.UnexpectedManagementAPIResponse(response.text)
 
@@ -302,23 +315,13 @@ class Role(PropertyLists):
         :param connection: The connection to a MarkLogic server
         :return: The Role object
         """
-        uri = "http://{0}:{1}/manage/v2/roles/{2}/properties" \
-          .format(connection.host, connection.management_port,self.name)
-
-        headers = {}
-        if self.etag is not None:
-            headers['if-match'] = self.etag
-
-        response = requests.put(uri, json=self._config, auth=connection.auth,
-                                headers=headers)
+        response = connection.put(Role._properties_uri(connection, self.name),
+                                  json=self._config, headers=if_match(self.etag))
 
         if response.status_code not in [200, 204]:
             raise exceptions.UnexpectedManagementAPIResponse(response.text)
 
-        self.name = self._config['role-name']
-        if 'etag' in response.headers:
-                self.etag = response.headers['etag']
-
+        self._after_update(response)
         return self
 
     def delete(self, connection):
@@ -328,10 +331,7 @@ class Role(PropertyLists):
         :param connection: The connection to a MarkLogic server
         :return: The Role object
         """
-        uri = "http://{0}:{1}/manage/v2/roles/{2}" \
-          .format(connection.host, connection.management_port, self.name)
-
-        response = requests.delete(uri, auth=connection.auth)
+        response = connection.delete(Role._resource_uri(connection, self.name))
 
         if (response.status_code not in [200, 204]
             and not response.status_code == 404):
@@ -348,11 +348,8 @@ class Role(PropertyLists):
         :return: A list of Roles
         """
 
-        uri = "http://{0}:{1}/manage/v2/roles" \
-          .format(connection.host, connection.management_port)
-
-        response = requests.get(uri, auth=connection.auth,
-                                headers={'accept': 'application/json'})
+        response = connection.get(Role._collection_uri(connection),
+                                  headers={'accept': 'application/json'})
 
         if response.status_code != 200:
             raise exceptions.UnexpectedManagementAPIResponse(response.text)
@@ -374,11 +371,8 @@ class Role(PropertyLists):
         :param name: The name of the role
         :return: The role
         """
-        uri = "http://{0}:{1}/manage/v2/roles/{2}/properties" \
-          .format(connection.host, connection.management_port, name)
-
-        response = requests.head(uri, auth=connection.auth,
-                                 headers={'accept': 'application/json'})
+        response = connection.head(Role._properties_uri(connection, name),
+                                   headers={'accept': 'application/json'})
 
         if response.status_code == 200:
             return True
@@ -396,16 +390,10 @@ class Role(PropertyLists):
         :param name: The name of the role
         :return: The role
         """
-        uri = "http://{0}:{1}/manage/v2/roles/{2}/properties" \
-          .format(connection.host, connection.management_port, name)
+        result, response = connection.lookup_resource(Role._properties_uri(connection, name),
+                                                      Role.unmarshal)
 
-        response = requests.get(uri, auth=connection.auth,
-                                headers={'accept': 'application/json'})
-
-        if response.status_code == 200:
-            result = Role.unmarshal(json.loads(response.text))
-            if 'etag' in response.headers:
-                result.etag = response.headers['etag']
+        if result is not None:
             return result
         elif response.status_code == 404:
             return None
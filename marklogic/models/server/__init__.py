@@ -23,20 +23,19 @@ Server related classes for manipulating MarkLogic databases
 """
 
 from abc import ABCMeta, abstractmethod
-import re
-import requests
-import time
 import json
 import logging
 from marklogic.models.utilities.exceptions import UnexpectedManagementAPIResponse
+from marklogic.models.utilities.restart import RestartWaiter
 from marklogic.models.utilities.validators import validate_custom
-from marklogic.models.utilities.utilities import PropertyLists
+from marklogic.models.utilities.utilities import PropertyLists, ChangeTracking
+from marklogic.models.utilities.utilities import manage_uri, if_match
 from marklogic.models.server.schema import Schema
 from marklogic.models.server.namespace import UsingNamespace, Namespace
 from marklogic.models.server.requestblackout import RequestBlackout
 from marklogic.models.server.module import ModuleLocation
 
-class Server(PropertyLists):
+class Server(PropertyLists, ChangeTracking):
     """
     The Server class encapsulates a MarkLogic application server. It provides
     methods to set/get common attributes.  The use of methods will
@@ -1435,15 +1434,48 @@ class Server(PropertyLists):
         :param connection: The connection to a MarkLogic server
         :return: The server object
         """
-        uri = "http://{0}:{1}/manage/v2/servers" \
-          .format(connection.host, connection.management_port)
-
-        response = requests.post(uri, json=self._config, auth=connection.auth)
+        response = connection.post(Server._collection_uri(connection),
+                                   json=self._create_payload())
         if response.status_code > 299:
             raise UnexpectedManagementAPIResponse(response.text)
 
         return self
 
+    @classmethod
+    def _collection_uri(cls, connection):
+        return manage_uri(connection, "servers")
+
+    @classmethod
+    def _properties_uri(cls, connection, name, group):
+        return manage_uri(connection, "servers/{0}/properties?group-id={1}", name, group)
+
+    @classmethod
+    def _resource_uri(cls, connection, name, group):
+        return manage_uri(connection, "servers/{0}?group-id={1}", name, group)
+
+    @classmethod
+    def _split_name(cls, name, group):
+        """
+        Split a structured "group|name" name.
+        """
+        parts = name.split("|")
+        if len(parts) == 1:
+            return group, name
+        elif len(parts) == 2:
+            return parts[0], parts[1]
+        else:
+            raise validate_custom("Unparseable server name")
+
+    def _create_payload(self):
+        return self.marshal()
+
+    def _after_update(self, response):
+        self.name = self._config['server-name']
+        if 'etag' in response.headers:
+            self.etag = response.headers['etag']
+        if self.is_tracked():
+            self.mark_clean()
+
     def read(self, connection):
         """
         Loads the server from the MarkLogic server. This will refresh
@@ -1458,33 +1490,30 @@ class Server(PropertyLists):
         else:
             self._config = server._config
             self.etag = server.etag
-            return self
+            return self.mark_clean()
 
     def update(self, connection):
         """
         Updates the server on the MarkLogic server.
 
+        If the configuration was read from the server (with `lookup` or
+        `read`), only the properties that changed are sent (see `diff`),
+        and nothing is sent if none did.
+
         :param connection: The connection to a MarkLogic server
         :return: The server object
         """
-        uri = "http://{0}:{1}/manage/v2/servers/{2}/properties?group-id={3}" \
-          .format(connection.host, connection.management_port,
-                  self.name, self.group_name())
-
-        headers = {}
-        if self.etag is not None:
-            headers['if-match'] = self.etag
+        struct = self._changes()
+        if not struct:
+            return self
 
-        struct = self.marshal()
-        response = requests.put(uri, json=struct, auth=connection.auth,
-                                headers=headers)
+        uri = Server._properties_uri(connection, self.name, self.group_name())
+        response = connection.put(uri, json=struct, headers=if_match(self.etag))
 
         if response.status_code > 299:
             raise UnexpectedManagementAPIResponse(response.text)
 
-        self.name = self._config['server-name']
-        if 'etag' in response.headers:
-                self.etag = response.headers['etag']
+        self._after_update(response)
 
         if response.status_code == 202:
             Server.wait_for_restart(connection, response)
@@ -1498,15 +1527,9 @@ class Server(PropertyLists):
         :param connection: The connection to a MarkLogic server
         :return: The server object
         """
-        uri = "http://{0}:{1}/manage/v2/servers/{2}?group-id={3}" \
-          .format(connection.host, connection.management_port,
-                  self.server_name(), self.group_name())
-
-        headers = {'accept': 'application/json'}
-        if self.etag is not None:
-            headers['if-match'] = self.etag
-
-        response = requests.delete(uri, auth=connection.auth, headers=headers)
+        uri = Server._resource_uri(connection, self.server_name(), self.group_name())
+        response = connection.delete(uri, headers=if_match(self.etag,
+                                                           {'accept': 'application/json'}))
 
         if response.status_code > 299 and not response.status_code == 404:
             raise UnexpectedManagementAPIResponse(response.text)
@@ -1527,11 +1550,8 @@ class Server(PropertyLists):
 
         :return: A list of servers
         """
-        uri = "http://{0}:{1}/manage/v2/servers" \
-          .format(connection.host, connection.port)
-
-        response = requests.get(uri, auth=connection.auth,
-                                headers={'accept': 'application/json'})
+        response = connection.get(Server._collection_uri(connection),
+                                  headers={'accept': 'application/json'})
 
         if response.status_code != 200:
             raise UnexpectedManagementAPIResponse(response.text)
@@ -1558,20 +1578,8 @@ class Server(PropertyLists):
         :param: connection: The connection to a MarkLogic server
         :return: True or False
         """
-        parts = name.split("|")
-        if len(parts) == 1:
-            pass
-        elif len(parts) == 2:
-            group = parts[0]
-            name = parts[1]
-        else:
-            raise validate_custom("Unparseable server name")
-
-        uri = "http://{0}:{1}/manage/v2/servers/{2}/properties?group-id={3}" \
-          .format(connection.host, connection.management_port,
-                  name, group)
-
-        response = requests.head(uri, auth=connection.auth)
+        group, name = Server._split_name(name, group)
+        response = connection.head(Server._properties_uri(connection, name, group))
 
         if response.status_code > 299 and not response.status_code == 404:
             raise UnexpectedManagementAPIResponse(response.text)
@@ -1591,75 +1599,38 @@ class Server(PropertyLists):
         :param: connection: The connection to a MarkLogic server
         :return: True or False
         """
-        parts = name.split("|")
-        if len(parts) == 1:
-            pass
-        elif len(parts) == 2:
-            group = parts[0]
-            name = parts[1]
-        else:
-            raise validate_custom("Unparseable server name")
-
-        uri = "http://{0}:{1}/manage/v2/servers/{2}/properties?group-id={3}" \
-          .format(connection.host, connection.management_port, name, group)
+        group, name = Server._split_name(name, group)
+        uri = Server._properties_uri(connection, name, group)
 
         logging.info("Reading server configuration: {0}[{1}]" \
                      .format(name,group))
 
-        response = requests.get(uri, auth=connection.auth,
-                                headers={u'accept': u'application/json'})
+        result, response = connection.lookup_resource(uri, Server.unmarshal)
 
-        if response.status_code > 299 and not response.status_code == 404:
-            raise UnexpectedManagementAPIResponse(response.text)
-
-        result = None
-
-        if response.status_code == 404:
-            return result
-
-        if response.status_code != 200:
+        if result is None and response.status_code != 404:
             raise UnexpectedManagementAPIResponse(response.text)
 
-        result = Server.unmarshal(json.loads(response.text))
-        if 'etag' in response.headers:
-            result.etag = response.headers['etag']
-
+        if result is not None:
+            result.mark_clean()
         return result
 
     @classmethod
-    def wait_for_restart(cls, connection, response):
+    def wait_for_restart(cls, connection, response, timeout=300.0):
         """
         Waits for the server to restart.
 
         Some operations (removing a server, changing a server's port, etc.)
         require a restart. On receipt of a 202 response from the server,
         you can pass that response to this method and it will wait until
-        the server has restarted.
-        """
-        rconfig = json.loads(response.text)
-        timestamp = rconfig['restart']['last-startup'][0]['value']
-        uri = "http://localhost:8001/admin/v1/timestamp"
-        waiting = True
-        while waiting:
-            waiting = False
-            stamp = None
-            try:
-                response = requests.get(uri, auth=connection.auth)
-                stamp = response.text
-            except requests.exceptions.ConnectionError as e:
-                waiting = True
-                time.sleep(2)
-                pass
-            except http.client.BadStatusLine as e:
-                waiting = True
-                time.sleep(2)
-                pass
-
-            if not(waiting):
-                if re.match(r"\d\d\d\d-\d\d-\d\dT", stamp):
-                    waiting = (stamp <= timestamp)
-                else:
-                    waiting = True
+        every host that was restarted has come back up.
+
+        :param connection: The connection to a MarkLogic server
+        :param response: The 202 response
+        :param timeout: The number of seconds to wait before raising
+            RestartTimeout
+        :return: The seconds each host took to restart, keyed by host name
+        """
+        return RestartWaiter(timeout=timeout).wait(connection, response)
 
     @classmethod
     def unmarshal(cls, config):
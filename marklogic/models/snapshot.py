@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Capture the configuration of a whole cluster at once.
+"""
+
+from __future__ import unicode_literals, print_function, absolute_import
+
+import logging
+import time
+from marklogic.models.database import Database
+from marklogic.models.forest import Forest
+from marklogic.models.host import Host
+from marklogic.models.privilege import Privilege
+from marklogic.models.role import Role
+from marklogic.models.server import Server
+from marklogic.models.user import User
+from marklogic.models.utilities.concurrency import parallel_map
+from marklogic.models.utilities.exceptions import UnexpectedManagementAPIResponse
+
+def _list_databases(connection):
+    return [database.database_name() for database in Database.list_databases(connection)]
+
+def _lookup_forest(connection, name):
+    # Unlike the other lookups, Forest.lookup raises if the forest is gone
+    try:
+        return Forest.lookup(connection, name)
+    except UnexpectedManagementAPIResponse:
+        response = connection.head(Forest._properties_uri(connection, name))
+        if response.status_code == 404:
+            return None
+        raise
+
+_RESOURCES = [
+    ('databases', _list_databases, Database.lookup),
+    ('servers', Server.list, Server.lookup),
+    ('users', User.list, User.lookup),
+    ('roles', Role.list, Role.lookup),
+    ('privileges', Privilege.list, Privilege.lookup),
+    ('forests', Forest.list, _lookup_forest),
+    ('hosts', Host.list, Host.lookup),
+]
+
+class ClusterSnapshot:
+    """
+    The configuration of the databases, servers, users, roles,
+    privileges, forests and hosts of a cluster.
+
+    Each kind of resource is a dictionary keyed by name. Servers are
+    keyed by "group|name" and privileges by "kind|name".
+
+    A snapshot is captured with a fixed number of concurrent requests:
+    one request per kind of resource to list the names, then one per
+    resource to read it. Dependencies between resources are resolved
+    locally by `closure`, without going back to the server.
+    """
+    def __init__(self):
+        self.databases = {}
+        self.servers = {}
+        self.users = {}
+        self.roles = {}
+        self.privileges = {}
+        self.forests = {}
+        self.hosts = {}
+        self.elapsed = 0.0
+
+    @classmethod
+    def capture(cls, connection, workers=8, resources=None):
+        """
+        Read the configuration of the cluster.
+
+        :param connection: The connection to a MarkLogic server
+        :param workers: The maximum number of concurrent requests
+        :param resources: The kinds of resource to capture (for example
+            ['databases', 'servers']), all of them by default
+        :return: The snapshot
+        """
+        start = time.time()
+        kinds = [entry for entry in _RESOURCES
+                 if resources is None or entry[0] in resources]
+
+        names = parallel_map(lambda entry: entry[1](connection), kinds, workers)
+
+        tasks = []
+        for entry, kind_names in zip(kinds, names):
+            for name in kind_names:
+                tasks.append((entry[0], entry[2], name))
+
+        logging.info("Reading {0} resources".format(len(tasks)))
+        found = parallel_map(lambda task: task[1](connection, task[2]), tasks, workers)
+
+        snapshot = cls()
+        for task, resource in zip(tasks, found):
+            if resource is not None:
+                snapshot.add(task[0], resource)
+
+        snapshot.elapsed = time.time() - start
+        return snapshot
+
+    def add(self, kind, resource):
+        """
+        Add a resource to the snapshot.
+
+        :param kind: The kind of resource ('databases', 'servers', ...)
+        :param resource: The resource
+        """
+        getattr(self, kind)[self._key(kind, resource)] = resource
+        return self
+
+    @staticmethod
+    def _key(kind, resource):
+        if kind == 'databases':
+            return resource.database_name()
+        if kind == 'servers':
+            return "{0}|{1}".format(resource.group_name(), resource.server_name())
+        if kind == 'users':
+            return resource.user_name()
+        if kind == 'roles':
+            return resource.role_name()
+        if kind == 'privileges':
+            return "{0}|{1}".format(resource.kind(), resource.privilege_name())
+        if kind == 'forests':
+            return resource.forest_name()
+        if kind == 'hosts':
+            return resource.host_name()
+        raise ValueError("Unknown resource kind: {0}".format(kind))
+
+    def server(self, name, group='Default'):
+        """
+        Find a server by name, which may be "group|name".
+        """
+        if "|" not in name:
+            name = "{0}|{1}".format(group, name)
+        return self.servers.get(name)
+
+    def privilege(self, name, kind='execute'):
+        """
+        Find a privilege by name or action, which may be "kind|name".
+        """
+        parts = name.split("|")
+        if len(parts) > 1:
+            kind = parts[0]
+            name = parts[1]
+        key = "{0}|{1}".format(kind, name)
+        if key in self.privileges:
+            return self.privileges[key]
+        for privilege in self.privileges.values():
+            if privilege.kind() == kind and privilege.action() == name:
+                return privilege
+        return None
+
+    def closure(self, servers=None, databases=None, users=None, roles=None,
+                privileges=None):
+        """
+        Return a snapshot of the given resources and everything they
+        depend on: the databases, default user and execute privilege of
+        a server; the security, schema and triggers databases and the
+        forests (and their hosts) of a database; the roles of a user,
+        role or privilege, and the roles in a user's permissions.
+
+        Resources are given by name; privileges as "kind|name" (or just
+        the name of an execute privilege).
+
+        :return: A new ClusterSnapshot
+        """
+        result = ClusterSnapshot()
+        pending = []
+        for name in servers or []:
+            pending.append(('servers', self.server(name)))
+        for name in databases or []:
+            pending.append(('databases', self.databases.get(name)))
+        for name in users or []:
+            pending.append(('users', self.users.get(name)))
+        for name in roles or []:
+            pending.append(('roles', self.roles.get(name)))
+        for name in privileges or []:
+            pending.append(('privileges', self.privilege(name)))
+
+        while pending:
+            kind, resource = pending.pop()
+            if resource is None:
+                continue
+            key = self._key(kind, resource)
+            if key in getattr(result, kind):
+                continue
+            result.add(kind, resource)
+            pending.extend(self._dependencies(kind, resource))
+
+        return result
+
+    def _dependencies(self, kind, resource):
+        found = []
+        if kind == 'servers':
+            for name in [resource.content_database_name(),
+                         resource.last_login_database_name(),
+                         resource.modules_database_name()]:
+                if name is not None:
+                    found.append(('databases', self.databases.get(name)))
+            if resource.default_user() is not None:
+                found.append(('users', self.users.get(resource.default_user())))
+            if resource.privilege_name() is not None:
+                found.append(('privileges', self.privilege(resource.privilege_name())))
+        elif kind == 'databases':
+            for name in [resource.security_database_name(),
+                         resource.schema_database_name(),
+                         resource.triggers_database_name()]:
+                if name is not None:
+                    found.append(('databases', self.databases.get(name)))
+            for name in resource.forest_names() or []:
+                forest = self.forests.get(name)
+                found.append(('forests', forest))
+                if forest is not None:
+                    found.append(('hosts', self.hosts.get(forest.host())))
+        elif kind == 'users':
+            for name in resource.role_names() or []:
+                found.append(('roles', self.roles.get(name)))
+            for perm in resource.permissions() or []:
+                found.append(('roles', self.roles.get(perm.role_name())))
+        elif kind in ('roles', 'privileges'):
+            for name in resource.role_names() or []:
+                found.append(('roles', self.roles.get(name)))
+        return found
+
+    def marshal(self):
+        """
+        Return the snapshot as a structure suitable for conversion to JSON.
+        Forests and hosts are included only if the snapshot has any.
+        """
+        config = {
+            'servers': [item.marshal() for item in self.servers.values()],
+            'databases': [item.marshal() for item in self.databases.values()],
+            'users': [item.marshal() for item in self.users.values()],
+            'roles': [item.marshal() for item in self.roles.values()],
+            'privileges': [item.marshal() for item in self.privileges.values()]
+            }
+
+        if self.forests:
+            config['forests'] = []
+            for item in self.forests.values():
+                forest = dict(item.config)
+                forest.update(item.properties)
+                config['forests'].append(forest)
+        if self.hosts:
+            config['hosts'] = [item._config for item in self.hosts.values()]
+
+        return config
+
+    def __repr__(self):
+        return "<ClusterSnapshot databases={0} servers={1} users={2} roles={3} " \
+          "privileges={4} forests={5} hosts={6}>" \
+          .format(len(self.databases), len(self.servers), len(self.users),
+                  len(self.roles), len(self.privileges), len(self.forests),
+                  len(self.hosts))
@@ -27,10 +27,10 @@ User related classes for manipulating MarkLogic users
 
 from __future__ import unicode_literals, print_function, absolute_import
 
-import requests
 from marklogic.models.utilities import exceptions
 from marklogic.models.permission import Permission
-from marklogic.models.utilities.utilities import PropertyLists
+from marklogic.models.utilities.utilities import PropertyLists, manage_uri, if_match
+from marklogic.models.utilities.utilities import unmarshal_response
 import json
 
 class User(PropertyLists):
@@ -276,6 +276,23 @@ class User(PropertyLists):
         result.etag = None
         return result
 
+    @classmethod
+    def _collection_uri(cls, connection):
+        return manage_uri(connection, "users")
+
+    @classmethod
+    def _properties_uri(cls, connection, name):
+        return manage_uri(connection, "users/{0}/properties", name)
+
+    @classmethod
+    def _resource_uri(cls, connection, name):
+        return manage_uri(connection, "users/{0}", name)
+
+    def _after_update(self, response):
+        self.name = self._config['user-name']
+        if 'etag' in response.headers:
+            self.etag = response.headers['etag']
+
     def create(self, connection):
         """
         Creates the User on the MarkLogic server.
@@ -283,10 +300,7 @@ class User(PropertyLists):
         :param connection: The connection to a MarkLogic server
         :return: The User object
         """
-        uri = "http://{0}:{1}/manage/v2/users" \
-          .format(connection.host, connection.management_port)
-
-        response = requests.post(uri, json=self._config, auth=connection.auth)
+        response = connection.post(User._collection_uri(connection), json=self._config)
 
         if response.status_code not in [200, 201, 204]:
             raise exceptions.UnexpectedManagementAPIResponse(response.text)
@@ -316,23 +330,13 @@ class User(PropertyLists):
         :param connection: The connection to a MarkLogic server
         :return: The User object
         """
-        uri = "http://{0}:{1}/manage/v2/users/{2}/properties" \
-          .format(connection.host, connection.management_port,self.name)
-
-        headers = {}
-        if self.etag is not None:
-            headers['if-match'] = self.etag
-
-        response = requests.put(uri, json=self._config, auth=connection.auth,
-                                headers=headers)
+        response = connection.put(User._properties_uri(connection, self.name),
+                                  json=self._config, headers=if_match(self.etag))
 
         if response.status_code not in [200, 204]:
             raise exceptions.UnexpectedManagementAPIResponse(response.text)
 
-        self.name = self._config['user-name']
-        if 'etag' in response.headers:
-                self.etag = response.headers['etag']
-
+        self._after_update(response)
         return self
 
     def delete(self, connection):
@@ -342,14 +346,8 @@ class User(PropertyLists):
         :param connection: The connection to a MarkLogic server
         :return: The User object
         """
-        uri = "http://{0}:{1}/manage/v2/users/{2}" \
-          .format(connection.host, connection.management_port, self.name)
-
-        headers = {}
-        if self.etag is not None:
-            headers['if-match'] = self.etag
-
-        response = requests.delete(uri, auth=connection.auth, headers=headers)
+        response = connection.delete(User._resource_uri(connection, self.name),
+                                     headers=if_match(self.etag))
 
         if (response.status_code not in [200, 204]
             and not response.status_code == 404):
@@ -366,11 +364,8 @@ class User(PropertyLists):
         :return: A list of user names
         """
 
-        uri = "http://{0}:{1}/manage/v2/users" \
-          .format(connection.host, connection.management_port)
-
-        response = requests.get(uri, auth=connection.auth,
-                                headers={'accept': 'application/json'})
+        response = connection.get(User._collection_uri(connection),
+                                  headers={'accept': 'application/json'})
 
         if response.status_code != 200:
             raise exceptions.UnexpectedManagementAPIResponse(response.text)
@@ -392,15 +387,11 @@ class User(PropertyLists):
         :param connection: The connection to the MarkLogic database
         :return: The user
         """
-        uri = "http://{0}:{1}/manage/v2/users/{2}/properties".format(connection.host, connection.port,
-                                                                     name)
-        response = requests.get(uri, auth=connection.auth, headers={'accept': 'application/json'})
+        response = connection.get(User._properties_uri(connection, name),
+                                  headers={'accept': 'application/json'})
 
         if response.status_code == 200:
-            result = User.unmarshal(json.loads(response.text))
-            if 'etag' in response.headers:
-                result.etag = response.headers['etag']
-            return result
+            return unmarshal_response(response, User.unmarshal)
         elif response.status_code == 404:
             return None
         else:
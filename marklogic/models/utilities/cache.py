@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+A cache of management API lookups, revalidated with ETags.
+"""
+
+from __future__ import unicode_literals, print_function, absolute_import
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+class LookupCache:
+    """
+    A bounded cache of unmarshalled management resources keyed by
+    resource URI.
+
+    Each entry holds the ETag the server sent with the resource and
+    the object built from it. The entry is revalidated on every use
+    by sending the ETag in an If-None-Match header; when the server
+    answers 304 Not Modified, a copy of the cached object is returned
+    without downloading or parsing the properties again.
+
+    Entries older than `ttl` seconds are dropped, and when there are
+    more than `max_entries` entries the least recently used one is
+    dropped.
+    """
+    def __init__(self, max_entries=128, ttl=300):
+        """
+        Create a cache.
+
+        :param max_entries: The maximum number of resources cached
+        :param ttl: The number of seconds a resource is cached
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, uri):
+        """
+        Return the cached (etag, object) pair for a URI, or None.
+
+        The object is the cached instance; use a copy of it.
+
+        :param uri: The resource URI
+        :return: The (etag, object) pair or None
+        """
+        with self._lock:
+            entry = self._entries.pop(uri, None)
+            if entry is None:
+                return None
+            etag, value, stored = entry
+            if time.time() - stored > self.ttl:
+                return None
+            self._entries[uri] = entry
+            return etag, value
+
+    def put(self, uri, etag, value):
+        """
+        Cache an object.
+
+        :param uri: The resource URI
+        :param etag: The ETag of the resource
+        :param value: The object built from the resource
+        """
+        with self._lock:
+            self._entries.pop(uri, None)
+            self._entries[uri] = (etag, copy.deepcopy(value), time.time())
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, uri):
+        """
+        Remove a URI from the cache.
+
+        :param uri: The resource URI
+        """
+        with self._lock:
+            self._entries.pop(uri, None)
+
+    def clear(self):
+        """
+        Remove everything from the cache.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
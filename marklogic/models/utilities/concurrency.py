@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Helpers for running requests concurrently.
+"""
+
+from __future__ import unicode_literals, print_function, absolute_import
+
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+def parallel_map(function, items, workers=8):
+    """
+    Call `function` on every item using at most `workers` threads.
+
+    All of the calls are made even if some of them fail; the first
+    exception (in item order) is then raised.
+
+    :param function: The function to call with each item
+    :param items: An iterable of items
+    :param workers: The maximum number of concurrent calls
+    :return: The list of results, in the order of the items
+    """
+    items = list(items)
+    results = [None] * len(items)
+    errors = [None] * len(items)
+    if not items:
+        return results
+
+    work = queue.Queue()
+    for index, item in enumerate(items):
+        work.put((index, item))
+
+    def worker():
+        while True:
+            try:
+                index, item = work.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                results[index] = function(item)
+            except Exception as e:
+                errors[index] = e
+
+    threads = [threading.Thread(target=worker)
+               for i in range(0, min(workers, len(items)))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for error in errors:
+        if error is not None:
+            raise error
+    return results
+
+
+_DONE = object()
+
+class WorkerPool:
+    """
+    Hand the items of an iterable to a pool of worker threads.
+
+    A single producer (the caller of `run`) feeds a bounded queue, so
+    when the workers fall behind the producer blocks and no more than
+    `queue_size` items are read ahead, however many the iterable yields.
+
+    If the handler raises, no more items are handed out, the items
+    already queued are discarded and `run` raises the first error once
+    every worker has stopped. A handler that wants to carry on after an
+    error must catch it itself.
+    """
+    def __init__(self, handler, workers=8, queue_size=None):
+        """
+        Create a pool.
+
+        :param handler: The function to call with each item, from a worker thread
+        :param workers: The number of worker threads
+        :param queue_size: The number of items read ahead, defaults to
+            twice the number of workers
+        """
+        if workers < 1:
+            raise ValueError("At least one worker is required")
+        self.handler = handler
+        self.workers = workers
+        self.queue_size = queue_size if queue_size is not None else workers * 2
+        self.error = None
+        self._lock = threading.Lock()
+
+    def run(self, items):
+        """
+        Handle every item and wait until they have all been handled.
+
+        :param items: An iterable of items
+        """
+        self.error = None
+        work = queue.Queue(self.queue_size)
+        threads = [threading.Thread(target=self._worker, args=(work,))
+                   for i in range(0, self.workers)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        try:
+            for item in items:
+                if self.error is not None:
+                    break
+                work.put(item)
+        finally:
+            for thread in threads:
+                work.put(_DONE)
+            for thread in threads:
+                thread.join()
+
+        if self.error is not None:
+            raise self.error
+
+    def _worker(self, work):
+        while True:
+            item = work.get()
+            if item is _DONE:
+                return
+            if self.error is not None:
+                # Keep taking items so that a full queue can't block run()
+                continue
+            try:
+                self.handler(item)
+            except Exception as e:
+                with self._lock:
+                    if self.error is None:
+                        self.error = e
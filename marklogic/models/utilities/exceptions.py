@@ -47,3 +47,36 @@ class UnexpectedAPIResponse(MLClientException):
 
     """
     pass
+
+
+class RestartTimeout(MLClientException):
+    """
+    This exception class is for hosts that did not restart in time.
+
+    """
+    pass
+
+
+class JobTimeout(MLClientException):
+    """
+    This exception class is for jobs that did not finish in time.
+
+    """
+    pass
+
+
+class DocumentNotFound(MLClientException):
+    """
+    This exception class is for documents that do not exist.
+
+    """
+    pass
+
+
+class PathCollision(MLClientException):
+    """
+    This exception class is for documents whose URIs map to the same
+    file when they are exported.
+
+    """
+    pass
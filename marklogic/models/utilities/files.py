@@ -19,23 +19,220 @@
 # Paul Hoehne       03/01/2015     Initial development
 #
 
+import errno
+import fnmatch
+import hashlib
 import os, sys, stat
 
+try:
+    from os import scandir
+except ImportError:
+    scandir = None
+
 """
 MarkLogic file classes
 """
 
+class _ListdirEntry:
+    """
+    A minimal stand-in for os.DirEntry on Pythons without os.scandir.
+    """
+    def __init__(self, directory, name):
+        self.name = name
+        self.path = os.path.join(directory, name)
+        self._lstat = os.lstat(self.path)
+
+    def is_symlink(self):
+        return stat.S_ISLNK(self._lstat.st_mode)
+
+    def stat(self, follow_symlinks=True):
+        if follow_symlinks and self.is_symlink():
+            return os.stat(self.path)
+        return self._lstat
+
+    def is_dir(self, follow_symlinks=True):
+        try:
+            return stat.S_ISDIR(self.stat(follow_symlinks).st_mode)
+        except OSError as e:
+            # As os.DirEntry: only a dangling link is neither
+            if e.errno != errno.ENOENT:
+                raise
+            return False
+
+    def is_file(self, follow_symlinks=True):
+        try:
+            return stat.S_ISREG(self.stat(follow_symlinks).st_mode)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return False
+
+
+def _entries(directory):
+    if scandir is not None:
+        return list(scandir(directory))
+    return [_ListdirEntry(directory, name) for name in os.listdir(directory)]
+
+
+def _matches(patterns, relative_path, name):
+    """
+    Patterns containing a slash are matched against the path relative to
+    the root of the walk, other patterns against the file name.
+    """
+    for pattern in patterns:
+        target = relative_path if '/' in pattern else name
+        if fnmatch.fnmatch(target, pattern):
+            return True
+    return False
+
+
+def selected(relative_path, include=None, exclude=None):
+    """
+    Whether `iter_directory` would return a file, judging by its path
+    alone: the file matches an include pattern (or there are none) and
+    neither it nor any directory above it matches an exclude pattern.
+
+    :param relative_path: The path relative to the root of the walk,
+        with "/" separators
+    :param include: Glob patterns of files to return
+    :param exclude: Glob patterns of files and directories to skip
+    :return: True or False
+    """
+    parts = relative_path.split('/')
+    if exclude:
+        for i in range(1, len(parts) + 1):
+            if _matches(exclude, '/'.join(parts[:i]), parts[i - 1]):
+                return False
+    return not include or _matches(include, relative_path, parts[-1])
+
+
+def iter_directory(root, include=None, exclude=None, symlinks='files', with_stat=False,
+                   onerror=None):
+    """
+    Walk a directory tree, yielding the files found as they are found.
+
+    The walk is iterative, so deep trees do not hit the recursion limit,
+    and nothing is accumulated, so memory does not grow with the number
+    of files. Each file is described by a dictionary with the same
+    `filename` and `partial-directory` (the path) keys as
+    `walk_directories`. With `with_stat`, the dictionary also has the
+    file's `size` and `mtime`.
+
+    `include` and `exclude` are lists of glob patterns. Patterns
+    containing a "/" are matched against the path relative to `root`
+    (with "/" separators), others against the file or directory name.
+    A file is returned if it matches an include pattern (or no include
+    patterns were given) and no exclude pattern. Excluded directories
+    are not descended into.
+
+    `symlinks` is one of: "skip", ignore symbolic links entirely;
+    "files", return links to files but do not descend into links to
+    directories; "follow", follow all links (each directory is visited
+    at most once, so link cycles are harmless).
+
+    If a directory can't be read, or a file or followed directory can't
+    be stat'ed, the OSError is raised, unless an `onerror` function is
+    given; as with `os.walk`, it is called with the error and the walk
+    carries on without that directory or file. Callers
+    that act on files being absent (deleting, for example) must not
+    treat a walk that reported errors as complete.
+
+    :param root: The directory to walk
+    :param include: Glob patterns of files to return
+    :param exclude: Glob patterns of files and directories to skip
+    :param symlinks: The symbolic link policy
+    :param with_stat: Include the size and modification time of each file
+    :param onerror: A function called with the OSError for each
+        directory or file that can't be read
+    :return: A generator of file dictionaries
+    """
+    if symlinks not in ['skip', 'files', 'follow']:
+        raise ValueError("Unknown symlink policy: {0}".format(symlinks))
+
+    include = include or []
+    exclude = exclude or []
+    seen = set()
+    if symlinks == 'follow':
+        root_stat = os.stat(root)
+        seen.add((root_stat.st_dev, root_stat.st_ino))
+
+    stack = [(root, '')]
+    while stack:
+        directory, relative = stack.pop()
+        try:
+            entries = _entries(directory)
+        except OSError as e:
+            if onerror is None:
+                raise
+            onerror(e)
+            continue
+
+        subdirectories = []
+        for entry in entries:
+            relative_path = relative + entry.name
+            link = entry.is_symlink()
+            if link and symlinks == 'skip':
+                continue
+            if _matches(exclude, relative_path, entry.name):
+                continue
+
+            if entry.is_dir(follow_symlinks=True):
+                if link and symlinks != 'follow':
+                    continue
+                if symlinks == 'follow':
+                    try:
+                        dir_stat = entry.stat()
+                    except OSError as e:
+                        if onerror is None:
+                            raise
+                        onerror(e)
+                        continue
+                    key = (dir_stat.st_dev, dir_stat.st_ino)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                subdirectories.append((entry.path, relative_path + '/'))
+            elif entry.is_file(follow_symlinks=True):
+                if include and not _matches(include, relative_path, entry.name):
+                    continue
+                result = {u'filename': entry.name, u'partial-directory': entry.path}
+                if with_stat:
+                    try:
+                        file_stat = entry.stat()
+                    except OSError as e:
+                        if onerror is None:
+                            raise
+                        onerror(e)
+                        continue
+                    result[u'size'] = file_stat.st_size
+                    result[u'mtime'] = file_stat.st_mtime
+                yield result
+
+        # Reversed so that directories are walked in the order listed
+        stack.extend(reversed(subdirectories))
+
+
 def walk_directories(current_directory):
     """
     Recursively walk a directory returning all of the files found.
+    Use `iter_directory` to process the files as they are found.
     """
-    file_list = []
-    for dir in os.listdir(current_directory):
-        pathname = os.path.join(current_directory, dir)
-        mode = os.stat(pathname).st_mode
+    return list(iter_directory(current_directory, symlinks='follow'))
 
-        if stat.S_ISDIR(mode):
-            file_list.extend(walk_directories(pathname))
-        else:
-            file_list.append({u'filename': dir, u'partial-directory': pathname})
-    return file_list
+
+def file_hash(path, algorithm='sha1', block_size=1048576):
+    """
+    Compute the hex digest of a file's contents, reading it in blocks.
+
+    :param path: The file path
+    :param algorithm: A hashlib algorithm name
+    :param block_size: The read size
+    :return: The hex digest
+    """
+    digest = hashlib.new(algorithm)
+    with open(path, 'rb') as data_file:
+        block = data_file.read(block_size)
+        while block:
+            digest.update(block)
+            block = data_file.read(block_size)
+    return digest.hexdigest()
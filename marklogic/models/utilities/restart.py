@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Wait for the hosts of a cluster to restart.
+"""
+
+from __future__ import unicode_literals, print_function, absolute_import
+
+import json
+import logging
+import re
+import time
+import requests
+from marklogic.models.host import Host
+from marklogic.models.utilities.concurrency import parallel_map
+from marklogic.models.utilities.exceptions import RestartTimeout
+from marklogic.models.utilities.exceptions import UnexpectedManagementAPIResponse
+
+class RestartWaiter:
+    """
+    Wait until every host named in a restart response has restarted.
+
+    A configuration change that needs a restart is answered with a 202
+    and the time each affected host last started. Each host is polled
+    concurrently on its admin port until it reports a later startup
+    time. The wait between polls of a host starts at `interval` and
+    grows by half each time, up to `max_interval`. If the hosts haven't
+    all restarted `timeout` seconds after the wait began,
+    RestartTimeout is raised.
+
+    The response identifies the hosts by id. Their names are read from
+    the Management API, which may itself be restarting, so that read is
+    retried (with the same backoff) until the deadline. A host whose
+    last startup time isn't reported is not restarted yet: it is
+    restarted when it reports a later startup time than the first one
+    it is polled for.
+    """
+    def __init__(self, timeout=300.0, interval=0.25, max_interval=5.0,
+                 admin_port=8001, workers=8):
+        """
+        Create a waiter.
+
+        :param timeout: The number of seconds to wait for all of the hosts
+        :param interval: The first wait between polls, in seconds
+        :param max_interval: The longest wait between polls
+        :param admin_port: The port of the Admin API
+        :param workers: The maximum number of hosts polled at once
+        """
+        self.timeout = timeout
+        self.interval = interval
+        self.max_interval = max_interval
+        self.admin_port = admin_port
+        self.workers = workers
+
+    def _entries(self, response):
+        return json.loads(response.text)['restart']['last-startup']
+
+    def _needs_names(self, entries):
+        return len(entries) > 1 or (len(entries) == 1 and 'host-id' in entries[0])
+
+    def _resolve(self, connection, entries, names):
+        """
+        Pair each entry with its host name. Raises KeyError if a host
+        id isn't in `names`. With no entries, the connection host is
+        paired with None.
+        """
+        if not entries:
+            return [(connection.host, None)]
+        if not self._needs_names(entries):
+            return [(connection.host, entries[0]['value'])]
+        return [(names[entry['host-id']], entry['value']) for entry in entries]
+
+    def _next_interval(self, interval):
+        return min(self.max_interval, interval * 1.5)
+
+    def _timestamp_uri(self, host):
+        return "http://{0}:{1}/admin/v1/timestamp".format(host, self.admin_port)
+
+    def _startup(self, status_code, stamp):
+        """
+        The startup time in a timestamp reply, or None if the host
+        didn't answer with one.
+        """
+        if status_code == 200 and re.match(r"\d\d\d\d-\d\d-\d\dT", stamp) is not None:
+            return stamp.strip()
+        return None
+
+    def _names_timeout(self, error):
+        return RestartTimeout("Could not read the names of the restarting hosts "
+                              "within {0} seconds: {1}".format(self.timeout, error))
+
+    def _host_timeout(self, host):
+        return RestartTimeout("Host {0} did not restart within {1} seconds"
+                              .format(host, self.timeout))
+
+    def restarting(self, connection, response, deadline=None):
+        """
+        The hosts that are restarting and the time they last started.
+
+        :param connection: The connection to a MarkLogic server
+        :param response: The 202 response
+        :param deadline: When to give up reading the host names, as a
+            time.time() value; `timeout` seconds from now by default
+        :return: A list of (host name, last startup) pairs
+        """
+        if deadline is None:
+            deadline = time.time() + self.timeout
+        entries = self._entries(response)
+        interval = self.interval
+        while True:
+            try:
+                names = {}
+                if self._needs_names(entries):
+                    names = Host.names_by_id(connection)
+                return self._resolve(connection, entries, names)
+            except (requests.exceptions.RequestException,
+                    UnexpectedManagementAPIResponse, KeyError, ValueError) as e:
+                error = e
+            if time.time() >= deadline:
+                raise self._names_timeout(error)
+            logging.info("Retrying the host names: {0}".format(error))
+            time.sleep(max(0, min(interval, deadline - time.time())))
+            interval = self._next_interval(interval)
+
+    def wait(self, connection, response):
+        """
+        Wait for the hosts in a 202 response to restart.
+
+        :param connection: The connection to a MarkLogic server
+        :param response: The 202 response
+        :return: A dictionary of the seconds each host took to restart,
+            keyed by host name
+        """
+        start = time.time()
+        deadline = start + self.timeout
+        hosts = self.restarting(connection, response, deadline)
+
+        def poll(item):
+            host, last_startup = item
+            uri = self._timestamp_uri(host)
+            interval = self.interval
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise self._host_timeout(host)
+                try:
+                    reply = connection.get(uri, timeout=min(remaining, 10.0))
+                    startup = self._startup(reply.status_code, reply.text)
+                    if startup is not None and last_startup is None:
+                        last_startup = startup
+                    elif startup is not None and startup > last_startup:
+                        return time.time() - start
+                except requests.exceptions.RequestException:
+                    pass
+                time.sleep(max(0, min(interval, deadline - time.time())))
+                interval = self._next_interval(interval)
+
+        latencies = parallel_map(poll, hosts, self.workers)
+        result = dict(zip([host for host, last_startup in hosts], latencies))
+        logging.info("Restarted: {0}".format(result))
+        return result
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+When and how long to wait before sending a failed request again.
+"""
+
+from __future__ import unicode_literals, print_function, absolute_import
+
+import calendar
+import random
+import threading
+import time
+from email.utils import parsedate
+
+class RetryPolicy:
+    """
+    Which failed requests are sent again, how many times, and how long
+    to wait in between.
+
+    A request is retried if the server answers with one of `statuses`
+    or if the connection fails (it is refused, reset or times out),
+    but only if its method is one of `methods` or the caller marked
+    the request as idempotent. The wait doubles after
+    each attempt, starting at `backoff` seconds and limited to
+    `max_backoff` seconds; with `jitter` a random wait up to that
+    amount is used instead, so that many clients don't retry in step.
+    A Retry-After header from the server overrides the wait, up to
+    `max_retry_after` seconds.
+    """
+    def __init__(self, attempts=5, statuses=None, methods=None, backoff=0.5,
+                 max_backoff=30.0, jitter=True, max_retry_after=120.0):
+        """
+        Create a retry policy.
+
+        :param attempts: The maximum number of times a request is sent
+        :param statuses: The status codes to retry, by default 429,
+            502, 503 and 504
+        :param methods: The methods to retry, by default GET, HEAD,
+            PUT, DELETE and OPTIONS
+        :param backoff: The wait before the first retry, in seconds
+        :param max_backoff: The longest wait between attempts
+        :param jitter: Wait a random time up to the backoff
+        :param max_retry_after: The longest wait a Retry-After can ask for
+        """
+        self.attempts = attempts
+        if statuses is None:
+            statuses = [429, 502, 503, 504]
+        self.statuses = list(statuses)
+        if methods is None:
+            methods = ['GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS']
+        self.methods = [method.upper() for method in methods]
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.max_retry_after = max_retry_after
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def retryable(self, method, attempt, response=None, idempotent=False):
+        """
+        Whether a failed request should be sent again.
+
+        :param method: The HTTP method
+        :param attempt: The number of times the request has been sent
+        :param response: The response, or None if the connection failed
+        :param idempotent: Retry the request whatever its method
+        :return: True if the request should be retried
+        """
+        if attempt >= self.attempts:
+            return False
+        if not idempotent and method.upper() not in self.methods:
+            return False
+        return response is None or response.status_code in self.statuses
+
+    def delay(self, attempt, response=None):
+        """
+        The number of seconds to wait before the next attempt.
+
+        :param attempt: The number of times the request has been sent
+        :param response: The failed response, if there was one
+        :return: The wait in seconds
+        """
+        if response is not None:
+            retry_after = self._retry_after(response)
+            if retry_after is not None:
+                return min(retry_after, self.max_retry_after)
+
+        delay = min(self.max_backoff, self.backoff * (2 ** (attempt - 1)))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def _retry_after(self, response):
+        value = response.headers.get('retry-after')
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        date = parsedate(value)
+        if date is None:
+            return None
+        return max(0.0, calendar.timegm(date) - time.time())
+
+    def wait(self, attempt, response=None):
+        """
+        Wait before the next attempt.
+        """
+        self.record_retry()
+        time.sleep(self.delay(attempt, response))
+
+    def record_retry(self):
+        """
+        Count a retry. A policy can be shared by several threads.
+        """
+        with self._lock:
+            self.retries += 1
+
+    def __repr__(self):
+        return "<RetryPolicy attempts={0} statuses={1} retries={2}>" \
+          .format(self.attempts, self.statuses, self.retries)
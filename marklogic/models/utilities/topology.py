@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+The hosts of a cluster, for spreading requests across them.
+"""
+
+from __future__ import unicode_literals, print_function, absolute_import
+
+import logging
+import threading
+import time
+from marklogic.models.host import Host
+
+class HostTopology:
+    """
+    A cached list of the hosts in a cluster and the choice of a host
+    for each request.
+
+    The hosts are discovered with `Host.list` and rediscovered every
+    `refresh` seconds. A host that fails is left out for `eviction`
+    seconds. Hosts are chosen in turn ('round-robin') or by the
+    fewest requests in progress ('least-outstanding').
+
+    The host names are the names the hosts have in the cluster, so
+    they must be resolvable by the client.
+    """
+    def __init__(self, refresh=300.0, policy='round-robin', eviction=30.0, hosts=None):
+        """
+        Create a topology.
+
+        :param refresh: The number of seconds the host list is cached,
+            or None to never rediscover the hosts
+        :param policy: 'round-robin' or 'least-outstanding'
+        :param eviction: The number of seconds a failed host is left out
+        :param hosts: An initial list of host names
+        """
+        if policy not in ['round-robin', 'least-outstanding']:
+            raise ValueError("Unknown routing policy: {0}".format(policy))
+        self.refresh = refresh
+        self.policy = policy
+        self.eviction = eviction
+        self._hosts = []
+        self._updated = None
+        self._failed = {}
+        self._outstanding = {}
+        self._next = 0
+        self._discovering = False
+        self._lock = threading.Lock()
+        if hosts is not None:
+            self.update(hosts)
+
+    def update(self, hosts):
+        """
+        Replace the list of hosts.
+
+        :param hosts: A list of host names
+        :return: The topology
+        """
+        with self._lock:
+            self._hosts = list(hosts)
+            self._updated = time.time()
+            for host in self._hosts:
+                self._outstanding.setdefault(host, 0)
+        return self
+
+    def discover(self, connection):
+        """
+        Read the list of hosts from the cluster. If that fails, the
+        hosts already known are kept.
+
+        :param connection: The connection to a MarkLogic server
+        :return: The topology
+        """
+        try:
+            hosts = Host.list(connection)
+        except Exception as e:
+            logging.warning("Could not list the cluster hosts: {0}".format(e))
+            with self._lock:
+                self._updated = time.time()
+            return self
+        return self.update(hosts)
+
+    def hosts(self, connection=None):
+        """
+        The hosts that haven't failed recently. The list is
+        rediscovered first if it is out of date.
+
+        :param connection: The connection used to rediscover the hosts
+        :return: A list of host names
+        """
+        self._refresh(connection)
+        with self._lock:
+            return self._healthy()
+
+    def _refresh(self, connection):
+        # Only one thread rediscovers the hosts; the others carry on
+        # with the hosts already known.
+        if connection is None:
+            return
+        with self._lock:
+            stale = self._updated is None \
+              or (self.refresh is not None and time.time() - self._updated > self.refresh)
+            if not stale or self._discovering:
+                return
+            self._discovering = True
+        try:
+            self.discover(connection)
+        finally:
+            self._discovering = False
+
+    def _healthy(self):
+        now = time.time()
+        for host, failed in list(self._failed.items()):
+            if now - failed > self.eviction:
+                del self._failed[host]
+        return [host for host in self._hosts if host not in self._failed]
+
+    def acquire(self, connection=None, exclude=None):
+        """
+        Choose a host for a request and count it as in progress until
+        `release` is called.
+
+        :param connection: The connection used to rediscover the hosts
+        :param exclude: Hosts not to choose
+        :return: A host name, or None if there are no hosts to choose from
+        """
+        self._refresh(connection)
+        with self._lock:
+            hosts = [host for host in self._healthy() if host not in (exclude or [])]
+            if not hosts:
+                return None
+            start = self._next % len(hosts)
+            self._next += 1
+            ordered = hosts[start:] + hosts[:start]
+            if self.policy == 'least-outstanding':
+                host = min(ordered, key=lambda name: self._outstanding.get(name, 0))
+            else:
+                host = ordered[0]
+            self._outstanding[host] = self._outstanding.get(host, 0) + 1
+            return host
+
+    def release(self, host):
+        """
+        Record that a request to a host has finished.
+
+        :param host: The host name
+        """
+        with self._lock:
+            if self._outstanding.get(host, 0) > 0:
+                self._outstanding[host] -= 1
+
+    def fail(self, host):
+        """
+        Leave a host out for `eviction` seconds.
+
+        :param host: The host name
+        """
+        logging.warning("Evicting host {0}".format(host))
+        with self._lock:
+            self._failed[host] = time.time()
+
+    def outstanding(self, host):
+        """
+        The number of requests in progress on a host.
+        """
+        return self._outstanding.get(host, 0)
+
+    def __repr__(self):
+        return "<HostTopology hosts={0} failed={1} policy={2}>" \
+          .format(len(self._hosts), len(self._failed), self.policy)
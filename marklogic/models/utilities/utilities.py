@@ -25,10 +25,54 @@ Various utility classes.
 """
 
 from __future__ import unicode_literals, print_function, absolute_import
+import copy
+import json
 from abc import ABCMeta, abstractmethod
 from marklogic.models.utilities.validators import validate_type
 from marklogic.models.utilities.validators import validate_list_of_type
 from marklogic.models.utilities.validators import assert_list_of_type
+from marklogic.models.utilities.validators import validate_custom
+
+def manage_uri(connection, path, *args):
+    """
+    The URI of a Management API resource, shared by the synchronous
+    models and their asyncio twins.
+
+    :param connection: A Connection or AsyncConnection
+    :param path: The resource path below /manage/v2/, with `format` fields
+    :param args: The values of the fields
+    :return: The URI
+    """
+    return "http://{0}:{1}/manage/v2/".format(connection.host, connection.management_port) \
+      + path.format(*args)
+
+def if_match(etag, headers=None):
+    """
+    Request headers with an if-match header for the etag, if there is one.
+
+    :param etag: The etag read with the resource, or None
+    :param headers: Other headers
+    :return: A dictionary of headers
+    """
+    headers = dict(headers or {})
+    if etag is not None:
+        headers['if-match'] = etag
+    return headers
+
+def unmarshal_response(response, unmarshal):
+    """
+    Build an object from the JSON body of a response, taking its etag
+    from the response headers.
+
+    :param response: A successful response
+    :param unmarshal: A function that builds the object from the JSON
+    :return: The object
+    """
+    result = unmarshal(json.loads(response.text))
+    etag = response.headers.get('etag')
+    if etag is not None:
+        result.etag = etag
+    return result
 
 class PropertyLists:
     """
@@ -244,3 +288,90 @@ class PropertyLists:
                 self._config[propname] = thelist
             else:
                 del self._config[propname]
+
+class ChangeTracking:
+    """
+    The ChangeTracking class is a mixin class for configuration
+    objects that can be marshalled. It remembers the configuration
+    as it was last read from (or written to) the server, so that an
+    update only needs to send the properties that changed.
+    """
+    def mark_clean(self, baseline=None):
+        """
+        Record the current configuration as the configuration on
+        the server.
+
+        :param baseline: The marshalled configuration on the server,
+            if it is not the current configuration
+        :return: The calling object
+        """
+        if baseline is None:
+            baseline = self.marshal()
+        self._baseline = copy.deepcopy(baseline)
+        return self
+
+    def is_tracked(self):
+        """
+        Returns true if the configuration was read from the server,
+        and changes to it are therefore known.
+
+        :return: True or False
+        """
+        return getattr(self, '_baseline', None) is not None
+
+    def diff(self):
+        """
+        Return the properties that changed since the configuration
+        was read from the server, in marshalled form.
+
+        Changed and new properties have their new values. A list
+        property that was removed is reported as an empty list. A
+        removed scalar property can't be expressed as a change (a
+        properties PUT leaves the properties it doesn't mention as they
+        are), so it isn't reported here; see `removed`. If the
+        configuration was not read from the server, every property is
+        returned.
+
+        :return: A dictionary of the changed properties
+        """
+        current = self.marshal()
+        baseline = getattr(self, '_baseline', None)
+        if baseline is None:
+            return current
+
+        delta = {}
+        for key in current:
+            if key not in baseline or baseline[key] != current[key]:
+                delta[key] = current[key]
+        for key in baseline:
+            if key not in current and isinstance(baseline[key], list) and baseline[key]:
+                delta[key] = []
+        return delta
+
+    def removed(self):
+        """
+        Return the scalar (not list) properties that were removed since
+        the configuration was read from the server.
+
+        :return: A sorted list of property names
+        """
+        baseline = getattr(self, '_baseline', None)
+        if baseline is None:
+            return []
+        current = self.marshal()
+        return sorted(key for key in baseline
+                      if key not in current and not isinstance(baseline[key], list))
+
+    def _changes(self):
+        """
+        The properties an update has to send (see `diff`). A removed
+        scalar property would stay set on the server, so that is an
+        error; set the property to its default value instead.
+
+        :return: A dictionary of the changed properties
+        """
+        removed = self.removed()
+        if removed:
+            validate_custom("Properties can't be removed, only changed: {0}"
+                            .format(", ".join(removed)))
+        return self.diff()
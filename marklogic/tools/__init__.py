@@ -28,6 +28,7 @@ import zipfile
 import platform
 import shutil
 import subprocess
+from marklogic.tools.watcher import Watcher
 
 
 """
@@ -115,16 +116,3 @@ class MLCPLoader():
                 if os.path.exists(full_path):
                     return full_path
         return None
-
-
-class Watcher():
-    """
-    Watcher will observe a directory and all the files in the director
-    or its descendants.  If any change, it should upload the file to
-    the appropriate database.
-    """
-    def __init__(self):
-        pass
-
-    def watch(self, conn, directory):
-        pass
@@ -0,0 +1,420 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, absolute_import
+
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Watch a directory and keep a database up to date with it.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import threading
+import time
+from marklogic.models.utilities import files
+
+_WRITE = 'write'
+_DELETE = 'delete'
+
+# From <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO \
+  | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+
+_EVENT = struct.Struct(str("iIII"))
+
+
+class _Inotify:
+    """
+    A minimal ctypes binding to the Linux inotify API.
+    """
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library(str("c")) or str("libc.so.6"),
+                           use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self._libc = libc
+        self.fd = libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+    def add_watch(self, path):
+        if not isinstance(path, bytes):
+            path = path.encode('utf-8')
+        wd = self._libc.inotify_add_watch(self.fd, path, _WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        return wd
+
+    def rm_watch(self, wd):
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self, timeout):
+        """
+        Wait up to `timeout` seconds for events and return them as a
+        list of (wd, mask, cookie, name) tuples.
+        """
+        ready = select.select([self.fd], [], [], timeout)[0]
+        if not ready:
+            return []
+        data = os.read(self.fd, 65536)
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0").decode('utf-8', 'replace')
+            offset += length
+            events.append((wd, mask, cookie, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class Watcher():
+    """
+    Watcher will observe a directory and all the files in the director
+    or its descendants.  If any change, it should upload the file to
+    the appropriate database.
+
+    Changes are collected for `debounce` seconds after the last event
+    (but never more than `max_delay` seconds), repeated events on a
+    file are coalesced, and the result is sent as multipart batches
+    of writes and a batched delete. A file that is removed or renamed
+    away becomes a document delete; a file renamed into place becomes
+    a document write, so a rename is a move of the document. Files
+    larger than `max_batch_file_size` bytes are not read into a batch
+    but streamed to the server one at a time.
+
+    Each file is loaded with the URI `prefix` + its path relative to
+    the watched directory (with "/" separators).
+
+    On Linux, changes are reported by inotify. Elsewhere, or with
+    `use_inotify=False`, the directory is scanned every `poll_interval`
+    seconds. The `watching` event is set once the initial scan is done.
+    """
+    def __init__(self, database=None, prefix="/", collections=None,
+                 debounce=0.5, max_delay=5.0, batch_size=100,
+                 poll_interval=2.0, use_inotify=True, include=None,
+                 exclude=None, callback=None, max_batch_file_size=1048576):
+        """
+        Create a watcher.
+
+        :param database: The Database to upload to
+        :param prefix: The prefix to use when constructing document URIs
+        :param collections: Collections for the uploaded documents
+        :param debounce: Seconds without events before changes are sent
+        :param max_delay: The longest a change waits before it is sent
+        :param batch_size: The maximum number of documents per request
+        :param poll_interval: Seconds between scans when polling
+        :param use_inotify: Use inotify if it is available
+        :param include: Glob patterns of files to upload
+        :param exclude: Glob patterns of files and directories to ignore
+        :param callback: A callable `callback(written, deleted)` invoked
+            with the lists of URIs after every batch is sent
+        :param max_batch_file_size: The largest file, in bytes, that is
+            sent in a batch; larger files are loaded with `Database.load_file`
+        """
+        self.database = database
+        self.prefix = prefix
+        self.collections = collections
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.include = include
+        self.exclude = exclude
+        self.callback = callback
+        self.max_batch_file_size = max_batch_file_size
+
+        self.watching = threading.Event()
+        self._stop = threading.Event()
+        self._pending = {}
+        self._first_change = None
+        self._last_change = None
+        self._root = None
+        self._known = {}
+
+    def stop(self):
+        """
+        Stop watching. `watch` returns after sending pending changes.
+        """
+        self._stop.set()
+
+    def watch(self, conn, directory):
+        """
+        Watch a directory until `stop` is called (or the process is
+        interrupted), uploading changes as they happen.
+
+        :param conn: The server connection
+        :param directory: The directory to watch
+        """
+        if self.database is None:
+            raise ValueError("The watcher has no database")
+
+        self._stop.clear()
+        self.watching.clear()
+        self._root = os.path.abspath(directory)
+        self._pending = {}
+        self._first_change = None
+        self._last_change = None
+
+        inotify = None
+        if self.use_inotify:
+            try:
+                inotify = _Inotify()
+            except (OSError, AttributeError) as e:
+                logging.info("inotify unavailable, polling: {0}".format(e))
+
+        try:
+            if inotify is not None:
+                self._watch_inotify(conn, inotify)
+            else:
+                self._watch_polling(conn)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.watching.clear()
+            if inotify is not None:
+                inotify.close()
+            if self._pending:
+                self._flush(conn)
+
+    def _relative(self, path):
+        return os.path.relpath(path, self._root).replace(os.sep, '/')
+
+    def _uri(self, relative):
+        return self.prefix + relative
+
+    def _excluded(self, relative):
+        return not files.selected(relative, exclude=self.exclude)
+
+    def _wanted(self, relative):
+        return files.selected(relative, self.include, self.exclude)
+
+    def _scan(self, directory):
+        """
+        Return the files under `directory` as a dictionary of relative
+        path to (size, mtime).
+        """
+        found = {}
+        # A directory can be removed while it is being scanned
+        onerror = lambda e: logging.debug("Could not scan {0}: {1}".format(e.filename, e))
+        for result in files.iter_directory(directory, include=self.include,
+                                           exclude=self.exclude, with_stat=True,
+                                           onerror=onerror):
+            found[self._relative(result['partial-directory'])] = (result['size'], result['mtime'])
+        return found
+
+    def _change(self, relative, kind):
+        now = time.time()
+        self._pending[relative] = kind
+        if self._first_change is None:
+            self._first_change = now
+        self._last_change = now
+
+    def _due(self):
+        if not self._pending:
+            return False
+        now = time.time()
+        return now - self._last_change >= self.debounce \
+          or now - self._first_change >= self.max_delay
+
+    def _timeout(self, idle):
+        if not self._pending:
+            return idle
+        now = time.time()
+        return max(0.0, min(self._last_change + self.debounce,
+                            self._first_change + self.max_delay) - now)
+
+    def _by_size(self, relatives):
+        """
+        Split the files into those small enough to batch and the rest.
+        """
+        small = []
+        large = []
+        for relative in relatives:
+            try:
+                size = os.stat(os.path.join(self._root, relative)).st_size
+            except OSError:
+                # Removed since the event; its delete event follows.
+                continue
+            if size > self.max_batch_file_size:
+                large.append(relative)
+            else:
+                small.append(relative)
+        return small, large
+
+    def _documents(self, relatives, written):
+        for relative in relatives:
+            try:
+                with open(os.path.join(self._root, relative), 'rb') as data_file:
+                    content = data_file.read()
+            except (IOError, OSError):
+                # Removed since the event; its delete event follows.
+                continue
+            written.append(self._uri(relative))
+            yield self._uri(relative), content, None
+
+    def _flush(self, conn):
+        pending = self._pending
+        self._pending = {}
+        self._first_change = None
+        self._last_change = None
+
+        writes = sorted(r for r, kind in pending.items() if kind == _WRITE)
+        deletes = sorted(self._uri(r) for r, kind in pending.items() if kind == _DELETE)
+        written = []
+        try:
+            small, large = self._by_size(writes)
+            if small:
+                self.database.write_documents(conn, self._documents(small, written),
+                                              collections=self.collections,
+                                              batch_size=self.batch_size)
+            for relative in large:
+                path = os.path.join(self._root, relative)
+                # Connection errors are IOErrors too, so check rather than catch
+                if os.path.exists(path):
+                    self.database.load_file(conn, path, self._uri(relative),
+                                            collections=self.collections)
+                    written.append(self._uri(relative))
+            if deletes:
+                self.database.delete_documents(conn, deletes, batch_size=self.batch_size)
+        except Exception:
+            logging.exception("Failed to send changes, will retry")
+            for relative, kind in pending.items():
+                if relative not in self._pending:
+                    self._change(relative, kind)
+            return
+
+        if self.callback is not None:
+            self.callback(written, deletes)
+
+    def _watch_polling(self, conn):
+        self._known = self._scan(self._root)
+        self.watching.set()
+        next_scan = time.time() + self.poll_interval
+        while not self._stop.is_set():
+            self._stop.wait(min(self._timeout(self.poll_interval),
+                                max(0.0, next_scan - time.time())))
+            if time.time() >= next_scan:
+                current = self._scan(self._root)
+                for relative, state in current.items():
+                    if self._known.get(relative) != state:
+                        self._change(relative, _WRITE)
+                for relative in self._known:
+                    if relative not in current:
+                        self._change(relative, _DELETE)
+                self._known = current
+                next_scan = time.time() + self.poll_interval
+            if self._due():
+                self._flush(conn)
+
+    def _add_watches(self, inotify, directory, wds):
+        """
+        Watch `directory` and its subdirectories, returning the files
+        found in them.
+        """
+        stack = [directory]
+        while stack:
+            path = stack.pop()
+            relative = self._relative(path)
+            if relative != '.' and self._excluded(relative):
+                continue
+            try:
+                wds[inotify.add_watch(path)] = path
+                entries = os.listdir(path)
+            except OSError:
+                continue
+            for name in entries:
+                child = os.path.join(path, name)
+                if os.path.isdir(child) and not os.path.islink(child):
+                    stack.append(child)
+        return self._scan(directory)
+
+    def _watch_inotify(self, conn, inotify):
+        wds = {}
+        self._known = self._add_watches(inotify, self._root, wds)
+        self.watching.set()
+
+        while not self._stop.is_set():
+            events = inotify.read(min(self._timeout(0.5), 0.5))
+            for wd, mask, cookie, name in events:
+                if mask & IN_Q_OVERFLOW:
+                    current = self._scan(self._root)
+                    for relative in set(self._known) | set(current):
+                        self._change(relative, _WRITE if relative in current else _DELETE)
+                    self._known = current
+                    continue
+                if mask & IN_IGNORED:
+                    wds.pop(wd, None)
+                    continue
+                if wd not in wds or not name:
+                    continue
+
+                path = os.path.join(wds[wd], name)
+                relative = self._relative(path)
+
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        for child in self._add_watches(inotify, path, wds):
+                            self._known[child] = True
+                            self._change(child, _WRITE)
+                    elif mask & (IN_DELETE | IN_MOVED_FROM):
+                        under = relative + '/'
+                        for child in [k for k in self._known if k.startswith(under)]:
+                            del self._known[child]
+                            self._change(child, _DELETE)
+                        for stale in [w for w, p in wds.items()
+                                      if p == path or p.startswith(path + os.sep)]:
+                            inotify.rm_watch(stale)
+                            wds.pop(stale, None)
+                    continue
+
+                if not self._wanted(relative):
+                    continue
+                if mask & (IN_DELETE | IN_MOVED_FROM):
+                    if self._known.pop(relative, None) is not None:
+                        self._change(relative, _DELETE)
+                    else:
+                        self._pending.pop(relative, None)
+                elif mask & (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE):
+                    self._known[relative] = True
+                    self._change(relative, _WRITE)
+
+            if self._due():
+                self._flush(conn)
@@ -39,6 +39,10 @@ setup(
     install_requires=[
         'requests>=2.5.0'
     ],
+    extras_require={
+        'async': ['aiohttp>=3.0'],
+        'metrics': ['numpy']
+    },
     include_package_data=True,
     zip_safe=False,
     platforms='any',
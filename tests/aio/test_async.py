@@ -0,0 +1,519 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, absolute_import
+
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import aiohttp
+import asyncio
+import json
+import re
+import socket
+import threading
+import time
+import unittest
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from marklogic.aio import AsyncConnection, AsyncHost, AsyncRole, AsyncRestartWaiter
+from marklogic.aio import AsyncDatabase, AsyncPrivilege
+from marklogic.models.database import Database
+from marklogic.models.privilege import Privilege
+from marklogic.models.role import Role
+from marklogic.models.utilities.exceptions import RestartTimeout
+from marklogic.models.utilities.exceptions import UnexpectedManagementAPIResponse
+from marklogic.models.utilities.retry import RetryPolicy
+from requests.auth import HTTPBasicAuth
+
+BEFORE = "2015-06-01T10:00:00.000000-04:00"
+AFTER = "2015-06-01T10:05:00.000000-04:00"
+
+
+class ManagementHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    challenges = 0
+    digest_uris = []
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _authorized(self):
+        authorization = self.headers.get('Authorization', '')
+        if authorization.startswith('Digest '):
+            uri = re.search(r'uri="([^"]*)"', authorization).group(1)
+            ManagementHandler.digest_uris.append((self.path, uri))
+            return True
+        ManagementHandler.challenges += 1
+        self._reply(401, headers={
+            'WWW-Authenticate': 'Digest realm="public", qop="auth", nonce="n1"'})
+        return False
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        if self.path == '/manage/v2/hosts':
+            body = {'host-default-list': {'list-items': {
+                'list-count': {'value': 2},
+                'list-item': [{'nameref': 'host-1'}, {'nameref': 'host-2'}]}}}
+            self._reply(200, json.dumps(body).encode('utf-8'))
+        else:
+            self._reply(404)
+
+    def do_HEAD(self):
+        if self._authorized():
+            self._reply(404)
+
+
+class CrudHandler(BaseHTTPRequestHandler):
+    """
+    An in-memory Management API that records every request. Resources
+    are created by POSTing to a collection and read, updated and
+    deleted through their properties.
+    """
+    names = {'databases': 'database-name', 'forests': 'forest-name',
+             'roles': 'role-name', 'privileges': 'privilege-name'}
+    resources = {}
+    requests = []
+    failures = []
+    in_flight = 0
+    most_in_flight = 0
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body=None, etag=None):
+        body = b'' if body is None else json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        if etag is not None:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _record(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length).decode('utf-8')) if length else None
+        CrudHandler.requests.append((self.command, self.path, body,
+                                     self.headers.get('if-match')))
+        return body
+
+    def _key(self):
+        # /manage/v2/roles/r1/properties?kind=x -> roles/r1
+        path = self.path.split("?")[0][len("/manage/v2/"):]
+        return "/".join(path.split("/")[0:2])
+
+    def do_POST(self):
+        body = self._record()
+        collection = self._key()
+        name = body[CrudHandler.names[collection]]
+        if name in CrudHandler.failures:
+            self._reply(400)
+            return
+        with CrudHandler.lock:
+            CrudHandler.in_flight += 1
+            CrudHandler.most_in_flight = max(CrudHandler.most_in_flight,
+                                             CrudHandler.in_flight)
+        time.sleep(0.05)
+        with CrudHandler.lock:
+            CrudHandler.in_flight -= 1
+        CrudHandler.resources["{0}/{1}".format(collection, name)] = body
+        self._reply(201)
+
+    def do_GET(self):
+        self._record()
+        resource = CrudHandler.resources.get(self._key())
+        if resource is None:
+            self._reply(404)
+        else:
+            self._reply(200, resource, etag='"e1"')
+
+    def do_HEAD(self):
+        self._record()
+        self.send_response(200 if self._key() in CrudHandler.resources else 404)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_PUT(self):
+        body = self._record()
+        CrudHandler.resources[self._key()].update(body)
+        self._reply(204, etag='"e2"')
+
+    def do_DELETE(self):
+        self._record()
+        CrudHandler.resources.pop(self._key(), None)
+        self._reply(204)
+
+
+class RestartHandler(BaseHTTPRequestHandler):
+    """
+    Two hosts that restart after answering a number of timestamp polls.
+    The first read of the host list fails.
+    """
+    restarts = {}
+    polls = {}
+    manage_failures = 0
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        host = self.server.server_address[0]
+        if self.path.startswith("/manage/v2/hosts") and RestartHandler.manage_failures > 0:
+            RestartHandler.manage_failures -= 1
+            status, body = 503, ""
+        elif self.path.startswith("/manage/v2/hosts"):
+            items = [{'idref': '111', 'nameref': '127.0.0.2'},
+                     {'idref': '222', 'nameref': '127.0.0.3'}]
+            status, body = 200, json.dumps({'host-default-list': {'list-items': {
+                'list-count': {'value': 2}, 'list-item': items}}})
+        else:
+            polls = RestartHandler.polls.get(host, 0) + 1
+            RestartHandler.polls[host] = polls
+            status, body = 200, BEFORE if polls <= RestartHandler.restarts[host] else AFTER
+        body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class RestartResponse:
+    status_code = 202
+    text = json.dumps({'restart': {'last-startup': [
+        {'host-id': '111', 'value': BEFORE},
+        {'host-id': '222', 'value': BEFORE}]}})
+
+
+class BusyHandler(BaseHTTPRequestHandler):
+    """
+    Answers 503 to the first `busy` requests.
+    """
+    busy = 0
+    bodies = []
+
+    def log_message(self, *args):
+        pass
+
+    def _respond(self):
+        length = int(self.headers.get('Content-Length', 0))
+        BusyHandler.bodies.append(self.rfile.read(length))
+        if BusyHandler.busy > 0:
+            BusyHandler.busy -= 1
+            self.send_response(503)
+            self.send_header('Retry-After', '0')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    do_GET = _respond
+    do_POST = _respond
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class TestAsync(unittest.TestCase):
+
+    def setUp(self):
+        ManagementHandler.challenges = 0
+        ManagementHandler.digest_uris = []
+        self.server = ThreadingServer(("127.0.0.1", 0), ManagementHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_concurrent_calls(self):
+        async def run():
+            async with AsyncConnection.make_connection(
+                    "127.0.0.1", "admin", "admin", pool_size=5) as conn:
+                conn.management_port = self.server.server_port
+                first = await AsyncHost.list(conn)
+                results = await asyncio.gather(*[AsyncHost.list(conn) for i in range(0, 20)])
+                exists = await AsyncRole.exists(conn, "no-such-role")
+                return first, results, exists, conn.challenges_saved()
+
+        first, results, exists, saved = asyncio.run(run())
+
+        self.assertEqual(["host-1", "host-2"], first)
+        self.assertEqual(20, len(results))
+        self.assertFalse(exists)
+        self.assertEqual(1, ManagementHandler.challenges)
+        self.assertEqual(21, saved)
+
+    def test_digest_params(self):
+        async def run():
+            async with AsyncConnection.make_connection("127.0.0.1", "admin", "admin") as conn:
+                uri = "http://127.0.0.1:{0}/manage/v2/hosts?view=default" \
+                  .format(self.server.server_port)
+                for i in range(0, 2):
+                    await conn.get(uri, params={'format': 'json', 'q': 'a b'})
+
+        asyncio.run(run())
+
+        self.assertEqual(2, len(ManagementHandler.digest_uris))
+        for path, uri in ManagementHandler.digest_uris:
+            self.assertEqual("/manage/v2/hosts?view=default&format=json&q=a+b", path)
+            self.assertEqual(path, uri)
+
+
+class TestAsyncRetry(unittest.TestCase):
+
+    def setUp(self):
+        BusyHandler.busy = 0
+        BusyHandler.bodies = []
+        self.server = ThreadingServer(("127.0.0.1", 0), BusyHandler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.uri = "http://127.0.0.1:{0}/v1/documents".format(self.server.server_port)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _run(self, policy, work):
+        async def run():
+            async with AsyncConnection("127.0.0.1", HTTPBasicAuth("admin", "admin"),
+                                       port=self.server.server_port, retry=policy) as conn:
+                return await work(conn)
+        return asyncio.run(run())
+
+    def test_busy(self):
+        BusyHandler.busy = 2
+        policy = RetryPolicy(backoff=0.01)
+        response = self._run(policy, lambda conn: conn.get(self.uri))
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(3, len(BusyHandler.bodies))
+        self.assertEqual(2, policy.retries)
+
+    def test_post(self):
+        BusyHandler.busy = 1
+        response = self._run(True, lambda conn: conn.post(self.uri, data=b"x"))
+        self.assertEqual(503, response.status_code)
+        self.assertEqual(1, len(BusyHandler.bodies))
+
+        BusyHandler.busy = 1
+        BusyHandler.bodies = []
+        response = self._run(RetryPolicy(backoff=0.01),
+                             lambda conn: conn.post(self.uri, data=b"x", idempotent=True))
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([b"x", b"x"], BusyHandler.bodies)
+
+    def test_connection_refused(self):
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        uri = "http://127.0.0.1:{0}/v1/documents".format(sock.getsockname()[1])
+        sock.close()
+
+        policy = RetryPolicy(attempts=2, backoff=0.01)
+        with self.assertRaises(aiohttp.ClientConnectionError):
+            self._run(policy, lambda conn: conn.get(uri))
+        self.assertEqual(1, policy.retries)
+
+
+class TestAsyncCrud(unittest.TestCase):
+
+    def setUp(self):
+        CrudHandler.resources = {}
+        CrudHandler.requests = []
+        CrudHandler.failures = []
+        CrudHandler.most_in_flight = 0
+        self.server = ThreadingServer(("127.0.0.1", 0), CrudHandler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _run(self, work):
+        async def run():
+            async with AsyncConnection("127.0.0.1", HTTPBasicAuth("admin", "admin"),
+                                       management_port=self.server.server_port) as conn:
+                return conn, await work(conn)
+        return asyncio.run(run())
+
+    def _requests(self):
+        return [(method, path) for method, path, body, etag in CrudHandler.requests]
+
+    def test_role(self):
+        async def work(conn):
+            await AsyncRole.create(conn, Role("r1"))
+            role = await AsyncRole.lookup(conn, "r1")
+            role.set_description("changed")
+            await AsyncRole.update(conn, role)
+            found = await AsyncRole.exists(conn, "r1")
+            await AsyncRole.delete(conn, role)
+            return role, found, await AsyncRole.lookup(conn, "r1")
+
+        conn, (role, found, gone) = self._run(work)
+
+        uri = "/manage/v2/roles/r1/properties"
+        self.assertEqual([("POST", "/manage/v2/roles"), ("GET", uri), ("PUT", uri),
+                          ("HEAD", uri), ("DELETE", "/manage/v2/roles/r1"), ("GET", uri)],
+                         self._requests())
+        self.assertEqual("changed", CrudHandler.requests[2][2]['description'])
+        self.assertEqual('"e1"', CrudHandler.requests[2][3])
+        self.assertEqual('"e2"', role.etag)
+        self.assertTrue(found)
+        self.assertIsNone(gone)
+
+    def test_privilege(self):
+        async def work(conn):
+            await AsyncPrivilege.create(conn, Privilege("p1", "http://example.com/p1", "execute"))
+            privilege = await AsyncPrivilege.lookup(conn, "execute|p1")
+            await AsyncPrivilege.delete(conn, privilege)
+            return privilege
+
+        conn, privilege = self._run(work)
+
+        self.assertEqual([("POST", "/manage/v2/privileges"),
+                          ("GET", "/manage/v2/privileges/p1/properties?kind=execute"),
+                          ("DELETE", "/manage/v2/privileges/p1?kind=execute")],
+                         self._requests())
+        self.assertEqual("execute", CrudHandler.requests[0][2]['kind'])
+        self.assertEqual('"e1"', CrudHandler.requests[2][3])
+
+    def test_database(self):
+        async def work(conn):
+            await AsyncDatabase.create(conn, Database("db1"))
+            database = await AsyncDatabase.lookup(conn, "db1")
+            unchanged = len(CrudHandler.requests)
+            await AsyncDatabase.update(conn, database)
+            skipped = len(CrudHandler.requests) == unchanged
+            database.set_enabled(False)
+            await AsyncDatabase.update(conn, database)
+            await AsyncDatabase.delete(conn, database)
+            return database, skipped
+
+        conn, (database, skipped) = self._run(work)
+
+        self.assertEqual([("POST", "/manage/v2/forests"),
+                          ("POST", "/manage/v2/databases"),
+                          ("GET", "/manage/v2/databases/db1/properties"),
+                          ("PUT", "/manage/v2/databases/db1/properties"),
+                          ("DELETE", "/manage/v2/databases/db1?forest-delete=data")],
+                         self._requests())
+        self.assertEqual(["db1-Forest-001"], CrudHandler.requests[1][2]['forest'])
+        # Only the changed property is sent, as with Database.update
+        self.assertTrue(skipped)
+        self.assertEqual({'enabled': False}, CrudHandler.requests[3][2])
+        self.assertEqual({}, database.diff())
+
+    def test_database_workers(self):
+        database = Database("db2")
+        database.set_forest_names(["db2-{0}".format(i) for i in range(0, 6)])
+        self._run(lambda conn: AsyncDatabase.create(conn, database, workers=2))
+
+        self.assertEqual(2, CrudHandler.most_in_flight)
+        self.assertEqual(7, len(CrudHandler.resources))
+
+    def test_database_rollback(self):
+        database = Database("db3")
+        database.set_forest_names(["db3-{0}".format(i) for i in range(0, 4)])
+        CrudHandler.failures = ["db3"]
+
+        with self.assertRaises(UnexpectedManagementAPIResponse):
+            self._run(lambda conn: AsyncDatabase.create(conn, database))
+        self.assertEqual({}, CrudHandler.resources)
+        self.assertEqual(["/manage/v2/forests/db3-{0}?level=full".format(i) for i in range(0, 4)],
+                         sorted(path for method, path in self._requests() if method == "DELETE"))
+
+        # A forest that can't be created is not removed, the others are
+        CrudHandler.requests = []
+        CrudHandler.failures = ["db3-2"]
+        with self.assertRaises(UnexpectedManagementAPIResponse):
+            self._run(lambda conn: AsyncDatabase.create(conn, database))
+        self.assertEqual({}, CrudHandler.resources)
+        self.assertEqual(3, len([method for method, path in self._requests()
+                                 if method == "DELETE"]))
+
+
+class TestAsyncRestart(unittest.TestCase):
+
+    def setUp(self):
+        RestartHandler.polls = {}
+        RestartHandler.restarts = {'127.0.0.2': 2, '127.0.0.3': 4}
+        RestartHandler.manage_failures = 1
+        self.servers = [ThreadingServer(("127.0.0.2", 0), RestartHandler)]
+        port = self.servers[0].server_port
+        self.servers.append(ThreadingServer(("127.0.0.3", port), RestartHandler))
+        self.servers.append(ThreadingServer(("127.0.0.2", 0), RestartHandler))
+        for server in self.servers:
+            thread = threading.Thread(target=server.serve_forever)
+            thread.daemon = True
+            thread.start()
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+    def _wait(self, waiter, response=None):
+        async def run():
+            async with AsyncConnection("127.0.0.2", HTTPBasicAuth("admin", "admin"),
+                                       management_port=self.servers[2].server_port) as conn:
+                return await waiter.wait(conn, response or RestartResponse())
+        return asyncio.run(run())
+
+    def test_all_hosts(self):
+        waiter = AsyncRestartWaiter(timeout=10, interval=0.01, max_interval=0.05,
+                                    admin_port=self.servers[0].server_port)
+
+        latencies = self._wait(waiter)
+
+        self.assertEqual(['127.0.0.2', '127.0.0.3'], sorted(latencies))
+        self.assertEqual(3, RestartHandler.polls['127.0.0.2'])
+        self.assertEqual(5, RestartHandler.polls['127.0.0.3'])
+
+    def test_deadline(self):
+        RestartHandler.restarts['127.0.0.3'] = 1000000
+        waiter = AsyncRestartWaiter(timeout=0.3, interval=0.01, max_interval=0.05,
+                                    admin_port=self.servers[0].server_port)
+
+        with self.assertRaises(RestartTimeout):
+            self._wait(waiter)
+
+    def test_no_last_startup(self):
+        waiter = AsyncRestartWaiter(timeout=10, interval=0.01, max_interval=0.05,
+                                    admin_port=self.servers[0].server_port)
+        response = RestartResponse()
+        response.text = json.dumps({'restart': {'last-startup': []}})
+
+        latencies = self._wait(waiter, response)
+
+        self.assertEqual(['127.0.0.2'], list(latencies))
+        self.assertEqual(3, RestartHandler.polls['127.0.0.2'])
+
+if __name__ == "__main__":
+    unittest.main()
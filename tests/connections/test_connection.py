@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, absolute_import
+
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import unittest
+from marklogic.models import Connection
+from requests.auth import HTTPDigestAuth
+
+
+class TestConnection(unittest.TestCase):
+
+    def test_session_selection(self):
+        conn = Connection("example.com", HTTPDigestAuth("admin", "admin"))
+
+        self.assertIs(conn.management_session,
+                      conn.session_for("http://example.com:8002/manage/v2/databases"))
+        self.assertIs(conn.rest_session,
+                      conn.session_for("http://example.com:8000/v1/documents?uri=/a.json"))
+        self.assertIsNot(conn.rest_session, conn.management_session)
+
+    def test_pool_size(self):
+        conn = Connection.make_connection("example.com", "admin", "admin", pool_size=25)
+
+        adapter = conn.management_session.get_adapter("http://example.com:8002/")
+        self.assertEqual(25, adapter._pool_maxsize)
+        self.assertIs(conn.auth, conn.rest_session.auth)
+        conn.close()
+
+if __name__ == "__main__":
+    unittest.main()
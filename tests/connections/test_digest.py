@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, absolute_import
+
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import hashlib
+import threading
+import unittest
+from marklogic.models import Connection
+from requests.utils import parse_dict_header
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+except ImportError:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+
+def _md5(value):
+    return hashlib.md5(value.encode('utf-8')).hexdigest()
+
+
+class DigestHandler(BaseHTTPRequestHandler):
+    nonce = "abc123"
+    challenges = 0
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        header = self.headers.get('Authorization')
+        stale = False
+        if header is not None:
+            fields = parse_dict_header(header[len('Digest '):])
+            ha1 = _md5("admin:public:admin")
+            ha2 = _md5("GET:" + fields['uri'])
+            expected = _md5("{0}:{1}:{2}:{3}:auth:{4}".format(
+                ha1, fields['nonce'], fields['nc'], fields['cnonce'], ha2))
+            if fields['nonce'] == DigestHandler.nonce and fields['response'] == expected:
+                self.send_response(200)
+                self.send_header('Content-Length', '2')
+                self.end_headers()
+                self.wfile.write(b'ok')
+                return
+            stale = fields['nonce'] != DigestHandler.nonce
+
+        DigestHandler.challenges += 1
+        challenge = 'Digest realm="public", qop="auth", nonce="{0}"'.format(DigestHandler.nonce)
+        if stale:
+            challenge += ', stale=true'
+        self.send_response(401)
+        self.send_header('WWW-Authenticate', challenge)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+class TestDigest(unittest.TestCase):
+
+    def setUp(self):
+        DigestHandler.nonce = "abc123"
+        DigestHandler.challenges = 0
+        self.server = HTTPServer(("127.0.0.1", 0), DigestHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.uri = "http://127.0.0.1:{0}/v1/ping".format(self.server.server_port)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_nonce_reuse(self):
+        conn = Connection.make_connection("127.0.0.1", "admin", "admin")
+        for i in range(0, 5):
+            self.assertEqual(200, conn.get(self.uri).status_code)
+
+        self.assertEqual(1, DigestHandler.challenges)
+        self.assertEqual(4, conn.challenges_saved())
+
+    def test_stale_nonce(self):
+        conn = Connection.make_connection("127.0.0.1", "admin", "admin")
+        self.assertEqual(200, conn.get(self.uri).status_code)
+
+        DigestHandler.nonce = "def456"
+        self.assertEqual(200, conn.get(self.uri).status_code)
+        self.assertEqual(200, conn.get(self.uri).status_code)
+        self.assertEqual(2, DigestHandler.challenges)
+        self.assertEqual(1, conn.challenges_saved())
+
+    def test_bad_password(self):
+        conn = Connection.make_connection("127.0.0.1", "admin", "wrong")
+        self.assertEqual(401, conn.get(self.uri).status_code)
+
+if __name__ == "__main__":
+    unittest.main()
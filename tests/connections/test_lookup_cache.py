@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, absolute_import
+
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import json
+import threading
+import time
+import unittest
+from marklogic.models import Connection, Database
+from marklogic.models.utilities.cache import LookupCache
+from requests.auth import HTTPBasicAuth
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+except ImportError:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+
+class PropertiesHandler(BaseHTTPRequestHandler):
+    version = 1
+    statuses = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        name = self.path.split("/")[4]
+        if name == "missing":
+            status, body = 404, b""
+        else:
+            etag = '"{0}-{1}"'.format(name, PropertiesHandler.version)
+            if self.headers.get('If-None-Match') == etag:
+                status, body = 304, b""
+            else:
+                status = 200
+                body = json.dumps({'database-name': name,
+                                   'forest': ["{0}-{1}".format(name, PropertiesHandler.version)]}) \
+                                   .encode('utf-8')
+        PropertiesHandler.statuses.append(status)
+        self.send_response(status)
+        if status != 404:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestLookupCache(unittest.TestCase):
+
+    def setUp(self):
+        PropertiesHandler.version = 1
+        PropertiesHandler.statuses = []
+        self.server = HTTPServer(("127.0.0.1", 0), PropertiesHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _connection(self, cache):
+        return Connection("127.0.0.1", HTTPBasicAuth("admin", "admin"),
+                          management_port=self.server.server_port,
+                          lookup_cache=cache)
+
+    def test_revalidation(self):
+        conn = self._connection(True)
+
+        first = Database.lookup(conn, "Documents")
+        first.set_forest_names(["changed"])
+        second = Database.lookup(conn, "Documents")
+        self.assertEqual(["Documents-1"], second.forest_names())
+        self.assertEqual('"Documents-1"', second.etag)
+
+        PropertiesHandler.version = 2
+        third = Database.lookup(conn, "Documents")
+        self.assertEqual(["Documents-2"], third.forest_names())
+
+        self.assertEqual([200, 304, 200], PropertiesHandler.statuses)
+        self.assertEqual(1, conn.lookup_cache.hits)
+        self.assertIsNone(Database.lookup(conn, "missing"))
+
+    def test_bounds(self):
+        cache = LookupCache(max_entries=2, ttl=0.2)
+        conn = self._connection(cache)
+        for name in ["a", "b", "c", "a"]:
+            Database.lookup(conn, name)
+        self.assertEqual([200, 200, 200, 200], PropertiesHandler.statuses)
+        self.assertEqual(2, len(cache))
+
+        Database.lookup(conn, "a")
+        time.sleep(0.3)
+        Database.lookup(conn, "a")
+        self.assertEqual([304, 200], PropertiesHandler.statuses[4:])
+
+    def test_disabled(self):
+        conn = self._connection(None)
+        Database.lookup(conn, "Documents")
+        Database.lookup(conn, "Documents")
+        self.assertEqual([200, 200], PropertiesHandler.statuses)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, absolute_import
+
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import io
+import socket
+import threading
+import unittest
+import requests
+from marklogic.models import Connection, Database
+from marklogic.models.utilities.retry import RetryPolicy
+from requests.auth import HTTPBasicAuth
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+except ImportError:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+
+class BusyHandler(BaseHTTPRequestHandler):
+    busy = 0
+    bodies = []
+
+    def log_message(self, *args):
+        pass
+
+    def _respond(self):
+        length = int(self.headers.get('Content-Length', 0))
+        BusyHandler.bodies.append(self.rfile.read(length))
+        if BusyHandler.busy > 0:
+            BusyHandler.busy -= 1
+            self.send_response(503)
+            self.send_header('Retry-After', '0')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    do_GET = _respond
+    do_PUT = _respond
+    do_POST = _respond
+
+
+class TestRetry(unittest.TestCase):
+
+    def setUp(self):
+        BusyHandler.busy = 0
+        BusyHandler.bodies = []
+        self.server = HTTPServer(("127.0.0.1", 0), BusyHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _connection(self, retry):
+        conn = Connection("127.0.0.1", HTTPBasicAuth("admin", "admin"),
+                          port=self.server.server_port, retry=retry)
+        return conn, "http://127.0.0.1:{0}/v1/documents".format(self.server.server_port)
+
+    def test_busy(self):
+        BusyHandler.busy = 2
+        policy = RetryPolicy(backoff=0.01)
+        conn, uri = self._connection(policy)
+
+        self.assertEqual(200, conn.get(uri).status_code)
+        self.assertEqual(3, len(BusyHandler.bodies))
+        self.assertEqual(2, policy.retries)
+
+    def test_attempts(self):
+        BusyHandler.busy = 5
+        conn, uri = self._connection(RetryPolicy(attempts=3, backoff=0.01))
+
+        self.assertEqual(503, conn.get(uri).status_code)
+        self.assertEqual(3, len(BusyHandler.bodies))
+
+    def test_post_not_retried(self):
+        BusyHandler.busy = 1
+        conn, uri = self._connection(True)
+
+        self.assertEqual(503, conn.post(uri, data="x").status_code)
+        self.assertEqual(1, len(BusyHandler.bodies))
+
+    def test_idempotent_post(self):
+        BusyHandler.busy = 1
+        conn, uri = self._connection(RetryPolicy(backoff=0.01))
+
+        self.assertEqual(200, conn.post(uri, data="x", idempotent=True).status_code)
+        self.assertEqual([b"x", b"x"], BusyHandler.bodies)
+
+    def test_write_documents(self):
+        BusyHandler.busy = 2
+        policy = RetryPolicy(backoff=0.01)
+        conn, uri = self._connection(policy)
+
+        Database("retry-test").write_documents(conn, [("/a.json", {"a": 1}, None)])
+        self.assertEqual(3, len(BusyHandler.bodies))
+        self.assertEqual(BusyHandler.bodies[0], BusyHandler.bodies[2])
+        self.assertEqual(2, policy.retries)
+
+    def test_shared_policy(self):
+        policy = RetryPolicy()
+
+        def count():
+            for i in range(0, 1000):
+                policy.record_retry()
+
+        threads = [threading.Thread(target=count) for i in range(0, 8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(8000, policy.retries)
+
+    def test_file_rewound(self):
+        BusyHandler.busy = 1
+        conn, uri = self._connection(RetryPolicy(backoff=0.01))
+
+        data = io.BytesIO(b"<doc/>")
+        self.assertEqual(200, conn.put(uri, data=data).status_code)
+        self.assertEqual([b"<doc/>", b"<doc/>"], BusyHandler.bodies)
+
+    def test_connection_refused(self):
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        sock.close()
+
+        policy = RetryPolicy(attempts=2, backoff=0.01)
+        conn = Connection("127.0.0.1", HTTPBasicAuth("admin", "admin"),
+                          port=port, retry=policy)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            conn.get("http://127.0.0.1:{0}/v1/documents".format(port))
+        self.assertEqual(1, policy.retries)
+
+    def test_delay(self):
+        policy = RetryPolicy(backoff=1.0, max_backoff=5.0, jitter=False)
+        self.assertEqual([1.0, 2.0, 4.0, 5.0],
+                         [policy.delay(attempt) for attempt in range(1, 5)])
+
+        class Response(object):
+            headers = {'retry-after': '300'}
+        self.assertEqual(120.0, policy.delay(1, Response()))
+
+        policy = RetryPolicy(backoff=1.0)
+        for attempt in range(1, 5):
+            self.assertTrue(0 <= policy.delay(attempt) <= 2 ** (attempt - 1))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, absolute_import
+
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import io
+import json
+import threading
+import unittest
+import requests
+from marklogic.models import Connection
+from marklogic.models.utilities.topology import HostTopology
+from requests.auth import HTTPBasicAuth
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+except ImportError:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+HOSTS = ["127.0.0.2", "127.0.0.3", "127.0.0.4"]
+
+
+class ClusterHandler(BaseHTTPRequestHandler):
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.startswith("/manage/v2/hosts"):
+            items = [{'nameref': host} for host in HOSTS]
+            body = json.dumps({'host-default-list': {'list-items': {
+                'list-count': {'value': len(items)}, 'list-item': items}}})
+        else:
+            ClusterHandler.requests.append((self.server.server_address[0], self.path))
+            body = "{}"
+        body = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class DroppingHandler(BaseHTTPRequestHandler):
+    """
+    Reads an upload and, on 127.0.0.2, drops the connection without
+    answering.
+    """
+    bodies = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        if self.server.server_address[0] == "127.0.0.2":
+            self.close_connection = True
+            return
+        DroppingHandler.bodies.append(body)
+        self.send_response(201)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+class TestHostTopology(unittest.TestCase):
+
+    def setUp(self):
+        ClusterHandler.requests = []
+        self.servers = [HTTPServer(("127.0.0.2", 0), ClusterHandler)]
+        port = self.servers[0].server_port
+        self.servers.append(HTTPServer(("127.0.0.3", port), ClusterHandler))
+        self.servers.append(HTTPServer(("127.0.0.2", 0), ClusterHandler))
+        for server in self.servers:
+            thread = threading.Thread(target=server.serve_forever)
+            thread.daemon = True
+            thread.start()
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+    def _connection(self, topology):
+        return Connection("127.0.0.2", HTTPBasicAuth("admin", "admin"),
+                          port=self.servers[0].server_port,
+                          management_port=self.servers[2].server_port,
+                          topology=topology)
+
+    def _read(self, conn, uri):
+        url = "http://127.0.0.2:{0}/v1/documents?uri={1}".format(conn.port, uri)
+        return conn.get(url)
+
+    def test_discover_and_evict(self):
+        topology = HostTopology(eviction=60)
+        conn = self._connection(topology)
+
+        for i in range(0, 6):
+            self.assertEqual(200, self._read(conn, "/doc{0}.json".format(i)).status_code)
+
+        self.assertEqual(HOSTS[:2], topology.hosts())
+        served = [request[0] for request in ClusterHandler.requests]
+        self.assertEqual(6, len(served))
+        self.assertEqual(3, served.count("127.0.0.2"))
+        self.assertEqual(3, served.count("127.0.0.3"))
+        self.assertEqual(0, topology.outstanding("127.0.0.2"))
+
+    def test_management_not_routed(self):
+        topology = HostTopology(hosts=["127.0.0.3"], refresh=None)
+        conn = self._connection(topology)
+
+        url = "http://127.0.0.2:{0}/v1/eval".format(conn.port)
+        conn.get(url)
+        self._read(conn, "/doc.json")
+
+        self.assertEqual([("127.0.0.2", "/v1/eval"),
+                          ("127.0.0.3", "/v1/documents?uri=/doc.json")],
+                         ClusterHandler.requests)
+
+    def _dropping_connection(self):
+        DroppingHandler.bodies = []
+        servers = [HTTPServer(("127.0.0.2", 0), DroppingHandler)]
+        servers.append(HTTPServer(("127.0.0.3", servers[0].server_port), DroppingHandler))
+        for server in servers:
+            thread = threading.Thread(target=server.serve_forever)
+            thread.daemon = True
+            thread.start()
+            self.servers.append(server)
+        topology = HostTopology(hosts=["127.0.0.2", "127.0.0.3"], refresh=None)
+        conn = Connection("127.0.0.2", HTTPBasicAuth("admin", "admin"),
+                          port=servers[0].server_port, topology=topology)
+        return conn, "http://127.0.0.2:{0}/v1/documents?uri=/doc.xml".format(conn.port)
+
+    def test_failover_rewinds_file(self):
+        conn, url = self._dropping_connection()
+
+        data = io.BytesIO(b"<doc>content</doc>")
+        self.assertEqual(201, conn.put(url, data=data, timeout=5).status_code)
+        self.assertEqual([b"<doc>content</doc>"], DroppingHandler.bodies)
+
+    def test_no_failover_for_sent_stream(self):
+        conn, url = self._dropping_connection()
+
+        data = iter([b"<doc>", b"content</doc>"])
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            conn.put(url, data=data, headers={"Content-Length": "18"}, timeout=5)
+        self.assertEqual([], DroppingHandler.bodies)
+
+    def test_least_outstanding(self):
+        topology = HostTopology(policy='least-outstanding', hosts=HOSTS[:2])
+        first = topology.acquire()
+        second = topology.acquire()
+        self.assertNotEqual(first, second)
+        topology.release(second)
+        self.assertEqual(second, topology.acquire())
+        self.assertEqual(1, topology.outstanding(first))
+
+if __name__ == "__main__":
+    unittest.main()
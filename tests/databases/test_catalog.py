@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, absolute_import
+
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import shutil
+import tempfile
+import unittest
+from marklogic.models.database import Database
+from marklogic.models.database.backup import DatabaseBackup
+from marklogic.models.database.catalog import BackupCatalog
+from tests.fakes import RecordingConnection
+
+
+def backup(job_id, incremental=False, forests=None, database="Documents"):
+    job = DatabaseBackup(job_id, database)
+    job.settings = DatabaseBackup.backup_settings(
+        "/backups", forests=forests, incremental=incremental,
+        incremental_dir="/incremental" if incremental else None)
+    return job
+
+
+class TestBackupCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "catalog.db")
+        self.catalog = BackupCatalog(self.path)
+        self.catalog.add(backup("full-1"), 100)
+        self.catalog.add(backup("inc-1", incremental=True), 110)
+        self.catalog.add(backup("inc-2", incremental=True), 120)
+        self.catalog.add(backup("full-2"), 200)
+        self.catalog.add(backup("partial", forests=["Documents"]), 210)
+        self.catalog.add(backup("inc-3", incremental=True), 220)
+        self.catalog.add(backup("other", database="Other"), 230)
+
+    def tearDown(self):
+        self.catalog.close()
+        shutil.rmtree(self.directory)
+
+    def _chain(self, point):
+        return [item['job-id'] for item in point.chain]
+
+    def test_latest(self):
+        point = self.catalog.restore_point("Documents")
+        self.assertEqual(["full-2", "inc-3"], self._chain(point))
+        self.assertEqual(220, point.timestamp)
+
+    def test_before(self):
+        self.assertEqual(["full-1", "inc-1", "inc-2"],
+                         self._chain(self.catalog.restore_point("Documents", 199)))
+        self.assertEqual(["full-1", "inc-1"],
+                         self._chain(self.catalog.restore_point("Documents", 115)))
+        self.assertEqual(["full-2"],
+                         self._chain(self.catalog.restore_point("Documents", 215)))
+        self.assertIsNone(self.catalog.restore_point("Documents", 99))
+
+    def test_incremental_needs_full(self):
+        self.catalog.forget("full-1")
+        self.assertIsNone(self.catalog.restore_point("Documents", 199))
+
+    def test_prune(self):
+        self.catalog.prune("Documents", "/backups", 2)
+        self.assertEqual(["full-2", "partial", "inc-3"],
+                         [item['job-id'] for item in self.catalog.backups("Documents")])
+        self.assertEqual(1, len(self.catalog.backups("Other")))
+
+    def test_restore(self):
+        self.catalog.close()
+        self.catalog = BackupCatalog(self.path)
+        conn = RecordingConnection(body={'job-id': 'restore-1'})
+
+        job = self.catalog.restore(conn, "Documents", 150)
+
+        self.assertEqual("restore-1", job.job_id)
+        self.assertEqual('restore-database', conn.sent('POST')[0]['operation'])
+        self.assertEqual("/backups", conn.sent('POST')[0]['backup-dir'])
+        self.assertTrue(conn.sent('POST')[0]['incremental'])
+        self.assertEqual("/incremental", conn.sent('POST')[0]['incremental-dir'])
+
+    def test_restore_from_catalog(self):
+        conn = RecordingConnection(body={'job-id': 'restore-1'})
+
+        job = Database("Documents").restore_from_catalog(conn, self.catalog, 105)
+
+        self.assertEqual("restore-1", job.job_id)
+        self.assertEqual("Documents", job.database_name)
+        self.assertEqual("/backups", conn.sent('POST')[0]['backup-dir'])
+        self.assertFalse(conn.sent('POST')[0]['incremental'])
+        with self.assertRaises(ValueError):
+            Database("Documents").restore_from_catalog(conn, self.catalog, 99)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, absolute_import
+
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import time
+import unittest
+from marklogic.models import Database, Forest
+from tests.fakes import RecordingConnection, RecordingResponse
+
+
+class CreateConnection(RecordingConnection):
+    """
+    Counts the creates in flight and fails the create of `fail`.
+    """
+    def __init__(self, fail=None):
+        RecordingConnection.__init__(self, 204)
+        self.fail = fail
+        self.created = []
+        self.active = 0
+        self.peak = 0
+
+    def respond(self, method, uri, json=None, **kwargs):
+        if method != 'POST':
+            return RecordingResponse(self.status_code)
+        name = json.get('forest-name', json.get('database-name'))
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.02)
+        with self.lock:
+            self.active -= 1
+            if name == self.fail:
+                return RecordingResponse(400)
+            self.created.append(name)
+        return RecordingResponse(201)
+
+    def removed(self):
+        return [uri.split("/")[-1].split("?")[0] for uri in self.uris('DELETE')]
+
+
+class TestDatabaseCreate(unittest.TestCase):
+
+    def _database(self, count):
+        db = Database("tenant", hostname="host-1")
+        db.set_forest_names(["tenant-{0}".format(i) for i in range(0, count)])
+        return db
+
+    def test_concurrent_forests(self):
+        conn = CreateConnection()
+        self._database(12).create(conn, workers=4)
+
+        self.assertEqual(13, len(conn.created))
+        self.assertEqual("tenant", conn.created[-1])
+        self.assertEqual(4, conn.peak)
+        self.assertEqual([], conn.uris('GET'))
+
+    def test_rollback(self):
+        conn = CreateConnection(fail="tenant-5")
+        self.assertRaises(Exception, self._database(8).create, conn, workers=3)
+
+        self.assertEqual(7, len(conn.created))
+        self.assertEqual(sorted(conn.created), sorted(conn.removed()))
+
+    def test_database_failure(self):
+        conn = CreateConnection(fail="tenant")
+        db = self._database(2)
+        db._config['forest'].append(Forest("tenant-extra", host="host-2"))
+        self.assertRaises(Exception, db.create, conn)
+        self.assertEqual(sorted(["tenant-0", "tenant-1", "tenant-extra"]), sorted(conn.removed()))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, absolute_import
+
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import copy
+import unittest
+from marklogic.models import Database, Server
+from marklogic.models.database.index import ElementRangeIndex
+from marklogic.models.utilities.validators import ValidationError
+from tests.fakes import RecordingConnection, RecordingResponse
+
+DATABASE = {
+    'database-name': 'diff-test',
+    'forest': ['diff-test-1'],
+    'enabled': True,
+    'stemmed-searches': 'basic',
+    'range-element-index': [{'scalar-type': 'int', 'namespace-uri': '', 'localname': 'a',
+                             'collation': '', 'range-value-positions': 'false',
+                             'invalid-values': 'reject'}]
+}
+
+SERVER = {
+    'server-name': 'diff-app', 'group-name': 'Default', 'server-type': 'http',
+    'root': '/', 'port': 8100, 'content-database': 'diff-test'
+}
+
+
+class LookupConnection(RecordingConnection):
+    """
+    Looks up a copy of `config`.
+    """
+    def __init__(self, config, unmarshal):
+        RecordingConnection.__init__(self, 204)
+        self.config = config
+        self.unmarshal = unmarshal
+
+    def lookup_resource(self, uri, unmarshal):
+        return self.unmarshal(copy.deepcopy(self.config)), RecordingResponse()
+
+
+class TestDiff(unittest.TestCase):
+
+    def test_database_update(self):
+        conn = LookupConnection(DATABASE, Database.unmarshal)
+        db = Database.lookup(conn, "diff-test")
+        self.assertEqual({}, db.diff())
+
+        db.update(conn)
+        self.assertEqual([], conn.sent('PUT'))
+
+        db.set_stemmed_searches('off')
+        self.assertEqual({'stemmed-searches': 'off'}, db.diff())
+        db.update(conn)
+        self.assertEqual([{'stemmed-searches': 'off'}], conn.sent('PUT'))
+        self.assertEqual({}, db.diff())
+
+        db.add_index(ElementRangeIndex('int', '', 'b'))
+        self.assertEqual(['range-element-index'], list(db.diff()))
+        self.assertEqual(2, len(db.diff()['range-element-index']))
+
+    def test_removed_scalar(self):
+        conn = LookupConnection(DATABASE, Database.unmarshal)
+        db = Database.lookup(conn, "diff-test")
+
+        del db._config['stemmed-searches']
+        db.set_enabled(False)
+        self.assertEqual(['stemmed-searches'], db.removed())
+        self.assertEqual({'enabled': False}, db.diff())
+
+        # The PUT would leave the property set on the server
+        with self.assertRaises(ValidationError):
+            db.update(conn)
+        self.assertEqual([], conn.sent('PUT'))
+
+        db.set_stemmed_searches('off')
+        db.update(conn)
+        self.assertEqual([{'enabled': False, 'stemmed-searches': 'off'}], conn.sent('PUT'))
+
+    def test_untracked_update(self):
+        conn = LookupConnection(DATABASE, Database.unmarshal)
+        db = Database("diff-test")
+        db.update(conn)
+        self.assertEqual(db.marshal(), conn.sent('PUT')[0])
+
+    def test_server_update(self):
+        conn = LookupConnection(SERVER, Server.unmarshal)
+        server = Server.lookup(conn, "diff-app")
+        server.set_content_database_name('Documents')
+        server.update(conn)
+        self.assertEqual([{'content-database': 'Documents'}], conn.sent('PUT'))
+
+if __name__ == "__main__":
+    unittest.main()
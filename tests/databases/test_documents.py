@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, absolute_import
+
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import email
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from marklogic.models import Database
+from marklogic.models.permission import Permission
+from marklogic.models.database.documents import DocumentBatch, content_type_for
+from tests.fakes import RecordingConnection
+
+
+def parse(body, content_type):
+    message = email.message_from_bytes(
+        b"Content-Type: " + content_type.encode('utf-8') + b"\r\n\r\n" + body)
+    return message.get_payload()
+
+
+class TestDocuments(unittest.TestCase):
+
+    def test_batch_parts(self):
+        batch = DocumentBatch(collections=["nightly"],
+                              permissions=[Permission("app-reader", "read"),
+                                           Permission("app-reader", "update")])
+        batch.add("/a.json", {"a": 1})
+        batch.add("/b.xml", "<b/>", {"collections": ["special"]})
+
+        parts = parse(batch.body(), batch.content_type())
+        self.assertEqual(4, len(parts))
+
+        default = json.loads(parts[0].get_payload())
+        self.assertEqual(["nightly"], default['collections'])
+        self.assertEqual(["read", "update"], default['permissions'][0]['capabilities'])
+
+        self.assertEqual('attachment; filename="/a.json"', parts[1]['Content-Disposition'])
+        self.assertEqual("application/json", parts[1]['Content-Type'])
+
+        metadata = json.loads(parts[2].get_payload())
+        self.assertEqual(["special", "nightly"], metadata['collections'])
+        self.assertEqual("application/xml", parts[3]['Content-Type'])
+
+    def test_batching(self):
+        conn = RecordingConnection()
+        db = Database("batch-test")
+        docs = [("/doc/{0}.json".format(i), {"n": i}, None) for i in range(0, 250)]
+        db.write_documents(conn, docs, batch_size=100)
+
+        self.assertEqual(3, len(conn.uris('POST')))
+        self.assertIn("database=batch-test", conn.uris('POST')[0])
+
+        conn = RecordingConnection()
+        db.write_documents(conn, [("/big-{0}.txt".format(i), "x" * 600, None)
+                                  for i in range(0, 4)], batch_bytes=1000)
+        self.assertEqual(2, len(conn.uris('POST')))
+
+    def test_content_type(self):
+        self.assertEqual("application/json", content_type_for("/a/b.json"))
+        self.assertEqual("image/png", content_type_for("/a/b.png"))
+        self.assertEqual("text/plain", content_type_for("/a/b", "text/plain"))
+        self.assertEqual("application/octet-stream", content_type_for("/a/b.parquet"))
+        self.assertEqual("application/octet-stream", content_type_for("/a/b"))
+
+    def test_unknown_extension(self):
+        content = bytes(bytearray(range(0, 256)))
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, "sample.parquet")
+            with open(path, 'wb') as data_file:
+                data_file.write(content)
+
+            conn = RecordingConnection()
+            Database("binary-test").load_file(conn, path, "/data/sample.parquet")
+        finally:
+            shutil.rmtree(tmpdir)
+
+        method, uri, kwargs = conn.requests[0]
+        self.assertEqual(content, kwargs['data'])
+        self.assertEqual("application/octet-stream", kwargs['headers']['content-type'])
+
+        batch = DocumentBatch()
+        batch.add("/data/sample", content)
+        parts = parse(batch.body(), batch.content_type())
+        self.assertEqual("application/octet-stream", parts[0]['Content-Type'])
+        self.assertEqual(content, parts[0].get_payload(decode=True))
+
+if __name__ == "__main__":
+    unittest.main()
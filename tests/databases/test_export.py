@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, absolute_import
+
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import unittest
+import zipfile
+from marklogic.models import Connection
+from marklogic.models.database import Database
+from marklogic.models.database.documents import DocumentBatch
+from marklogic.models.utilities.exceptions import PathCollision
+from requests.auth import HTTPBasicAuth
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from urllib.parse import urlparse, parse_qs
+except ImportError:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from urlparse import urlparse, parse_qs
+
+DOCUMENTS = dict(("/docs/{0:02d}.json".format(i), json.dumps({'n': i}))
+                 for i in range(0, 25))
+DOCUMENTS["/docs/big.xml"] = "<big>" + "x" * 200000 + "</big>"
+DOCUMENTS["/other/../escape.txt"] = "contained"
+
+
+class DocumentHandler(BaseHTTPRequestHandler):
+    pages = []
+    aliases = {}
+
+    def log_message(self, *args):
+        pass
+
+    def _multipart(self, parts):
+        batch = DocumentBatch()
+        for uri, content in parts:
+            batch.add(uri, content, content_type="text/plain")
+        body = batch.body()
+        self.send_response(200)
+        self.send_header('Content-Type', batch.content_type())
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        form = parse_qs(self.rfile.read(length).decode('utf-8'))
+        variables = json.loads(form['vars'][0])
+        DocumentHandler.pages.append(variables['after'])
+        uris = sorted(uri for uri in DOCUMENTS
+                      if uri >= variables['after']
+                      and uri.startswith(variables['directory']))
+        self._multipart([(uri, uri) for uri in uris[:int(variables['limit'])]])
+
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        documents = dict(DOCUMENTS, **DocumentHandler.aliases)
+        self._multipart([(uri, documents[uri]) for uri in params['uri']
+                         if uri in documents])
+
+
+class TestExport(unittest.TestCase):
+
+    def setUp(self):
+        DocumentHandler.pages = []
+        DocumentHandler.aliases = {}
+        self.server = HTTPServer(("127.0.0.1", 0), DocumentHandler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.conn = Connection("127.0.0.1", HTTPBasicAuth("admin", "admin"),
+                               port=self.server.server_port)
+        self.database = Database("Documents")
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+    def test_iter_uris(self):
+        uris = list(self.database.iter_uris(self.conn, directory="/docs/", page_size=10))
+
+        self.assertEqual(sorted(uri for uri in DOCUMENTS if uri.startswith("/docs/")), uris)
+        self.assertEqual(["", "/docs/09.json", "/docs/19.json"], DocumentHandler.pages)
+
+    def test_iter_uris_one_per_page(self):
+        uris = list(self.database.iter_uris(self.conn, directory="/docs/1", page_size=1))
+
+        self.assertEqual(["/docs/{0}.json".format(i) for i in range(10, 20)], uris)
+        self.assertEqual(11, len(DocumentHandler.pages))
+
+    def test_directory(self):
+        root = os.path.join(self.directory, "export")
+        seen = []
+        summary = self.database.export_documents(
+            self.conn, root, batch_size=4, workers=3,
+            progress=lambda summary, uri, error: seen.append(uri))
+
+        self.assertEqual(len(DOCUMENTS), summary.exported)
+        self.assertEqual(0, summary.failed())
+        self.assertEqual(sorted(DOCUMENTS), sorted(seen))
+        with open(os.path.join(root, "docs", "big.xml")) as handle:
+            self.assertEqual(DOCUMENTS["/docs/big.xml"], handle.read())
+        with open(os.path.join(root, "other", "escape.txt")) as handle:
+            self.assertEqual("contained", handle.read())
+        self.assertEqual([], [name for name in os.listdir(os.path.join(root, "docs"))
+                              if name.endswith(".part")])
+
+    def test_missing(self):
+        seen = []
+        summary = self.database.export_documents(
+            self.conn, self.directory, uris=["/docs/01.json", "/gone.json"],
+            progress=lambda summary, uri, error: seen.append((uri, type(error).__name__)))
+
+        self.assertEqual(1, summary.exported)
+        self.assertEqual(["/gone.json"], summary.missing)
+        self.assertEqual(2, summary.total())
+        self.assertEqual([("/docs/01.json", "NoneType"), ("/gone.json", "DocumentNotFound")],
+                         sorted(seen))
+        self.assertFalse(os.path.exists(os.path.join(self.directory, "gone.json")))
+
+    def test_tar(self):
+        path = os.path.join(self.directory, "export.tar.gz")
+        summary = self.database.export_documents(self.conn, path, directory="/docs/",
+                                                 batch_size=5)
+
+        self.assertEqual(26, summary.exported)
+        with tarfile.open(path) as archive:
+            self.assertEqual(26, len(archive.getnames()))
+            content = archive.extractfile("docs/big.xml").read().decode('utf-8')
+        self.assertEqual(DOCUMENTS["/docs/big.xml"], content)
+
+    def test_zip(self):
+        path = os.path.join(self.directory, "export.zip")
+        summary = self.database.export_documents(self.conn, path, uris=sorted(DOCUMENTS))
+
+        self.assertEqual(len(DOCUMENTS), summary.exported)
+        with zipfile.ZipFile(path) as archive:
+            self.assertEqual('{"n": 3}', archive.read("docs/03.json").decode('utf-8'))
+            self.assertIn("other/escape.txt", archive.namelist())
+
+    def test_collision(self):
+        DocumentHandler.aliases = {"docs//03.json": "alias"}
+        for name in ["export", "export.tar", "export.zip"]:
+            path = os.path.join(self.directory, name)
+            summary = self.database.export_documents(
+                self.conn, path, uris=["/docs/03.json", "docs//03.json", "/docs/04.json"])
+
+            self.assertEqual(2, summary.exported)
+            self.assertEqual(["docs//03.json"], [uri for uri, error in summary.failures])
+            self.assertIsInstance(summary.failures[0][1], PathCollision)
+
+        with open(os.path.join(self.directory, "export", "docs", "03.json")) as handle:
+            self.assertEqual('{"n": 3}', handle.read())
+        with tarfile.open(os.path.join(self.directory, "export.tar")) as archive:
+            self.assertEqual(["docs/03.json", "docs/04.json"], sorted(archive.getnames()))
+
+    def test_progress_raises(self):
+        def progress(summary, uri, error):
+            raise ValueError("stop")
+
+        with self.assertRaises(ValueError):
+            self.database.export_documents(self.conn, self.directory,
+                                           uris=["/gone.json"] * 50 + sorted(DOCUMENTS),
+                                           batch_size=1, workers=2, progress=progress)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, absolute_import
+
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import shutil
+import tempfile
+import unittest
+from marklogic.models import Connection, Database
+from marklogic.models.database.loader import BulkLoader
+from marklogic.models.database.journal import IngestJournal
+from requests.auth import HTTPDigestAuth
+
+
+class FlakyLoader(BulkLoader):
+    def __init__(self, *args, **kwargs):
+        self.fail_on = kwargs.pop('fail_on', set())
+        BulkLoader.__init__(self, *args, **kwargs)
+        self.sent = []
+
+    def _load_one(self, path, uri, host):
+        if uri in self.fail_on:
+            raise IOError("cannot load " + path)
+        self.sent.append(uri)
+
+
+class TestIngestJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.conn = Connection("localhost", HTTPDigestAuth("admin", "admin"))
+        self.db = Database("journal-test")
+        self.docs = []
+        for i in range(0, 10):
+            path = os.path.join(self.dir, "doc{0}.json".format(i))
+            with open(path, "w") as data:
+                data.write('{{"n": {0}}}'.format(i))
+            self.docs.append((path, "/doc{0}.json".format(i)))
+        self.journal_path = os.path.join(self.dir, "ingest.journal")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_record_and_change(self):
+        path, uri = self.docs[0]
+        with IngestJournal(self.journal_path, verify_hash=True) as journal:
+            self.assertFalse(journal.is_complete(path, uri))
+            journal.record(path, uri)
+            self.assertTrue(journal.is_complete(path, uri))
+            self.assertEqual(40, len(journal.lookup(uri)['hash']))
+
+            with open(path, "a") as data:
+                data.write(" ")
+            self.assertFalse(journal.is_complete(path, uri))
+
+    def test_resume(self):
+        failing = set(uri for path, uri in self.docs[6:])
+        with IngestJournal(self.journal_path, commit_every=2) as journal:
+            loader = FlakyLoader(self.conn, self.db, workers=3,
+                                 journal=journal, fail_on=failing)
+            summary = loader.load(self.docs)
+            self.assertEqual(6, summary.loaded)
+            self.assertEqual(4, summary.failed())
+
+        with IngestJournal(self.journal_path) as journal:
+            self.assertEqual(6, journal.count())
+            loader = FlakyLoader(self.conn, self.db, workers=3, journal=journal)
+            summary = loader.load(self.docs)
+
+        self.assertEqual(4, summary.loaded)
+        self.assertEqual(6, summary.skipped)
+        self.assertEqual(sorted(failing), sorted(loader.sent))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, absolute_import
+
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from marklogic.models import Connection, Database
+from requests.auth import HTTPBasicAuth
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+except ImportError:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+
+class DocumentHandler(BaseHTTPRequestHandler):
+    received = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_PUT(self):
+        length = int(self.headers.get('Content-Length'))
+        DocumentHandler.received.append((self.path, self.headers.get('Content-Type'),
+                                         self.rfile.read(length)))
+        self.send_response(201)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+class TestLoadFile(unittest.TestCase):
+
+    def setUp(self):
+        DocumentHandler.received = []
+        self.server = HTTPServer(("127.0.0.1", 0), DocumentHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+    def test_binary_file(self):
+        data = bytes(bytearray(range(0, 256))) * 1024
+        path = os.path.join(self.directory, "image.png")
+        with open(path, 'wb') as out:
+            out.write(data)
+
+        conn = Connection("127.0.0.1", HTTPBasicAuth("admin", "admin"),
+                          port=self.server.server_port)
+        Database("load-test").load_file(conn, path, "/image.png")
+
+        uri, content_type, body = DocumentHandler.received[0]
+        self.assertIn("uri=/image.png", uri)
+        self.assertEqual("image/png", content_type)
+        self.assertEqual(data, body)
+
+if __name__ == "__main__":
+    unittest.main()
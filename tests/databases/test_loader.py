@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, absolute_import
+
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import threading
+import time
+import unittest
+from marklogic.models import Connection, Database
+from marklogic.models.database.loader import BulkLoader
+from requests.auth import HTTPDigestAuth
+
+
+class RecordingLoader(BulkLoader):
+    def __init__(self, *args, **kwargs):
+        BulkLoader.__init__(self, *args, **kwargs)
+        self.active = {}
+        self.peak = {}
+        self.record_lock = threading.Lock()
+
+    def _load_one(self, path, uri, host):
+        with self.record_lock:
+            self.active[host] = self.active.get(host, 0) + 1
+            self.peak[host] = max(self.peak.get(host, 0), self.active[host])
+        time.sleep(0.01)
+        with self.record_lock:
+            self.active[host] -= 1
+        if uri.endswith("bad"):
+            raise IOError("cannot load " + path)
+
+
+class TestBulkLoader(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = Connection("localhost", HTTPDigestAuth("admin", "admin"))
+        self.db = Database("loader-test")
+
+    def test_summary_and_progress(self):
+        calls = []
+        loader = RecordingLoader(self.conn, self.db, workers=4,
+                                 progress=lambda s, p, u, e: calls.append(u))
+
+        docs = [("/tmp/{0}".format(i), "/doc/{0}".format(i)) for i in range(0, 20)]
+        docs.append(("/tmp/x", "/doc/bad"))
+        summary = loader.load(iter(docs))
+
+        self.assertEqual(20, summary.loaded)
+        self.assertEqual(1, summary.failed())
+        self.assertEqual("/doc/bad", summary.failures[0][1])
+        self.assertEqual(21, len(calls))
+
+    def test_host_limit(self):
+        loader = RecordingLoader(self.conn, self.db, workers=8, host_limit=2,
+                                 hosts=["host-a", "host-b"])
+        summary = loader.load(("/tmp/{0}".format(i), "/doc/{0}".format(i))
+                              for i in range(0, 40))
+
+        self.assertEqual(40, summary.total())
+        self.assertLessEqual(loader.peak["host-a"], 2)
+        self.assertLessEqual(loader.peak["host-b"], 2)
+
+    def test_progress_raises(self):
+        def progress(summary, path, uri, error):
+            if error is not None:
+                raise ValueError("stop")
+
+        loader = RecordingLoader(self.conn, self.db, workers=2, queue_size=1,
+                                 progress=progress)
+        docs = [("/tmp/x", "/doc/bad")] * 2 + \
+          [("/tmp/{0}".format(i), "/doc/{0}".format(i)) for i in range(0, 200)]
+        raised = []
+
+        def load():
+            try:
+                loader.load(iter(docs))
+            except ValueError as e:
+                raised.append(e)
+
+        thread = threading.Thread(target=load)
+        thread.daemon = True
+        thread.start()
+        thread.join(10)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(1, len(raised))
+        self.assertLess(loader._summary.total(), len(docs))
+
+if __name__ == "__main__":
+    unittest.main()
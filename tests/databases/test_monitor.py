@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, absolute_import
+
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import unittest
+from marklogic.models.database.backup import DatabaseBackup, DatabaseRestore
+from marklogic.models.database.monitor import JobMonitor
+from marklogic.models.utilities.exceptions import JobTimeout
+from tests.fakes import RecordingConnection, RecordingResponse
+
+
+def status(state, copied):
+    forests = [{'forest-name': "{0}-1".format(state), 'status': state,
+                'bytes': copied, 'total-bytes': 100},
+               {'forest-name': "{0}-2".format(state), 'status': state,
+                'bytes': copied, 'total-bytes': 100}]
+    return {'status': state, 'forest': forests}
+
+
+class StatusConnection(RecordingConnection):
+    def __init__(self, statuses):
+        RecordingConnection.__init__(self)
+        # Job id -> the statuses to answer, in order; the last one repeats
+        self.statuses = statuses
+        self.polls = []
+
+    def respond(self, method, uri, json=None, **kwargs):
+        job_id = json['job-id']
+        self.polls.append(job_id)
+        answers = self.statuses[job_id]
+        body = answers.pop(0) if len(answers) > 1 else answers[0]
+        return RecordingResponse(body=body)
+
+
+class TestJobMonitor(unittest.TestCase):
+
+    def test_wait(self):
+        conn = StatusConnection({'b1': [status('in-progress', 0),
+                                        status('in-progress', 0),
+                                        status('in-progress', 50),
+                                        status('completed', 100)]})
+        backup = DatabaseBackup('b1', 'Documents')
+
+        final = backup.wait(conn, interval=0.01)
+
+        self.assertTrue(final.done)
+        self.assertTrue(final.succeeded)
+        self.assertEqual(200.0, final.bytes)
+        self.assertEqual(100.0, final.percent)
+        self.assertEqual(4, len(conn.polls))
+
+    def test_watch_events(self):
+        conn = StatusConnection({'r1': [status('in-progress', 0),
+                                        status('in-progress', 0),
+                                        status('in-progress', 25),
+                                        status('failed', 25)]})
+        restore = DatabaseRestore('r1', 'Documents')
+
+        events = list(restore.watch(conn, interval=0.01))
+
+        self.assertEqual(['in-progress', 'in-progress', 'failed'],
+                         [event.state for event in events])
+        self.assertEqual(25.0, events[1].percent)
+        self.assertIsNotNone(events[1].eta)
+        self.assertEqual('in-progress', events[1].forests[0]['state'])
+        self.assertEqual(25.0, events[1].forests[0]['bytes'])
+        self.assertFalse(events[-1].succeeded)
+
+    def test_many_jobs(self):
+        statuses = {}
+        jobs = []
+        for index in range(0, 20):
+            job_id = "b{0}".format(index)
+            statuses[job_id] = [status('in-progress', 0)] * (index % 4) \
+              + [status('completed', 100)]
+            jobs.append(DatabaseBackup(job_id, "db{0}".format(index)))
+        conn = StatusConnection(statuses)
+
+        finals = JobMonitor(jobs, interval=0.01).wait(conn)
+
+        self.assertEqual([job.job_id for job in jobs],
+                         [final.job.job_id for final in finals])
+        self.assertTrue(all(final.succeeded for final in finals))
+
+    def test_add_while_watching(self):
+        conn = StatusConnection({'b1': [status('completed', 100)],
+                                 'b2': [status('in-progress', 0),
+                                        status('completed', 100)]})
+        monitor = JobMonitor([DatabaseBackup('b1', 'db1')], interval=0.01)
+
+        finished = []
+        for progress in monitor.watch(conn):
+            if progress.done:
+                finished.append(progress.job.job_id)
+                if progress.job.job_id == 'b1':
+                    monitor.add(DatabaseBackup('b2', 'db2'))
+
+        self.assertEqual(['b1', 'b2'], finished)
+        self.assertEqual(['b1', 'b2', 'b2'], conn.polls)
+
+    def test_errors(self):
+        conn = StatusConnection({'b1': [status('completed', 100)]})
+        jobs = [DatabaseBackup('gone', 'db1'), DatabaseBackup('b1', 'db2')]
+
+        with self.assertRaises(KeyError):
+            JobMonitor(jobs, interval=0.01).wait(conn)
+
+        finals = JobMonitor(jobs, interval=0.01, raise_errors=False).wait(conn)
+        self.assertTrue(finals[0].done)
+        self.assertFalse(finals[0].succeeded)
+        self.assertEqual('error', finals[0].state)
+        self.assertIsInstance(finals[0].error, KeyError)
+        self.assertTrue(finals[1].succeeded)
+
+    def test_timeout(self):
+        conn = StatusConnection({'b1': [status('in-progress', 0)]})
+        backup = DatabaseBackup('b1', 'Documents')
+
+        with self.assertRaises(JobTimeout):
+            backup.wait(conn, interval=0.01, max_interval=0.02, timeout=0.2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, absolute_import
+
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import unittest
+from marklogic.models.database.orchestrator import BackupOrchestrator
+from tests.fakes import RecordingConnection, RecordingResponse
+
+HOSTS = {
+    'db1': ['h1'], 'db2': ['h1'], 'db3': ['h2'],
+    'db4': ['h2'], 'db5': ['h1', 'h2'], 'bad': ['h3'], 'broken': ['h1']
+}
+
+
+class BackupConnection(RecordingConnection):
+    """
+    Each backup completes on its second status poll.
+    """
+    def __init__(self):
+        RecordingConnection.__init__(self)
+        self.operations = []
+        self.polls = {}
+        self.running = set()
+        self.peaks = {}
+
+    def respond(self, method, uri, json=None, **kwargs):
+        database = uri.split("/")[-1]
+        operation = json['operation']
+        self.operations.append((operation, database))
+        if operation == 'backup-validate':
+            return RecordingResponse(body={'valid': database != 'bad'})
+        if operation == 'backup-database':
+            self.running.add(database)
+            for host in set(h for name in self.running for h in HOSTS[name]):
+                count = len([name for name in self.running if host in HOSTS[name]])
+                self.peaks[host] = max(self.peaks.get(host, 0), count)
+            return RecordingResponse(body={'job-id': "job-" + database})
+        if operation == 'backup-status' and database == 'broken':
+            return RecordingResponse(500, {})
+        if operation == 'backup-status':
+            self.polls[database] = self.polls.get(database, 0) + 1
+            if self.polls[database] < 2:
+                return RecordingResponse(body={'status': 'in-progress'})
+            self.running.discard(database)
+            return RecordingResponse(body={'status': 'completed'})
+        return RecordingResponse(body={})
+
+
+class TestBackupOrchestrator(unittest.TestCase):
+
+    def test_limits(self):
+        conn = BackupConnection()
+        orchestrator = BackupOrchestrator(['db1', 'db2', 'db3', 'db4', 'db5'], "/backups",
+                                          per_host=1, per_directory=2, interval=0.01,
+                                          hosts=HOSTS, keep=3)
+        runs = orchestrator.run(conn)
+
+        self.assertEqual(['completed'] * 5, [run.state for run in runs])
+        self.assertEqual({'h1': 1, 'h2': 1}, conn.peaks)
+        started = [database for operation, database in conn.operations
+                   if operation == 'backup-database']
+        self.assertEqual(['db1', 'db3', 'db2', 'db4', 'db5'], started)
+        purged = [database for operation, database in conn.operations
+                  if operation == 'backup-purge']
+        self.assertEqual(sorted(started), sorted(purged))
+
+    def test_directories(self):
+        conn = BackupConnection()
+        orchestrator = BackupOrchestrator(['db1', 'db3'], {'db1': "/a", 'db3': "/a"},
+                                          per_host=5, per_directory=1, interval=0.01,
+                                          hosts=HOSTS)
+        orchestrator.run(conn)
+
+        self.assertEqual(1, conn.peaks['h1'])
+        self.assertEqual(['backup-database', 'backup-status', 'backup-status',
+                          'backup-database', 'backup-status', 'backup-status'],
+                         [operation for operation, database in conn.operations])
+
+    def test_validate(self):
+        conn = BackupConnection()
+        orchestrator = BackupOrchestrator(['bad', 'db1'], "/backups", validate=True,
+                                          interval=0.01, hosts=HOSTS)
+        runs = orchestrator.run(conn)
+
+        self.assertEqual(['invalid', 'completed'], [run.state for run in runs])
+        self.assertNotIn(('backup-database', 'bad'), conn.operations)
+        self.assertEqual(('backup-validate', 'db1'), conn.operations[1])
+
+    def test_status_error(self):
+        conn = BackupConnection()
+        orchestrator = BackupOrchestrator(['broken', 'db1'], "/backups", interval=0.01,
+                                          hosts=HOSTS)
+        runs = orchestrator.run(conn)
+
+        self.assertEqual(['error', 'completed'], [run.state for run in runs])
+        self.assertIsNotNone(runs[0].error)
+        self.assertIsNotNone(runs[0].finished)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, absolute_import
+
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import unittest
+from marklogic.models import Database, ForestMetrics, RebalanceAdvisor
+from tests.fakes import RecordingConnection
+
+
+def metrics(documents):
+    result = ForestMetrics()
+    for index, count in enumerate(documents):
+        counts = {'count-properties': {}}
+        if count is not None:
+            counts['count-properties']['document-count'] = {'value': count}
+        result.add("f{0}".format(index + 1), {}, counts)
+    return result
+
+def database(enabled=True, throttle=5, policy='bucket'):
+    db = Database("tenant")
+    db.set_rebalancer_enable(enabled)
+    db.set_rebalancer_throttle(throttle)
+    db.set_assignment_policy(policy)
+    return db.mark_clean()
+
+
+class TestRebalanceAdvisor(unittest.TestCase):
+
+    def test_balanced(self):
+        advisor = RebalanceAdvisor(database())
+        advisor.samples.append((0.0, metrics([100, 110, 95])))
+
+        advice = advisor.recommend()
+        self.assertTrue(advice.balanced)
+        self.assertEqual({}, advice.changes)
+
+    def test_estimate(self):
+        advisor = RebalanceAdvisor(database())
+        advisor.samples.append((0.0, metrics([400, 100, 100])))
+        # 30 moved from f1 to f2 and f3, and 30 new documents arrived
+        advisor.samples.append((10.0, metrics([370, 130, 130])))
+
+        advice = advisor.recommend()
+        self.assertFalse(advice.balanced)
+        self.assertEqual(3.0, advice.movement_rate)
+        self.assertEqual(160.0, advice.to_move)
+        self.assertAlmostEqual(160.0 / 3.0, advice.estimated_seconds)
+        self.assertEqual({}, advice.changes)
+
+    def test_disabled(self):
+        advisor = RebalanceAdvisor(database(enabled=False, policy='legacy'))
+        advisor.samples.append((0.0, metrics([400, 100, 100])))
+
+        advice = advisor.recommend()
+        self.assertEqual({'rebalancer-enable': True, 'assignment-policy': 'bucket'},
+                         advice.changes)
+        self.assertIsNone(advice.movement_rate)
+
+    def test_throttle(self):
+        advisor = RebalanceAdvisor(database(throttle=2), target=3600)
+        advisor.samples.append((0.0, metrics([400000, 100, 100])))
+        advisor.samples.append((60.0, metrics([399990, 105, 105])))
+
+        advice = advisor.recommend()
+        self.assertEqual({'rebalancer-throttle': 5}, advice.changes)
+
+        conn = RecordingConnection(204)
+        advisor.apply(conn, advice)
+        self.assertEqual([{'rebalancer-throttle': 5}], conn.sent('PUT'))
+
+    def test_range(self):
+        advisor = RebalanceAdvisor(database(enabled=False, policy='range'))
+        advisor.samples.append((0.0, metrics([400, 100, 100])))
+
+        advice = advisor.recommend()
+        self.assertFalse(advice.balanced)
+        self.assertEqual({}, advice.changes)
+
+    def test_missing_metric(self):
+        advisor = RebalanceAdvisor(database())
+        advisor.samples.append((0.0, metrics([400, 100, None])))
+        advisor.samples.append((10.0, metrics([370, 130, None])))
+
+        # The forest without a count is left out, not counted as empty
+        advice = advisor.recommend()
+        self.assertEqual(3.0, advice.movement_rate)
+        self.assertEqual(120.0, advice.to_move)
+
+        advisor.samples.append((20.0, metrics([100, None, 100])))
+        self.assertTrue(advisor.recommend().balanced)
+
+        advisor.samples.append((30.0, metrics([None, None])))
+        with self.assertRaises(ValueError):
+            advisor.recommend()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, absolute_import
+
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from marklogic.models import Connection, Database
+from requests.auth import HTTPBasicAuth
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+except ImportError:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+try:
+    from urllib.parse import urlparse, parse_qs
+except ImportError:
+    from urlparse import urlparse, parse_qs
+
+
+class StoreHandler(BaseHTTPRequestHandler):
+    documents = {}
+    puts = 0
+
+    def log_message(self, *args):
+        pass
+
+    def _uris(self):
+        return parse_qs(urlparse(self.path).query).get('uri', [])
+
+    def _reply(self, status):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_PUT(self):
+        length = int(self.headers.get('Content-Length'))
+        StoreHandler.documents[self._uris()[0]] = self.rfile.read(length)
+        StoreHandler.puts += 1
+        self._reply(201)
+
+    def do_HEAD(self):
+        self._reply(200 if self._uris()[0] in StoreHandler.documents else 404)
+
+    def do_DELETE(self):
+        for uri in self._uris():
+            StoreHandler.documents.pop(uri, None)
+        self._reply(204)
+
+
+class TestSyncDirectory(unittest.TestCase):
+
+    def setUp(self):
+        StoreHandler.documents = {}
+        StoreHandler.puts = 0
+        self.server = HTTPServer(("127.0.0.1", 0), StoreHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.conn = Connection("127.0.0.1", HTTPBasicAuth("admin", "admin"),
+                               port=self.server.server_port)
+        self.db = Database("sync-test")
+        self.directory = tempfile.mkdtemp()
+        self.source = os.path.join(self.directory, "data")
+        os.mkdir(self.source)
+        self.manifest = os.path.join(self.directory, "manifest")
+        for i in range(0, 5):
+            self._write("doc{0}.json".format(i), '{{"n": {0}}}'.format(i))
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+    def _write(self, name, content):
+        with open(os.path.join(self.source, name), "w") as out:
+            out.write(content)
+
+    def _sync(self, **kwargs):
+        return self.db.sync_directory(self.conn, self.source, self.manifest,
+                                      prefix="", workers=2, **kwargs)
+
+    def test_sync(self):
+        summary = self._sync()
+        self.assertEqual(5, summary.loaded)
+        self.assertEqual(0, summary.skipped)
+
+        self._write("doc0.json", '{"n": "changed"}')
+        self._write("doc5.json", '{"n": 5}')
+        os.utime(os.path.join(self.source, "doc1.json"), (0, 0))
+        os.remove(os.path.join(self.source, "doc2.json"))
+
+        summary = self._sync(delete=True)
+        self.assertEqual(2, summary.loaded)
+        self.assertEqual(3, summary.skipped)
+        self.assertEqual(1, summary.deleted)
+        self.assertEqual(7, StoreHandler.puts)
+        self.assertEqual(5, len(StoreHandler.documents))
+        self.assertFalse(self.db.document_exists(self.conn,
+                                                 os.path.join(self.source, "doc2.json")))
+
+    def test_delete_only_removed_files(self):
+        other = os.path.join(self.directory, "other")
+        os.mkdir(other)
+        with open(os.path.join(other, "shared.json"), "w") as out:
+            out.write("{}")
+        self.db.sync_directory(self.conn, other, self.manifest, prefix="", workers=2)
+        self._sync()
+        os.remove(os.path.join(self.source, "doc2.json"))
+
+        # Files outside this tree, or not selected this time, stay
+        summary = self._sync(delete=True, include=["doc0.json"])
+        self.assertEqual(0, summary.deleted)
+        summary = self._sync(delete=True, exclude=["doc2.json"])
+        self.assertEqual(0, summary.deleted)
+
+        summary = self._sync(delete=True)
+        self.assertEqual(1, summary.deleted)
+        self.assertEqual(5, len(StoreHandler.documents))
+        self.assertIn(os.path.join(other, "shared.json"), StoreHandler.documents)
+
+    def test_no_delete_after_walk_errors(self):
+        self._sync()
+        os.rename(self.source, self.source + "-moved")
+
+        summary = self._sync(delete=True)
+        self.assertEqual(0, summary.deleted)
+        self.assertEqual(5, len(StoreHandler.documents))
+
+    def test_verify(self):
+        self._sync()
+        StoreHandler.documents.pop(os.path.join(self.source, "doc3.json"))
+
+        summary = self._sync()
+        self.assertEqual(0, summary.loaded)
+
+        summary = self._sync(verify=True)
+        self.assertEqual(1, summary.loaded)
+        self.assertEqual(4, summary.skipped)
+        self.assertEqual(5, len(StoreHandler.documents))
+
+if __name__ == "__main__":
+    unittest.main()
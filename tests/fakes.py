@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, absolute_import
+
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Connections that record requests instead of sending them, for tests
+that don't need a server.
+"""
+
+import json
+import threading
+
+
+class RecordingResponse(object):
+    def __init__(self, status_code=200, body=None, headers=None):
+        self.status_code = status_code
+        self.text = '' if body is None else json.dumps(body)
+        self.headers = headers or {}
+
+
+class RecordingConnection(object):
+    """
+    Every request is recorded in `requests` as a (method, uri, kwargs)
+    tuple and answered by `respond`, which by default returns a
+    response with `status_code` and `body`. Subclasses override
+    `respond` to answer differently. A file sent as the request body
+    is read when it is recorded.
+    """
+    host = "localhost"
+    port = 8000
+    management_port = 8002
+
+    def __init__(self, status_code=200, body=None):
+        self.status_code = status_code
+        self.body = body
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def respond(self, method, uri, **kwargs):
+        return RecordingResponse(self.status_code, self.body)
+
+    def request(self, method, uri, **kwargs):
+        if hasattr(kwargs.get('data'), 'read'):
+            kwargs['data'] = kwargs['data'].read()
+        with self.lock:
+            self.requests.append((method, uri, kwargs))
+        return self.respond(method, uri, **kwargs)
+
+    def uris(self, method):
+        """
+        The URIs of the requests with the given method, in order.
+        """
+        return [uri for m, uri, kwargs in self.requests if m == method]
+
+    def sent(self, method, key='json'):
+        """
+        The `key` argument (the JSON body by default) of the requests
+        with the given method, in order.
+        """
+        return [kwargs.get(key) for m, uri, kwargs in self.requests if m == method]
+
+    def get(self, uri, **kwargs):
+        return self.request('GET', uri, **kwargs)
+
+    def head(self, uri, **kwargs):
+        return self.request('HEAD', uri, **kwargs)
+
+    def post(self, uri, **kwargs):
+        return self.request('POST', uri, **kwargs)
+
+    def put(self, uri, **kwargs):
+        return self.request('PUT', uri, **kwargs)
+
+    def delete(self, uri, **kwargs):
+        return self.request('DELETE', uri, **kwargs)
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, absolute_import
+
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import unittest
+from marklogic.models import Database, ForestMetrics
+from marklogic.models.utilities.exceptions import UnexpectedManagementAPIResponse
+from tests.fakes import RecordingConnection, RecordingResponse
+
+
+class ViewConnection(RecordingConnection):
+    """
+    Answers the status and counts views of the forests in `documents`.
+    """
+    def __init__(self, documents):
+        RecordingConnection.__init__(self)
+        self.documents = documents
+
+    def respond(self, method, uri, **kwargs):
+        name, view = uri.split("/")[-1].split("?view=")
+        if name not in self.documents:
+            return RecordingResponse(404, {})
+        if view == 'status':
+            return RecordingResponse(200, {'forest-status': {
+                'name': name,
+                'status-properties': {
+                    'state': {'units': 'enum', 'value': 'open'},
+                    'rate-properties': {
+                        'merge-read-rate': {'units': 'MB/sec', 'value': 2.5},
+                        'merge-write-rate': {'units': 'MB/sec', 'value': 1.5}}}}})
+        return RecordingResponse(200, {'forest-counts': {
+            'name': name,
+            'count-properties': {
+                'document-count': {'units': 'quantity', 'value': self.documents[name]},
+                'stands-count': {'units': 'quantity', 'value': 2},
+                'stands-counts': {'stand': [
+                    {'disk-size': {'units': 'MB', 'value': 10}, 'memory-size': 1},
+                    {'disk-size': {'units': 'MB', 'value': 5}, 'memory-size': 2}]}}}})
+
+
+class TestForestMetrics(unittest.TestCase):
+
+    def test_forest_metrics(self):
+        conn = ViewConnection({'f1': 100, 'f2': 100, 'f3': 400})
+        db = Database("tenant")
+        db.set_forest_names(['f1', 'f2', 'f3'])
+
+        metrics = db.forest_metrics(conn, workers=4)
+
+        self.assertEqual(6, len(conn.uris('GET')))
+        self.assertEqual(['f1', 'f2', 'f3'], metrics.names)
+        self.assertEqual([100.0, 100.0, 400.0], list(metrics.column('documents')))
+        self.assertEqual({'documents': 400.0, 'stands': 2.0, 'disk_size': 15.0,
+                          'memory_size': 3.0, 'merge_read_rate': 2.5,
+                          'merge_write_rate': 1.5, 'reindex_rate': None},
+                         metrics.row('f3'))
+
+        self.assertEqual(600.0, metrics.total('documents'))
+        self.assertEqual(2.0, metrics.skew('documents'))
+        self.assertEqual(1.5, metrics.imbalance('documents'))
+        self.assertEqual(0.0, metrics.imbalance('disk_size'))
+        self.assertEqual(45.0, metrics.summary()['disk_size']['total'])
+        self.assertEqual(0, metrics.summary()['reindex_rate']['reported'])
+
+    def test_paths(self):
+        metrics = ForestMetrics()
+        # A document count under a stand is not the forest's
+        metrics.add('f1', {'status-properties': {'merge-read-rate': {'value': 9}}},
+                    {'count-properties': {'stands-counts': {'stand': [
+                        {'document-count': {'value': 7}, 'disk-size': 4}]}}})
+
+        self.assertEqual({'documents': None, 'stands': 1.0, 'disk_size': 4.0,
+                          'memory_size': None, 'merge_read_rate': None,
+                          'merge_write_rate': None, 'reindex_rate': None},
+                         metrics.row('f1'))
+
+    def test_missing_metric(self):
+        metrics = ForestMetrics()
+        for name, count in [('f1', 100), ('f2', None), ('f3', 200)]:
+            counts = {'count-properties': {}}
+            if count is not None:
+                counts['count-properties']['document-count'] = {'value': count}
+            metrics.add(name, {}, counts)
+
+        self.assertEqual([100.0, 200.0], metrics.values('documents'))
+        self.assertEqual(2, metrics.reported('documents'))
+        self.assertEqual(150.0, metrics.mean('documents'))
+        self.assertAlmostEqual(200.0 / 150.0, metrics.skew('documents'))
+        self.assertAlmostEqual(100.0 / 150.0, metrics.imbalance('documents'))
+        self.assertEqual(100.0, metrics.summary()['documents']['min'])
+
+    def test_missing_forest(self):
+        conn = ViewConnection({'f1': 100})
+        with self.assertRaises(UnexpectedManagementAPIResponse):
+            ForestMetrics.capture(conn, ['f1', 'f2'])
+
+    def test_empty(self):
+        metrics = ForestMetrics()
+        self.assertEqual(0, len(metrics))
+        self.assertEqual(1.0, metrics.skew('documents'))
+        self.assertEqual(0.0, metrics.summary()['stands']['max'])
+
+if __name__ == "__main__":
+    unittest.main()
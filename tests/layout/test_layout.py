@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, absolute_import
+
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import unittest
+from marklogic.models import ForestLayout
+from tests.fakes import RecordingConnection
+
+
+class TestForestLayout(unittest.TestCase):
+
+    def test_balanced(self):
+        layout = ForestLayout("tenant", ["h1", "h2", "h3"], forests_per_host=2,
+                              data_directories={"h1": ["/a", "/b"]})
+
+        forests = layout.forests()
+        self.assertEqual(["h1", "h2", "h3", "h1", "h2", "h3"],
+                         [forest.host() for forest in forests])
+        self.assertEqual("tenant_forest_1", forests[0].forest_name())
+        self.assertEqual(["/a", None, None, "/b", None, None],
+                         [forest.data_directory() for forest in forests])
+        for names in layout.placement().values():
+            self.assertEqual(2, len(names))
+
+    def test_replicas_balanced(self):
+        layout = ForestLayout("tenant", ["h1", "h2", "h3", "h4"],
+                              forests_per_host=3, replicas=1)
+
+        for forest in layout.forests():
+            replicas = forest.replicas()
+            self.assertEqual(1, len(replicas))
+            self.assertNotEqual(forest.host(), replicas[0]['host'])
+        for names in layout.placement().values():
+            self.assertEqual(6, len(names))
+
+    def test_replicas_in_other_zones(self):
+        zones = {"h1": "east", "h2": "east", "h3": "west", "h4": "west"}
+        layout = ForestLayout("tenant", ["h1", "h2", "h3", "h4"],
+                              forests_per_host=2, replicas=1, zones=zones)
+
+        for forest in layout.forests():
+            replica = forest.replicas()[0]
+            self.assertNotEqual(zones[forest.host()], zones[replica['host']])
+        for names in layout.placement().values():
+            self.assertEqual(4, len(names))
+
+    def test_too_many_replicas(self):
+        with self.assertRaises(ValueError):
+            ForestLayout("tenant", ["h1", "h2"], replicas=2)
+
+    def test_provision(self):
+        conn = RecordingConnection(201)
+        layout = ForestLayout("tenant", ["h1", "h2"], forests_per_host=2, replicas=1)
+        layout.provision(conn, workers=4)
+
+        forests = [payload for payload in conn.sent('POST') if 'forest-name' in payload]
+        self.assertEqual(4, len(forests))
+        for payload in forests:
+            self.assertEqual(1, len(payload['forest-replica']))
+
+        database = conn.sent('POST')[-1]
+        self.assertEqual("tenant", database['database-name'])
+        self.assertEqual(["tenant_forest_1", "tenant_forest_2",
+                          "tenant_forest_3", "tenant_forest_4"],
+                         database['forest'])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+# Making the tests.plan tests package
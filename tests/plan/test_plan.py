@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, absolute_import
+
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import json
+import threading
+import unittest
+from marklogic.models import Connection
+from marklogic.models.plan import plan, apply
+from requests.auth import HTTPBasicAuth
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+except ImportError:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+try:
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from SocketServer import ThreadingMixIn
+
+CURRENT = {
+    '/manage/v2/roles/app-reader/properties': {'role-name': 'app-reader',
+                                               'description': 'old'},
+    '/manage/v2/databases/App/properties': {'database-name': 'App', 'forest': ['App-1'],
+                                            'enabled': True, 'language': 'en'},
+    '/manage/v2/servers/app/properties?group-id=Default': {
+        'server-name': 'app', 'group-name': 'Default', 'root': '/', 'port': 8100,
+        'server-type': 'http', 'content-database': 'App'},
+}
+
+DESIRED = {
+    'roles': [{'role-name': 'app-reader', 'description': 'new'},
+              {'role-name': 'app-writer', 'role': ['app-reader']}],
+    'users': [{'user-name': 'app-user', 'role': ['app-writer'], 'password': 'secret'}],
+    'databases': [{'database-name': 'App', 'forest': ['App-1'], 'enabled': True}],
+    'servers': [{'server-name': 'app', 'group-name': 'Default', 'root': '/', 'port': 8100,
+                 'server-type': 'http', 'content-database': 'App'}],
+}
+
+
+class ManagementHandler(BaseHTTPRequestHandler):
+    changes = []
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body=b""):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path in CURRENT:
+            self._reply(200, json.dumps(CURRENT[self.path]).encode('utf-8'))
+        else:
+            self._reply(404)
+
+    def _change(self, status):
+        length = int(self.headers.get('Content-Length'))
+        body = json.loads(self.rfile.read(length).decode('utf-8'))
+        with ManagementHandler.lock:
+            ManagementHandler.changes.append((self.command, self.path.split("?")[0], body))
+        self._reply(status)
+
+    def do_POST(self):
+        self._change(201)
+
+    def do_PUT(self):
+        self._change(204)
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class TestPlan(unittest.TestCase):
+
+    def setUp(self):
+        ManagementHandler.changes = []
+        self.server = ThreadingServer(("127.0.0.1", 0), ManagementHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.conn = Connection("127.0.0.1", HTTPBasicAuth("admin", "admin"),
+                               management_port=self.server.server_port)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_plan(self):
+        result = plan(self.conn, DESIRED)
+
+        self.assertEqual(sorted([('databases', 'App'), ('servers', 'Default|app')]),
+                         sorted(result.unchanged))
+        self.assertEqual(["0: create role app-writer",
+                          "1: update role app-reader",
+                          "1: update role app-writer",
+                          "1: create user app-user"],
+                         result.describe())
+        update = [op for op in result.operations if op.name == 'app-reader'][0]
+        self.assertEqual({'description': 'new'}, update.delta)
+
+    def test_apply(self):
+        apply(plan(self.conn, DESIRED), workers=4)
+        changes = ManagementHandler.changes
+
+        self.assertEqual(('POST', '/manage/v2/roles', {'role-name': 'app-writer'}), changes[0])
+        self.assertIn(('PUT', '/manage/v2/roles/app-reader/properties',
+                       {'role-name': 'app-reader', 'description': 'new'}), changes)
+        self.assertIn('/manage/v2/users', [change[1] for change in changes[1:]])
+        self.assertEqual(4, len(changes))
+
+    def test_minimal_database_update(self):
+        desired = {'databases': [{'database-name': 'App', 'enabled': False}]}
+        apply(plan(self.conn, desired))
+        self.assertEqual([('PUT', '/manage/v2/databases/App/properties', {'enabled': False})],
+                         ManagementHandler.changes)
+
+if __name__ == "__main__":
+    unittest.main()
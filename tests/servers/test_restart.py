@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, absolute_import
+
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import json
+import threading
+import unittest
+from marklogic.models import Connection
+from marklogic.models.utilities.exceptions import RestartTimeout
+from marklogic.models.utilities.restart import RestartWaiter
+from requests.auth import HTTPBasicAuth
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+except ImportError:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+BEFORE = "2015-06-01T10:00:00.000000-04:00"
+AFTER = "2015-06-01T10:05:00.000000-04:00"
+
+
+class ClusterHandler(BaseHTTPRequestHandler):
+    # Polls each host answers with the old startup time before restarting
+    restarts = {}
+    polls = {}
+    # Reads of the host list that fail, as while Manage is restarting
+    manage_failures = 0
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        host = self.server.server_address[0]
+        if self.path.startswith("/manage/v2/hosts") and ClusterHandler.manage_failures > 0:
+            ClusterHandler.manage_failures -= 1
+            status, body = 503, ""
+        elif self.path.startswith("/manage/v2/hosts"):
+            items = [{'idref': '111', 'nameref': '127.0.0.2'},
+                     {'idref': '222', 'nameref': '127.0.0.3'}]
+            status, body = 200, json.dumps({'host-default-list': {'list-items': {
+                'list-count': {'value': 2}, 'list-item': items}}})
+        else:
+            polls = ClusterHandler.polls.get(host, 0) + 1
+            ClusterHandler.polls[host] = polls
+            if polls == 1:
+                status, body = 503, ""
+            elif polls <= ClusterHandler.restarts[host]:
+                status, body = 200, BEFORE
+            else:
+                status, body = 200, AFTER
+        body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class RestartResponse(object):
+    status_code = 202
+    text = json.dumps({'restart': {'last-startup': [
+        {'host-id': '111', 'value': BEFORE},
+        {'host-id': '222', 'value': BEFORE}]}})
+
+
+class EmptyRestartResponse(object):
+    status_code = 202
+    text = json.dumps({'restart': {'last-startup': []}})
+
+
+class TestRestartWaiter(unittest.TestCase):
+
+    def setUp(self):
+        ClusterHandler.polls = {}
+        ClusterHandler.manage_failures = 0
+        self.servers = [HTTPServer(("127.0.0.2", 0), ClusterHandler)]
+        port = self.servers[0].server_port
+        self.servers.append(HTTPServer(("127.0.0.3", port), ClusterHandler))
+        self.servers.append(HTTPServer(("127.0.0.2", 0), ClusterHandler))
+        for server in self.servers:
+            thread = threading.Thread(target=server.serve_forever)
+            thread.daemon = True
+            thread.start()
+        self.conn = Connection("127.0.0.2", HTTPBasicAuth("admin", "admin"),
+                               management_port=self.servers[2].server_port)
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+    def _waiter(self, timeout):
+        return RestartWaiter(timeout=timeout, interval=0.01, max_interval=0.05,
+                             admin_port=self.servers[0].server_port)
+
+    def test_all_hosts(self):
+        ClusterHandler.restarts = {'127.0.0.2': 2, '127.0.0.3': 5}
+
+        latencies = self._waiter(10).wait(self.conn, RestartResponse())
+
+        self.assertEqual(['127.0.0.2', '127.0.0.3'], sorted(latencies))
+        self.assertEqual(3, ClusterHandler.polls['127.0.0.2'])
+        self.assertEqual(6, ClusterHandler.polls['127.0.0.3'])
+        self.assertTrue(latencies['127.0.0.3'] >= latencies['127.0.0.2'])
+
+    def test_deadline(self):
+        ClusterHandler.restarts = {'127.0.0.2': 1, '127.0.0.3': 1000000}
+
+        with self.assertRaises(RestartTimeout):
+            self._waiter(0.5).wait(self.conn, RestartResponse())
+        self.assertEqual(2, ClusterHandler.polls['127.0.0.2'])
+
+    def test_names_retried(self):
+        ClusterHandler.restarts = {'127.0.0.2': 1, '127.0.0.3': 1}
+        ClusterHandler.manage_failures = 3
+
+        latencies = self._waiter(10).wait(self.conn, RestartResponse())
+
+        self.assertEqual(['127.0.0.2', '127.0.0.3'], sorted(latencies))
+        self.assertEqual(0, ClusterHandler.manage_failures)
+
+    def test_names_deadline(self):
+        ClusterHandler.manage_failures = 1000000
+
+        with self.assertRaises(RestartTimeout):
+            self._waiter(0.3).wait(self.conn, RestartResponse())
+        self.assertEqual({}, ClusterHandler.polls)
+
+    def test_no_last_startup(self):
+        ClusterHandler.restarts = {'127.0.0.2': 3}
+
+        latencies = self._waiter(10).wait(self.conn, EmptyRestartResponse())
+
+        # The first startup time read is the one before the restart
+        self.assertEqual(['127.0.0.2'], list(latencies))
+        self.assertEqual(4, ClusterHandler.polls['127.0.0.2'])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, absolute_import
+
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import json
+import threading
+import unittest
+from marklogic.models import Connection, ClusterSnapshot
+from requests.auth import HTTPBasicAuth
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+except ImportError:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+try:
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from SocketServer import ThreadingMixIn
+
+
+def default_list(kind, items):
+    return {kind + '-default-list': {'list-items': {'list-count': {'value': len(items)},
+                                                    'list-item': items}}}
+
+RESOURCES = {
+    '/manage/v2/databases': default_list('database', [{'nameref': 'App'}, {'nameref': 'Modules'},
+                                                      {'nameref': 'Security'}, {'nameref': 'Other'}]),
+    '/manage/v2/databases/App/properties': {'database-name': 'App', 'forest': ['App-1'],
+                                            'security-database': 'Security'},
+    '/manage/v2/databases/Modules/properties': {'database-name': 'Modules'},
+    '/manage/v2/databases/Security/properties': {'database-name': 'Security'},
+    '/manage/v2/databases/Other/properties': {'database-name': 'Other'},
+    '/manage/v2/servers': default_list('server', [{'groupnameref': 'Default', 'nameref': 'app'}]),
+    '/manage/v2/servers/app/properties?group-id=Default': {
+        'server-name': 'app', 'group-name': 'Default', 'root': '/', 'port': 8100,
+        'server-type': 'http', 'content-database': 'App', 'modules-database': 'Modules',
+        'default-user': 'app-user', 'privilege': 'http://example.com/app'},
+    '/manage/v2/users': default_list('user', [{'nameref': 'app-user'}, {'nameref': 'admin'}]),
+    '/manage/v2/users/app-user/properties': {'user-name': 'app-user', 'role': ['app-reader']},
+    '/manage/v2/users/admin/properties': {'user-name': 'admin', 'role': ['admin']},
+    '/manage/v2/roles': default_list('role', [{'nameref': 'app-reader'}, {'nameref': 'base'},
+                                              {'nameref': 'admin'}]),
+    '/manage/v2/roles/app-reader/properties': {'role-name': 'app-reader', 'role': ['base']},
+    '/manage/v2/roles/base/properties': {'role-name': 'base'},
+    '/manage/v2/roles/admin/properties': {'role-name': 'admin'},
+    '/manage/v2/privileges': default_list('privilege', [{'kind': 'execute', 'nameref': 'app-priv',
+                                                         'action': 'http://example.com/app'}]),
+    '/manage/v2/privileges/app-priv/properties?kind=execute': {
+        'privilege-name': 'app-priv', 'action': 'http://example.com/app', 'kind': 'execute',
+        'role': ['app-reader']},
+    '/manage/v2/forests': default_list('forest', [{'nameref': 'App-1'}]),
+    '/manage/v2/forests/App-1/properties': {'availability': 'online'},
+    '/manage/v2/forests/App-1?view=config': {'forest-config': {
+        'name': 'App-1', 'config-properties': {},
+        'relations': {'relation-group': [{'typeref': 'hosts',
+                                          'relation': [{'nameref': 'host-1'}]}]}}},
+    '/manage/v2/hosts': default_list('host', [{'nameref': 'host-1'}]),
+    '/manage/v2/hosts/host-1/properties': {'host-name': 'host-1', 'group': 'Default'},
+}
+
+
+class ManagementHandler(BaseHTTPRequestHandler):
+    requests = 0
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        ManagementHandler.requests += 1
+        if self.path in RESOURCES:
+            status, body = 200, json.dumps(RESOURCES[self.path]).encode('utf-8')
+        else:
+            status, body = 404, b""
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.send_response(200 if self.path in RESOURCES else 404)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class TestClusterSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        ManagementHandler.requests = 0
+        self.server = ThreadingServer(("127.0.0.1", 0), ManagementHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.conn = Connection("127.0.0.1", HTTPBasicAuth("admin", "admin"),
+                               management_port=self.server.server_port)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_capture_and_closure(self):
+        snapshot = ClusterSnapshot.capture(self.conn, workers=4)
+
+        self.assertEqual(4, len(snapshot.databases))
+        self.assertIn("Default|app", snapshot.servers)
+        self.assertIn("execute|app-priv", snapshot.privileges)
+        self.assertEqual("host-1", snapshot.forests["App-1"].host())
+        # One list per kind, one read per resource (two for the forest)
+        self.assertEqual(7 + 4 + 1 + 2 + 3 + 1 + 2 + 1, ManagementHandler.requests)
+
+        closure = snapshot.closure(servers=["app"])
+        self.assertEqual(sorted(["App", "Modules", "Security"]), sorted(closure.databases))
+        self.assertEqual(["app-user"], list(closure.users))
+        self.assertEqual(sorted(["app-reader", "base"]), sorted(closure.roles))
+        self.assertEqual(["execute|app-priv"], list(closure.privileges))
+        self.assertEqual(["App-1"], list(closure.forests))
+        self.assertEqual(["host-1"], list(closure.hosts))
+
+        config = closure.marshal()
+        self.assertEqual(3, len(config['databases']))
+        self.assertEqual("host-1", config['hosts'][0]['host-name'])
+        json.dumps(config)
+
+    def test_selected_resources(self):
+        snapshot = ClusterSnapshot.capture(self.conn, resources=['roles'])
+        self.assertEqual(3, len(snapshot.roles))
+        self.assertEqual(0, len(snapshot.databases))
+
+    def test_removed_forest(self):
+        # The forest is deleted between listing and reading it
+        forests = RESOURCES['/manage/v2/forests']
+        RESOURCES['/manage/v2/forests'] = default_list('forest', [{'nameref': 'App-1'},
+                                                                  {'nameref': 'Gone-1'}])
+        try:
+            snapshot = ClusterSnapshot.capture(self.conn, resources=['forests'])
+        finally:
+            RESOURCES['/manage/v2/forests'] = forests
+        self.assertEqual(["App-1"], list(snapshot.forests))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, absolute_import
+
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from marklogic.tools import Watcher
+
+
+class RecordingDatabase:
+    def __init__(self):
+        self.documents = {}
+        self.requests = 0
+        self.loaded = []
+
+    def write_documents(self, connection, documents, collections=None,
+                        permissions=None, batch_size=100, batch_bytes=1048576):
+        self.requests += 1
+        for uri, content, metadata in documents:
+            self.documents[uri] = content
+        return self
+
+    def load_file(self, connection, path, uri, collections=None, content_type=None,
+                  host=None):
+        self.requests += 1
+        self.loaded.append(uri)
+        with open(path, 'rb') as data_file:
+            self.documents[uri] = data_file.read()
+        return self
+
+    def delete_documents(self, connection, uris, batch_size=100):
+        self.requests += 1
+        for uri in uris:
+            self.documents.pop(uri, None)
+        return self
+
+
+class TestWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.database = RecordingDatabase()
+        self.flushed = threading.Event()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, name, content):
+        with open(os.path.join(self.directory, name), "w") as out:
+            out.write(content)
+
+    def _start(self, use_inotify, max_batch_file_size=1048576):
+        self._write("keep.json", '{"keep": true}')
+        self.watcher = Watcher(self.database, prefix="/w/", debounce=0.2,
+                               poll_interval=0.1, use_inotify=use_inotify,
+                               exclude=["*.tmp"], max_batch_file_size=max_batch_file_size,
+                               callback=lambda w, d: self.flushed.set())
+        self.thread = threading.Thread(target=self.watcher.watch,
+                                       args=(None, self.directory))
+        self.thread.daemon = True
+        self.thread.start()
+        self.assertTrue(self.watcher.watching.wait(5))
+
+    def _stop(self):
+        self.watcher.stop()
+        self.thread.join(5)
+
+    def _check_burst(self, use_inotify):
+        self._start(use_inotify)
+        for i in range(0, 20):
+            self._write("doc.json", '{{"n": {0}}}'.format(i))
+            self._write("other{0}.json".format(i % 4), '{{"n": {0}}}'.format(i))
+        self._write("scratch.tmp", "ignored")
+        self.assertTrue(self.flushed.wait(5))
+        self.flushed.clear()
+
+        self.assertEqual(1, self.database.requests)
+        self.assertEqual(b'{"n": 19}', self.database.documents["/w/doc.json"])
+        self.assertEqual(5, len(self.database.documents))
+
+        os.rename(os.path.join(self.directory, "doc.json"),
+                  os.path.join(self.directory, "moved.json"))
+        os.remove(os.path.join(self.directory, "other0.json"))
+        self.assertTrue(self.flushed.wait(5))
+        self._stop()
+
+        self.assertEqual(3, self.database.requests)
+        self.assertEqual(sorted(["/w/moved.json", "/w/other1.json",
+                                 "/w/other2.json", "/w/other3.json"]),
+                         sorted(self.database.documents.keys()))
+
+    def test_polling(self):
+        self._check_burst(False)
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "inotify is Linux only")
+    def test_inotify(self):
+        self._check_burst(True)
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "inotify is Linux only")
+    def test_new_directory(self):
+        self._start(True)
+        os.mkdir(os.path.join(self.directory, "sub"))
+        time.sleep(0.05)
+        self._write(os.path.join("sub", "a.json"), '{"a": 1}')
+        self.assertTrue(self.flushed.wait(5))
+        self.flushed.clear()
+        self.assertIn("/w/sub/a.json", self.database.documents)
+
+        shutil.rmtree(os.path.join(self.directory, "sub"))
+        self.assertTrue(self.flushed.wait(5))
+        self._stop()
+        self.assertNotIn("/w/sub/a.json", self.database.documents)
+
+    def test_large_files(self):
+        self._start(False, max_batch_file_size=100)
+        self._write("small.json", '{"n": 1}')
+        self._write("large.json", '{{"n": "{0}"}}'.format("x" * 200))
+        self.assertTrue(self.flushed.wait(5))
+        self._stop()
+
+        # The small file is batched, the large one is streamed
+        self.assertEqual(["/w/large.json"], self.database.loaded)
+        self.assertEqual(2, self.database.requests)
+        self.assertEqual(b'{"n": 1}', self.database.documents["/w/small.json"])
+        self.assertEqual(209, len(self.database.documents["/w/large.json"]))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, absolute_import
+
+#
+# Copyright 2015 MarkLogic Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0#
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import inspect
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from marklogic.models.utilities import files
+from marklogic.models.utilities.files import iter_directory, walk_directories
+
+
+class TestFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for path in ["a.json", "b.xml", "sub/c.json", "sub/deeper/d.json", "skip/e.json"]:
+            full = os.path.join(self.root, *path.split("/"))
+            if not os.path.isdir(os.path.dirname(full)):
+                os.makedirs(os.path.dirname(full))
+            with open(full, "w") as out:
+                out.write("{}")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def names(self, walker):
+        return sorted([item['filename'] for item in walker])
+
+    def test_patterns(self):
+        self.assertEqual(["a.json", "b.xml", "c.json", "d.json", "e.json"],
+                         self.names(iter_directory(self.root)))
+        self.assertEqual(["a.json", "c.json", "d.json"],
+                         self.names(iter_directory(self.root, include=["*.json"],
+                                                   exclude=["skip"])))
+        self.assertEqual(["a.json", "b.xml", "e.json"],
+                         self.names(iter_directory(self.root, exclude=["sub/*"])))
+
+    def test_stat(self):
+        for item in iter_directory(self.root, with_stat=True):
+            self.assertEqual(2, item['size'])
+            self.assertIn('mtime', item)
+
+    @unittest.skipUnless(hasattr(os, "symlink"), "requires symlinks")
+    def test_symlinks(self):
+        os.symlink(os.path.join(self.root, "sub"), os.path.join(self.root, "sub", "loop"))
+        os.symlink(os.path.join(self.root, "a.json"), os.path.join(self.root, "link.json"))
+
+        self.assertEqual(["a.json", "b.xml", "c.json", "d.json", "e.json", "link.json"],
+                         self.names(iter_directory(self.root)))
+        self.assertEqual(["a.json", "b.xml", "c.json", "d.json", "e.json"],
+                         self.names(iter_directory(self.root, symlinks='skip')))
+        self.assertEqual(["a.json", "b.xml", "c.json", "d.json", "e.json", "link.json"],
+                         self.names(walk_directories(self.root)))
+
+    def test_deep_tree(self):
+        path = self.root
+        for i in range(0, 200):
+            path = os.path.join(path, "n")
+            os.mkdir(path)
+        with open(os.path.join(path, "leaf.json"), "w") as out:
+            out.write("{}")
+
+        # A recursive walk would need a frame per directory level
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(len(inspect.stack()) + 50)
+        try:
+            names = self.names(iter_directory(self.root))
+        finally:
+            sys.setrecursionlimit(limit)
+
+        self.assertIn("leaf.json", names)
+
+    def test_unreadable(self):
+        missing = os.path.join(self.root, "missing")
+        with self.assertRaises(OSError):
+            list(iter_directory(missing))
+
+        errors = []
+        self.assertEqual([], list(iter_directory(missing, onerror=errors.append)))
+        self.assertEqual(1, len(errors))
+        self.assertEqual(missing, errors[0].filename)
+
+    def test_removed_while_walking(self):
+        listed = files._entries
+
+        def entries(directory):
+            # The file and directory go away after they are listed
+            result = listed(directory)
+            if directory == self.root:
+                os.remove(os.path.join(self.root, "a.json"))
+                shutil.rmtree(os.path.join(self.root, "sub"))
+            return result
+
+        files._entries = entries
+        try:
+            errors = []
+            names = self.names(iter_directory(self.root, symlinks='follow', with_stat=True,
+                                              onerror=errors.append))
+        finally:
+            files._entries = listed
+
+        self.assertEqual(["b.xml", "e.json"], names)
+        self.assertEqual(sorted([os.path.join(self.root, "a.json"),
+                                 os.path.join(self.root, "sub")]),
+                         sorted(error.filename for error in errors))
+
+if __name__ == "__main__":
+    unittest.main()